@@ -0,0 +1,132 @@
+"""
+Avatar image processing
+
+Uploads are decoded, rotated according to their EXIF orientation, stripped of
+all metadata (EXIF, GPS, ICC profiles) and turned into a bounded "original"
+plus square thumbnails in WebP and JPEG. The work runs on a small bounded
+pool (settings.AVATAR_PROCESSING) so large photos cannot tie up request
+threads; a full pool raises AvatarProcessingBusy.
+
+Pillow is optional. Without it uploads are stored as received and no
+thumbnails are produced.
+"""
+
+import logging
+import threading
+from io import BytesIO
+from typing import Dict, NamedTuple
+
+from django.conf import settings
+
+from .worker_pools import BoundedExecutor, PoolBusy
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZES = (64, 128, 256)
+THUMBNAIL_FORMATS = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+# Longest side of the sanitized original kept alongside the thumbnails
+ORIGINAL_MAX_SIZE = 1024
+
+# Refuse images that would decode to more pixels than this (decompression bombs)
+MAX_PIXELS = 40_000_000
+
+
+class AvatarProcessingBusy(PoolBusy):
+    """Raised when the image pool and its queue are full"""
+
+
+class ProcessedAvatar(NamedTuple):
+    data: bytes
+    content_type: str
+    # variant name (e.g. "128.webp") -> (bytes, content type)
+    variants: Dict[str, tuple]
+
+
+def variant_names():
+    return [f"{size}.{fmt}" for size in THUMBNAIL_SIZES for fmt in THUMBNAIL_FORMATS]
+
+
+def _encode(image, fmt: str) -> bytes:
+    buffer = BytesIO()
+    if fmt == 'jpeg':
+        image.convert('RGB').save(buffer, format='JPEG', quality=85, optimize=True, progressive=True)
+    elif fmt == 'webp':
+        image.save(buffer, format='WEBP', quality=80, method=4)
+    else:
+        image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def _flatten(image):
+    """RGB or RGBA copy of the first frame, with no metadata carried over"""
+    image.seek(0)
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    # A fresh image drops EXIF, ICC and any other info from the upload
+    clean = Image.new(image.mode, image.size)
+    clean.paste(image)
+    return clean, has_alpha
+
+
+def _process(image_data: bytes) -> ProcessedAvatar:
+    try:
+        with Image.open(BytesIO(image_data)) as upload:
+            width, height = upload.size
+            if width * height > MAX_PIXELS:
+                raise ValueError("Image dimensions are too large")
+            image, has_alpha = _flatten(upload)
+    except (OSError, Image.DecompressionBombError, SyntaxError) as e:
+        raise ValueError(f"Not a valid image: {e}")
+
+    original = image.copy()
+    original.thumbnail((ORIGINAL_MAX_SIZE, ORIGINAL_MAX_SIZE), Image.LANCZOS)
+    original_format = 'png' if has_alpha else 'jpeg'
+
+    variants = {}
+    for size in THUMBNAIL_SIZES:
+        thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        for fmt, content_type in THUMBNAIL_FORMATS.items():
+            variants[f"{size}.{fmt}"] = (_encode(thumbnail, fmt), content_type)
+
+    return ProcessedAvatar(_encode(original, original_format), f"image/{original_format}", variants)
+
+
+class AvatarImages:
+    """Process-wide image pool configured by settings.AVATAR_PROCESSING"""
+
+    _pool = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def available() -> bool:
+        return Image is not None
+
+    @classmethod
+    def process(cls, image_data: bytes, content_type: str) -> ProcessedAvatar:
+        """
+        Sanitize an upload and render its thumbnails.
+
+        Raises ValueError for data that does not decode as an image and
+        AvatarProcessingBusy when the pool is saturated.
+        """
+        if Image is None:
+            logger.warning("Pillow is not installed; storing avatar without thumbnails")
+            return ProcessedAvatar(image_data, content_type, {})
+
+        if cls._pool is None:
+            with cls._lock:
+                if cls._pool is None:
+                    config = {'WORKERS': 2, 'MAX_PENDING': 8, 'TIMEOUT': 30}
+                    config.update(getattr(settings, 'AVATAR_PROCESSING', None) or {})
+                    cls._pool = BoundedExecutor(
+                        'avatar', config['WORKERS'], config['MAX_PENDING'], config['TIMEOUT'],
+                        busy_error=AvatarProcessingBusy
+                    )
+        return cls._pool.run(_process, image_data)
@@ -0,0 +1,80 @@
+"""
+Conditional GET (ETag / If-None-Match / 304) for per-user read endpoints
+
+Every service write bumps the user's version counter for the collections it
+touched (MongoDBService.bump_versions). A read endpoint decorated with
+@conditional_on('budgets', ...) derives its ETag from those counters, the
+path and the query string, so answering If-None-Match costs one find_one on
+collection_versions: a match returns 304 before the view fetches or
+serializes anything.
+
+The versions are read before the view runs, so a write that lands in
+between leaves the response with an older ETag than its data; the next
+request then simply misses. The opposite order could pin stale data.
+"""
+
+import hashlib
+import logging
+from functools import wraps
+
+from django.http import HttpResponseNotModified
+
+from .mongodb_authentication import get_auth_context
+from .mongodb_service import MongoDBService
+
+logger = logging.getLogger(__name__)
+
+# Clients must revalidate on every use, and shared caches must not store
+# one user's data
+CACHE_CONTROL = 'private, no-cache'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 requires for GET)"""
+    candidates = {tag.strip().removeprefix('W/') for tag in (if_none_match or '').split(',')}
+    return etag.removeprefix('W/') in candidates or '*' in candidates
+
+
+def versions_etag(user_id: str, versions: dict, collections, request) -> str:
+    """Weak ETag for a user's view of the given collections at these versions"""
+    state = ':'.join(f"{collection}={versions.get(collection, 0)}" for collection in collections)
+    key = f"{user_id}|{request.path}|{request.META.get('QUERY_STRING', '')}|{state}"
+    return f'W/"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+
+
+def conditional_on(*collections: str):
+    """
+    Answer GETs with an ETag built from the user's versions of collections,
+    and with 304 when If-None-Match already has it. Goes below the DRF
+    decorators so authentication has already run.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            context = get_auth_context(request)
+            if context is None:
+                return view(request, *args, **kwargs)
+
+            try:
+                versions = MongoDBService().get_versions(context.user.id)
+            except Exception as e:
+                logger.warning(f"Could not read collection versions, serving without ETag: {e}")
+                return view(request, *args, **kwargs)
+
+            etag = versions_etag(context.user.id, versions, collections, request)
+            if etag_matches(request.headers.get('If-None-Match'), etag):
+                response = HttpResponseNotModified()
+                response['ETag'] = etag
+                response['Cache-Control'] = CACHE_CONTROL
+                return response
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+                response['Cache-Control'] = CACHE_CONTROL
+            return response
+        return wrapper
+    return decorator
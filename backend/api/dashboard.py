@@ -2,6 +2,7 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from .mongodb_services import MongoDBService
+from .mongodb_service import BudgetService
 from .mongodb_authentication import get_user_from_token
 import logging
 from decimal import Decimal
@@ -43,19 +44,8 @@ class DashboardView(APIView):
             # Get budget overview
             budget = MongoDBService.get_user_budget(user_id)
             
-            # Calculate total expenses from budget
-            total_expenses = Decimal('0')
-            if budget:
-                # Get expenses from the expenses dict
-                expenses = budget.expenses or {}
-                for field, amount in expenses.items():
-                    total_expenses += Decimal(str(amount or 0))
-                
-                # Add additional expenses if any
-                additional_items = budget.additional_items or []
-                for item in additional_items:
-                    if item.get('type') == 'expense':
-                        total_expenses += Decimal(str(item.get('amount', 0)))
+            # Budget totals are stored on the budget by BudgetService
+            totals = BudgetService.totals_of(budget.to_mongo().to_dict()) if budget else {}
 
             # Prepare dashboard data
             dashboard_data = {
@@ -77,9 +67,10 @@ class DashboardView(APIView):
                 ],
                 'total_balance': float(total_balance),
                 'budget': {
-                    'income': float(budget.income or 0) if budget else 0,
-                    'total_expenses': float(total_expenses),
-                    'net_income': float(Decimal(str(budget.income or 0)) - total_expenses) if budget else 0
+                    'income': totals.get('income', 0),
+                    'total_expenses': totals.get('expenses', 0),
+                    'net_income': totals.get('net_savings', 0),
+                    'savings_rate': totals.get('savings_rate', 0)
                 }
             }
 
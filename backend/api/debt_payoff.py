@@ -0,0 +1,499 @@
+"""
+Debt payoff simulation
+
+The debt planner used to walk a list of debt dicts month by month, rebuilding
+and re-sorting the payment order and logging every debt on every month. The
+kernel here keeps balances and rates in NumPy arrays: interest accrues for
+all debts in one vector operation, and the payment order is computed once
+and only re-sorted when it stops being valid. Under avalanche that is never,
+because rates do not change. Under snowball that is when interest lifts one
+balance past another. Paid-off debts simply drop out of the order.
+
+Payments still go to one debt at a time in priority order, which is the
+plan's definition and touches only the debts that are paid off that month
+plus one. The arithmetic is the same as the original loop, so plans match it
+to the cent.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+STRATEGIES = ('snowball', 'avalanche')
+
+# Strategies simulate_strategies can compare: the planner's two, the largest
+# interest charge (balance * rate) first, and a caller-given order
+COMPARABLE_STRATEGIES = STRATEGIES + ('highest_interest', 'custom')
+
+# 30 years
+MAX_MONTHS = 360
+
+# Balances at or below this count as paid off
+PAID_OFF = 0.01
+
+
+class PayoffPlan(NamedTuple):
+    months: int
+    hit_max_months: bool
+    total_interest: float
+    # Interest accrued across all debts: in each of months 1..N for monthly
+    # plans, in each row's period for event plans
+    monthly_interest: np.ndarray
+    # (rows, debts) end-of-month state. Monthly plans have one row per month
+    # from 0; event plans report paid and interest summed over each row's period
+    balance: np.ndarray
+    paid: np.ndarray
+    interest: np.ndarray
+    total_paid: np.ndarray
+    total_interest_by_debt: np.ndarray
+    # Month number of each row
+    month_numbers: np.ndarray
+    # (debts,) state at the end of the plan
+    final_balance: np.ndarray
+    final_total_paid: np.ndarray
+    final_total_interest: np.ndarray
+    # Loop iterations the simulation took
+    steps: int
+
+
+def parse_debts(debts):
+    """
+    Validate request debts and return (names, balances, rates) as lists.
+
+    Raises ValueError with a message suitable for a 400 response.
+    """
+    if not debts or not isinstance(debts, list):
+        raise ValueError('Debts must be a list.')
+
+    names, balances, rates = [], [], []
+    for d in debts:
+        if not isinstance(d, dict) or not d.get('name'):
+            raise ValueError('Debt name is required for all debts.')
+        if d.get('balance') is None:
+            raise ValueError(f'Balance is required for debt: {d["name"]}')
+        if d.get('rate') is None:
+            raise ValueError(f'Interest rate is required for debt: {d["name"]}')
+        try:
+            balance = float(d['balance'])
+            # Already converted to a decimal by the frontend
+            rate = float(d['rate'])
+        except (ValueError, TypeError) as e:
+            raise ValueError(f'Invalid data format for debt: {d["name"]}. Error: {str(e)}')
+        if balance < 0:
+            raise ValueError(f'Balance cannot be negative for debt: {d["name"]}')
+        if rate < 0 or rate > 1:
+            raise ValueError(f'Interest rate must be between 0 and 1 (0% to 100%) for debt: {d["name"]}')
+        names.append(d['name'])
+        balances.append(balance)
+        rates.append(rate)
+    return names, balances, rates
+
+
+def parse_net_savings(monthly_budget_data):
+    """
+    Net savings per month (index 0 is month 1) from the request's monthly
+    budget data. Missing or invalid values count as 0, and empty entries
+    fall back to the last month. Months past the end of the list repeat it.
+    """
+    if not monthly_budget_data:
+        return np.zeros(0)
+
+    def net_savings(month_budget):
+        try:
+            return float(month_budget.get('net_savings', 0))
+        except (ValueError, TypeError, AttributeError):
+            return 0.0
+
+    last = monthly_budget_data[-1]
+    return np.array([net_savings(month_budget or last) for month_budget in monthly_budget_data], dtype=float)
+
+
+def canonical_net_savings(net_savings) -> list:
+    """
+    The shortest schedule that plans identically: negative months pay
+    nothing, like 0, and repeats of the last month at the end are implied.
+    """
+    available = np.maximum(np.asarray(net_savings, dtype=float), 0.0).tolist()
+    while len(available) > 1 and available[-1] == available[-2]:
+        available.pop()
+    return available
+
+
+def strategy_order(balances, rates, strategy: str) -> np.ndarray:
+    """Stable payment priority: smallest balance first, or highest rate first"""
+    if strategy == 'snowball':
+        return np.argsort(np.asarray(balances, dtype=float), kind='stable')
+    return np.argsort(-np.asarray(rates, dtype=float), kind='stable')
+
+
+def _still_sorted(order: np.ndarray, balance: np.ndarray) -> bool:
+    """Whether order still ranks balances ascending, ties by index (stable)"""
+    step = np.diff(balance[order])
+    return bool(np.all((step > 0) | ((step == 0) & (np.diff(order) > 0))))
+
+
+def _available(net_savings: np.ndarray, month: int) -> float:
+    """Money for debts in a month: its net savings, the last entry past the end, never negative"""
+    if not net_savings.size:
+        return 0.0
+    return max(0.0, net_savings[min(month, net_savings.size) - 1])
+
+
+def _pay_month(balance, monthly_rate, rates, order, strategy, available, total_paid, total_interest):
+    """
+    Simulate one month in place: accrue interest on every balance, then pay
+    debts in priority order until available runs out.
+
+    Returns (interest, paid, order); order is re-sorted only when snowball
+    ranking changed.
+    """
+    # Balances are never negative, so paid-off debts accrue exactly 0
+    interest = balance * monthly_rate
+    balance += interest
+    total_interest += interest
+
+    active = order[balance[order] > PAID_OFF]
+    if strategy == 'snowball' and not _still_sorted(active, balance):
+        order = strategy_order(balance, rates, strategy)
+        active = order[balance[order] > PAID_OFF]
+
+    paid = np.zeros_like(balance)
+    for i in active:
+        if available <= 0:
+            break
+        pay = min(available, balance[i])
+        balance[i] -= pay
+        total_paid[i] += pay
+        available -= pay
+        paid[i] = pay
+    return interest, paid, order
+
+
+def _add_in_order(total: float, values: np.ndarray) -> float:
+    """total + values[0] + values[1] + ..., one addition at a time like a running total"""
+    return np.cumsum(np.concatenate(([total], values)))[-1]
+
+
+def simulate_payoff(balances, rates, net_savings, strategy: str = 'snowball', max_months: int = MAX_MONTHS) -> PayoffPlan:
+    """
+    Pay debts down month by month until every balance is paid off or
+    max_months pass.
+
+    Each month interest (balance * rate / 12) is added to every balance, then
+    that month's net savings (net_savings[month - 1], the last entry once the
+    schedule runs out, nothing when it is empty or negative) pays the debts
+    in strategy order. Debts are reported in the order given.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f'Unknown strategy: {strategy}')
+
+    balance = np.array(balances, dtype=float)
+    rates = np.asarray(rates, dtype=float)
+    monthly_rate = rates / 12
+    net_savings = np.asarray(net_savings, dtype=float)
+    debt_count = balance.size
+
+    history = np.zeros((5, max_months + 1, debt_count))
+    balance_h, paid_h, interest_h, total_paid_h, total_interest_h = history
+    balance_h[0] = balance
+    total_paid = np.zeros(debt_count)
+    total_interest = np.zeros(debt_count)
+    monthly_interest = np.zeros(max_months)
+    overall_interest = 0.0
+
+    order = strategy_order(balance, rates, strategy)
+
+    month = 0
+    while month < max_months and (balance > PAID_OFF).any():
+        month += 1
+        interest, paid_h[month], order = _pay_month(
+            balance, monthly_rate, rates, order, strategy, _available(net_savings, month), total_paid, total_interest
+        )
+        # Summed in debt order, one addition at a time, like the running totals
+        monthly_interest[month - 1] = _add_in_order(0.0, interest)
+        overall_interest = _add_in_order(overall_interest, interest)
+
+        balance_h[month] = balance
+        interest_h[month] = interest
+        total_paid_h[month] = total_paid
+        total_interest_h[month] = total_interest
+
+    rows = month + 1
+    return PayoffPlan(
+        months=month,
+        hit_max_months=month >= max_months,
+        total_interest=float(overall_interest),
+        monthly_interest=monthly_interest[:month],
+        balance=balance_h[:rows],
+        paid=paid_h[:rows],
+        interest=interest_h[:rows],
+        total_paid=total_paid_h[:rows],
+        total_interest_by_debt=total_interest_h[:rows],
+        month_numbers=np.arange(rows),
+        final_balance=balance,
+        final_total_paid=total_paid,
+        final_total_interest=total_interest,
+        steps=month,
+    )
+
+
+def _quiet_run(balance, monthly_rate, strategy, order, available, length):
+    """
+    The months, from the next one on, that follow closed-form recurrences.
+
+    In a quiet month the whole of available goes to a single target debt that
+    is not paid off by it, and no other debt overtakes the target in payment
+    order. Untouched balances then grow as b * g^j and the target's as
+    g^j * (b - c) + c with g = 1 + r and c = available / r (b - j * available
+    at 0%), until the next event: a payoff, a reorder, or the end of the
+    budget stretch (length months).
+
+    Returns (end balances, interest, paid) for each quiet month as
+    (months, debts) arrays; empty when the next month needs an exact step.
+    """
+    growth = 1 + monthly_rate
+    j = np.arange(1, length + 1)
+    # Post-interest balances in month j without any payments
+    free = balance * growth ** j[:, None]
+    end = free.copy()
+    paid = np.zeros_like(free)
+
+    if available > 0:
+        month_one = free[0]
+        if strategy == 'snowball':
+            candidates = np.flatnonzero(month_one > PAID_OFF)
+            target = candidates[np.argmin(month_one[candidates])]
+        else:
+            target = order[month_one[order] > PAID_OFF][0]
+
+        rate = monthly_rate[target]
+        if rate > 0:
+            c = available / rate
+            before = growth[target] ** (j - 1) * (balance[target] - c) + c
+        else:
+            before = balance[target] - (j - 1) * available
+        after = before * growth[target]
+        end[:, target] = after - available
+        paid[:, target] = available
+
+        # A margin keeps closed-form rounding away from the payoff month
+        quiet = (after > available * (1 + 1e-9) + 1e-9) & (end[:, target] > PAID_OFF)
+        others = free > PAID_OFF
+        others[:, target] = False
+        if strategy == 'snowball':
+            # The closed form only holds while the target stays first in order
+            ahead = (free < after[:, None]) | ((free == after[:, None]) & (np.arange(balance.size) < target))
+        else:
+            rank = np.empty_like(order)
+            rank[order] = np.arange(order.size)
+            ahead = np.broadcast_to(rank < rank[target], free.shape)
+        quiet &= ~(others & ahead).any(axis=1)
+        length = length if quiet.all() else int(np.argmin(quiet))
+
+    end, paid = end[:length], paid[:length]
+    start = np.vstack((balance, end[:-1]))
+    return end, start * monthly_rate, paid
+
+
+def simulate_payoff_events(balances, rates, net_savings, strategy: str = 'snowball',
+                           max_months: int = MAX_MONTHS, months=None) -> PayoffPlan:
+    """
+    Same plan as simulate_payoff, computed by jumping between events.
+
+    Between a payoff, a change in the month's net savings or a snowball
+    reorder, balances follow geometric recurrences, so a whole stretch is one
+    vectorized closed-form step and only event months are stepped one by
+    one. Results agree with simulate_payoff to rounding.
+
+    Without months, there is one row per step ending at its last month, with
+    paid and interest summed over the step. With months, rows are exactly
+    those months (up to the end of the plan) with that month's figures.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f'Unknown strategy: {strategy}')
+
+    balance = np.array(balances, dtype=float)
+    rates = np.asarray(rates, dtype=float)
+    monthly_rate = rates / 12
+    available_by_month = np.maximum(np.asarray(net_savings, dtype=float), 0.0)
+    # Months where a new amount starts; the last one repeats forever
+    budget_changes = np.flatnonzero(np.diff(available_by_month)) + 2
+    debt_count = balance.size
+    wanted = None if months is None else set(months)
+
+    total_paid = np.zeros(debt_count)
+    total_interest = np.zeros(debt_count)
+    overall_interest = 0.0
+    rows = []
+
+    def record(month, end, paid, interest, paid_before, interest_before):
+        rows.append((month, end, paid, interest, paid_before + paid, interest_before + interest))
+
+    if wanted is None or 0 in wanted:
+        zeros = np.zeros(debt_count)
+        record(0, balance.copy(), zeros, zeros, zeros, zeros)
+
+    order = strategy_order(balance, rates, strategy)
+    month = 0
+    steps = 0
+    while month < max_months and (balance > PAID_OFF).any():
+        steps += 1
+        available = _available(available_by_month, month + 1)
+        later = budget_changes[budget_changes > month + 1]
+        stretch_end = min(int(later[0]) - 1, max_months) if later.size else max_months
+
+        end, interest, paid = _quiet_run(balance, monthly_rate, strategy, order, available, stretch_end - month)
+        if len(end):
+            paid_before, interest_before = total_paid.copy(), total_interest.copy()
+            cumulative_paid = np.cumsum(paid, axis=0)
+            cumulative_interest = np.cumsum(interest, axis=0)
+            if wanted is None:
+                record(month + len(end), end[-1], cumulative_paid[-1], cumulative_interest[-1], paid_before, interest_before)
+            else:
+                for offset in sorted(m - month - 1 for m in wanted if month < m <= month + len(end)):
+                    rows.append((
+                        month + offset + 1, end[offset], paid[offset], interest[offset],
+                        paid_before + cumulative_paid[offset], interest_before + cumulative_interest[offset]
+                    ))
+            balance = end[-1].copy()
+            total_paid += cumulative_paid[-1]
+            total_interest += cumulative_interest[-1]
+            overall_interest += cumulative_interest[-1].sum()
+            month += len(end)
+            continue
+
+        month += 1
+        paid_before, interest_before = total_paid.copy(), total_interest.copy()
+        interest, paid, order = _pay_month(
+            balance, monthly_rate, rates, order, strategy, available, total_paid, total_interest
+        )
+        overall_interest = _add_in_order(overall_interest, interest)
+        if wanted is None or month in wanted:
+            record(month, balance.copy(), paid, interest, paid_before, interest_before)
+
+    if rows:
+        month_numbers, *columns = (np.array(column) for column in zip(*rows))
+    else:
+        month_numbers = np.zeros(0, dtype=int)
+        columns = [np.zeros((0, debt_count))] * 5
+    balance_rows, paid_rows, interest_rows, total_paid_rows, total_interest_rows = columns
+    return PayoffPlan(
+        months=month,
+        hit_max_months=month >= max_months,
+        total_interest=float(overall_interest),
+        monthly_interest=interest_rows.sum(axis=1),
+        balance=balance_rows,
+        paid=paid_rows,
+        interest=interest_rows,
+        total_paid=total_paid_rows,
+        total_interest_by_debt=total_interest_rows,
+        month_numbers=month_numbers,
+        final_balance=balance,
+        final_total_paid=total_paid,
+        final_total_interest=total_interest,
+        steps=steps,
+    )
+
+
+def simulate_strategies(balances, rates, net_savings, strategies, custom_order=None,
+                        max_months: int = MAX_MONTHS, keep_history: bool = False):
+    """
+    Simulate one set of debts under several strategies in a single batch.
+
+    Balances are a (strategies, debts) array, so interest accrues and payment
+    orders are ranked for every strategy at once; snowball and avalanche
+    give the same plans as simulate_payoff. custom_order lists debt indices
+    in payment order (required for "custom"). Debts are reported in the order
+    given.
+
+    Returns a PayoffPlan per strategy. Row arrays are only kept with
+    keep_history and are None otherwise.
+    """
+    for strategy in strategies:
+        if strategy not in COMPARABLE_STRATEGIES:
+            raise ValueError(f'Unknown strategy: {strategy}')
+
+    rates = np.asarray(rates, dtype=float)
+    monthly_rate = rates / 12
+    net_savings = np.asarray(net_savings, dtype=float)
+    balance = np.tile(np.asarray(balances, dtype=float), (len(strategies), 1))
+    count, debt_count = balance.shape
+
+    # Ranking keys, lowest paid first; snowball and highest_interest change as balances do
+    static_keys = np.zeros_like(balance)
+    by_balance = np.array([strategy == 'snowball' for strategy in strategies], dtype=bool)
+    by_interest = np.array([strategy == 'highest_interest' for strategy in strategies], dtype=bool)
+    for row, strategy in enumerate(strategies):
+        if strategy == 'avalanche':
+            static_keys[row] = -rates
+        elif strategy == 'custom':
+            if custom_order is None or sorted(custom_order) != list(range(debt_count)):
+                raise ValueError('A custom order must list every debt once')
+            static_keys[row, custom_order] = np.arange(debt_count)
+
+    if keep_history:
+        history = np.zeros((5, count, max_months + 1, debt_count))
+        history[0, :, 0] = balance
+    total_paid = np.zeros_like(balance)
+    total_interest = np.zeros_like(balance)
+    monthly_interest = np.zeros((count, max_months))
+    overall_interest = np.zeros(count)
+    months = np.zeros(count, dtype=int)
+
+    running = (balance > PAID_OFF).any(axis=1)
+    month = 0
+    while month < max_months and running.any():
+        month += 1
+
+        # Finished strategies stop, as their own month loop would
+        interest = np.where(running[:, None], balance * monthly_rate, 0.0)
+        balance += interest
+        total_interest += interest
+        monthly_interest[:, month - 1] = np.cumsum(interest, axis=1)[:, -1]
+        overall_interest = np.cumsum(np.hstack((overall_interest[:, None], interest)), axis=1)[:, -1]
+
+        keys = static_keys.copy()
+        keys[by_balance] = balance[by_balance]
+        keys[by_interest] = -(balance[by_interest] * rates)
+        keys[balance <= PAID_OFF] = np.inf
+        order = np.argsort(keys, axis=1, kind='stable')
+
+        paid = np.zeros_like(balance)
+        for row in np.flatnonzero(running):
+            available = _available(net_savings, month)
+            for i in order[row]:
+                if available <= 0 or keys[row, i] == np.inf:
+                    break
+                pay = min(available, balance[row, i])
+                balance[row, i] -= pay
+                available -= pay
+                paid[row, i] = pay
+        total_paid += paid
+
+        if keep_history:
+            for index, values in enumerate((balance, paid, interest, total_paid, total_interest)):
+                history[index, :, month] = values
+        months[running] = month
+        running &= (balance > PAID_OFF).any(axis=1)
+
+    plans = []
+    for row in range(count):
+        rows = months[row] + 1
+        kept = [history[index, row, :rows] for index in range(5)] if keep_history else [None] * 5
+        plans.append(PayoffPlan(
+            months=int(months[row]),
+            hit_max_months=bool(months[row] >= max_months),
+            total_interest=float(overall_interest[row]),
+            monthly_interest=monthly_interest[row, :months[row]],
+            balance=kept[0],
+            paid=kept[1],
+            interest=kept[2],
+            total_paid=kept[3],
+            total_interest_by_debt=kept[4],
+            month_numbers=np.arange(rows) if keep_history else None,
+            final_balance=balance[row],
+            final_total_paid=total_paid[row],
+            final_total_interest=total_interest[row],
+            steps=month,
+        ))
+    return plans
@@ -126,13 +126,10 @@ class ExpenseAnalyzerView(APIView):
             if user_id:
                 try:
                     budget_service = BudgetService()
-                    budgets = budget_service.get_user_budgets(user_id)
                     # Get the most recent budget by updated_at
-                    budget = None
-                    if budgets:
-                        # Sort by updated_at descending and get the first one
-                        budgets_sorted = sorted(budgets, key=lambda x: x.get('updated_at', ''), reverse=True)
-                        budget = budgets_sorted[0] if budgets_sorted else None
+                    budget = budget_service.get_latest_budget(
+                        user_id, latest_by='updated_at', fields=['additional_items']
+                    )
                     if budget and budget.get('additional_items'):
                         additional_categories = [item.get('name') for item in budget.get('additional_items', []) if item.get('name')]
                 except Exception as e:
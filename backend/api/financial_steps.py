@@ -40,24 +40,16 @@ class FinancialStepsView(APIView):
             
             accounts = account_service.get_user_accounts(user_id)
             debts = debt_service.get_user_debts(user_id)  # Returns List[Dict] like debt planning page
-            budgets = budget_service.get_user_budgets(user_id)
             
             logger.info(f"Debts data for user {user_id}: {debts}")
             logger.info(f"Number of debts: {len(debts)}")
             
             # Get the most recent budget with Emergency Fund data
-            budget = None
-            if budgets:
-                # Look for the most recent budget with Emergency Fund data
-                for b in budgets:
-                    savings_items = b.get('savings_items', [])
-                    if savings_items and any(item.get('name') == 'Emergency Fund' for item in savings_items):
-                        budget = b
-                        break
-                
-                # If no budget with Emergency Fund found, use the most recent budget
-                if not budget:
-                    budget = budgets[0]
+            budget = budget_service.get_latest_budget(user_id, match={"savings_items.name": "Emergency Fund"})
+            
+            # If no budget with Emergency Fund found, use the most recent budget
+            if not budget:
+                budget = budget_service.get_latest_budget(user_id)
             
             logger.info(f"Budget data for user {user_id}: {budget}")
             if budget:
@@ -90,12 +82,14 @@ class FinancialStepsView(APIView):
         
         test_budget = {
             'income': 6000,
-            'housing': 1500,
-            'utilities': 200,
-            'food': 400,
-            'transportation': 300,
-            'debt_payments': 500,
-            'other': 200
+            'expenses': {
+                'housing': 1500,
+                'utilities': 200,
+                'food': 400,
+                'transportation': 300,
+                'debt_payments': 500,
+                'others': 200
+            }
         }
         
         
@@ -391,34 +385,18 @@ class FinancialStepsView(APIView):
         logger.info(f"calculate_total_debt: Final total_debt = {total_debt}")
         return total_debt
     
+    def budget_totals(self, budget):
+        """The budget's stored totals (see BudgetService.budget_totals)"""
+        if not isinstance(budget, dict):
+            budget = budget.to_mongo().to_dict()
+        return BudgetService.totals_of(budget)
+    
     def calculate_monthly_expenses(self, budget):
         """Calculate monthly expenses from budget"""
         if not budget:
             return Decimal('3000')  # Default estimate
         
-        expense_fields = [
-            'housing', 'debt_payments', 'transportation', 'utilities',
-            'food', 'healthcare', 'entertainment', 'shopping',
-            'travel', 'education', 'childcare', 'other'
-        ]
-        
-        total_expenses = Decimal('0')
-        for field in expense_fields:
-            if isinstance(budget, dict):
-                value = budget.get(field, 0) or 0
-            else:
-                value = getattr(budget, field, 0) or 0
-            total_expenses += Decimal(str(value))
-        
-        # Add additional expenses if any
-        if isinstance(budget, dict):
-            additional_items = budget.get('additional_items', []) or []
-        else:
-            additional_items = getattr(budget, 'additional_items', []) or []
-        for item in additional_items:
-            if item.get('type') == 'expense':
-                total_expenses += Decimal(str(item.get('amount', 0)))
-        
+        total_expenses = Decimal(str(self.budget_totals(budget)['expenses']))
         return total_expenses if total_expenses > 0 else Decimal('3000')
     
     def calculate_monthly_income(self, budget):
@@ -426,15 +404,8 @@ class FinancialStepsView(APIView):
         if not budget:
             return Decimal('5000')  # Default estimate
         
-        if isinstance(budget, dict):
-            income = budget.get('income', 0) or 0
-            additional_income = budget.get('additional_income', 0) or 0
-        else:
-            income = getattr(budget, 'income', 0) or 0
-            additional_income = getattr(budget, 'additional_income', 0) or 0
-        
-        total_income = income + additional_income
-        return Decimal(str(total_income)) if total_income > 0 else Decimal('5000')
+        total_income = Decimal(str(self.budget_totals(budget)['income']))
+        return total_income if total_income > 0 else Decimal('5000')
     
     def calculate_retirement_contributions(self, accounts):
         """Calculate current retirement contributions"""
@@ -483,41 +454,7 @@ class FinancialStepsView(APIView):
         if not budget:
             return Decimal('0')
         
-        # Calculate total income
-        if isinstance(budget, dict):
-            income = budget.get('income', 0) or 0
-            additional_income = budget.get('additional_income', 0) or 0
-        else:
-            income = getattr(budget, 'income', 0) or 0
-            additional_income = getattr(budget, 'additional_income', 0) or 0
-        
-        total_income = Decimal(str(income + additional_income))
-        
-        # Calculate total expenses
-        expense_fields = [
-            'housing', 'debt_payments', 'transportation', 'utilities',
-            'food', 'healthcare', 'entertainment', 'shopping',
-            'travel', 'education', 'childcare', 'other'
-        ]
-        
-        total_expenses = Decimal('0')
-        for field in expense_fields:
-            if isinstance(budget, dict):
-                value = budget.get(field, 0) or 0
-            else:
-                value = getattr(budget, field, 0) or 0
-            total_expenses += Decimal(str(value))
-        
-        # Add additional expenses if any
-        if isinstance(budget, dict):
-            additional_items = budget.get('additional_items', []) or []
-        else:
-            additional_items = getattr(budget, 'additional_items', []) or []
-        for item in additional_items:
-            if item.get('type') == 'expense':
-                total_expenses += Decimal(str(item.get('amount', 0)))
-        
-        return total_income - total_expenses
+        return Decimal(str(self.budget_totals(budget)['net_savings']))
     
     def calculate_additional_savings(self, budget):
         """Calculate additional savings from budget savings items"""
@@ -727,12 +664,14 @@ def financial_steps_calculate_test(request):
         
         test_budget = {
             'income': 6000,
-            'housing': 1500,
-            'utilities': 200,
-            'food': 400,
-            'transportation': 300,
-            'debt_payments': 500,
-            'other': 200
+            'expenses': {
+                'housing': 1500,
+                'utilities': 200,
+                'food': 400,
+                'transportation': 300,
+                'debt_payments': 500,
+                'others': 200
+            }
         }
         
         # Create a temporary instance to use the calculation method
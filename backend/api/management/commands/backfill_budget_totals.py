@@ -0,0 +1,54 @@
+"""
+Store derived totals on budgets written before BudgetService maintained them.
+
+    python manage.py backfill_budget_totals --dry-run
+    python manage.py backfill_budget_totals
+    python manage.py backfill_budget_totals --all   # recompute after a rule change
+
+Writes are batched and, like every totals write, only apply while the
+budget's updated_at is unchanged, so it is safe to run against live traffic.
+"""
+
+from django.core.management.base import BaseCommand
+
+from api.mongodb_service import BudgetService
+
+
+class Command(BaseCommand):
+    help = "Compute and store totals (income, expenses, net savings, savings rate) on existing budgets"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute totals on every budget, not only those missing them')
+        parser.add_argument('--batch-size', type=int, default=500, help='Budgets written per bulk_write (default 500)')
+        parser.add_argument('--dry-run', action='store_true', help='Count the budgets that would be updated without writing')
+
+    def handle(self, *args, **options):
+        budget_service = BudgetService()
+        query = {} if options['all'] else {'totals': {'$exists': False}}
+
+        if options['dry_run']:
+            count = budget_service.db.budgets.count_documents(query)
+            self.stdout.write(self.style.SUCCESS(f"{count} budgets to update"))
+            return
+
+        fields = BudgetService.BUDGET_FIELDS + ['expenses', 'user_id', 'updated_at']
+        budgets = budget_service.db.budgets.find(query, dict.fromkeys(fields, 1))
+
+        updated = 0
+        users = set()
+        batch = []
+        for budget in budgets:
+            batch.append(budget)
+            users.add(budget.get('user_id'))
+            if len(batch) >= options['batch_size']:
+                updated += budget_service._store_totals(batch)
+                batch = []
+        if batch:
+            updated += budget_service._store_totals(batch)
+
+        # Cached responses of these users' budget endpoints are now out of date
+        for user_id in users:
+            if user_id is not None:
+                budget_service.bump_versions(user_id, 'budgets')
+
+        self.stdout.write(self.style.SUCCESS(f"{updated} budgets updated for {len(users)} users"))
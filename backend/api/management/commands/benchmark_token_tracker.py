@@ -0,0 +1,58 @@
+"""
+Microbenchmark for the JWT inactivity tracker.
+
+    python manage.py benchmark_token_tracker                   # 100k live tokens
+    python manage.py benchmark_token_tracker --tokens 500000 --touches 20000
+
+Fills a TokenActivityTracker with --tokens live sessions, then times
+--touches verify-style touches against it, alongside the full-dict scan the
+tracker replaced so the two can be compared directly.
+"""
+
+import hashlib
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.mongodb_service import JWTAuthService
+from api.session_activity import TokenActivityTracker
+
+
+class Command(BaseCommand):
+    help = "Time JWT inactivity tracking with a large number of live tokens"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', type=int, default=100000, help='Number of live tokens to track')
+        parser.add_argument('--touches', type=int, default=10000, help='Number of touches to time')
+
+    def handle(self, *args, **options):
+        tokens = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(options['tokens'])]
+        touches = options['touches']
+        timeout = JWTAuthService.INACTIVITY_TIMEOUT_SECONDS
+        retention = JWTAuthService.SESSION_RETENTION_SECONDS
+        now = time.time()
+
+        tracker = TokenActivityTracker(retention_seconds=retention)
+        for token_hash in tokens:
+            tracker.touch(token_hash, now, timeout)
+
+        start = time.perf_counter()
+        for i in range(touches):
+            tracker.touch(tokens[i % len(tokens)], now + i * 1e-6, timeout)
+        tracker_us = (time.perf_counter() - start) / touches * 1e6
+
+        # The previous implementation: a plain dict swept in full (10-minute
+        # threshold) on every verify
+        legacy = dict.fromkeys(tokens, now)
+        legacy_touches = max(1, min(touches, 200))
+        start = time.perf_counter()
+        for i in range(legacy_touches):
+            legacy[tokens[i % len(tokens)]] = now
+            expired = [token_hash for token_hash, last_used in legacy.items() if now - last_used > 600]
+            for token_hash in expired:
+                del legacy[token_hash]
+        legacy_us = (time.perf_counter() - start) / legacy_touches * 1e6
+
+        self.stdout.write(f"Live tokens:    {len(tracker)}")
+        self.stdout.write(f"Tracker touch:  {tracker_us:.2f} us/op ({touches} ops)")
+        self.stdout.write(f"Full-dict scan: {legacy_us:.2f} us/op ({legacy_touches} ops)")
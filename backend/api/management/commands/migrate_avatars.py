@@ -0,0 +1,85 @@
+"""
+Move avatars stored inline as data: URIs into the avatars collection.
+
+    python manage.py migrate_avatars --base-url https://api.example.com --dry-run
+    python manage.py migrate_avatars --base-url https://api.example.com
+
+Each user's profile.avatar is replaced by the avatar's URL and
+profile.avatar_id by its content hash; identical images share one blob.
+"""
+
+import base64
+import binascii
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.mongodb_cache import UserCache
+from api.mongodb_service import AvatarService
+
+_DATA_URI = re.compile(r'^data:(?P<content_type>[^;,]+)?(?:;base64)?,(?P<data>.*)$', re.DOTALL)
+
+
+class Command(BaseCommand):
+    help = "Move inline data: URI avatars out of user documents into the avatars collection"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', help='Public API base URL for avatar links (defaults to AVATAR_URL_BASE)')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be migrated without changing anything')
+
+    def handle(self, *args, **options):
+        from django.conf import settings
+        base_url = (options['base_url'] or getattr(settings, 'AVATAR_URL_BASE', '')).rstrip('/')
+        if not base_url:
+            raise CommandError("Pass --base-url or set AVATAR_URL_BASE so avatar links are absolute")
+
+        avatar_service = AvatarService()
+        users = avatar_service.db.users.find(
+            {'profile.avatar': {'$regex': '^data:'}},
+            {'profile.avatar': 1}
+        )
+
+        migrated = skipped = 0
+        saved_bytes = 0
+        for user in users:
+            match = _DATA_URI.match(user['profile']['avatar'])
+            try:
+                image_data = base64.b64decode(match.group('data'), validate=True) if match else None
+            except (binascii.Error, ValueError):
+                image_data = None
+            if not image_data:
+                self.stdout.write(self.style.WARNING(f"Skipping user {user['_id']}: avatar is not a base64 data URI"))
+                skipped += 1
+                continue
+
+            content_type = match.group('content_type') or 'image/jpeg'
+            if content_type == 'image/jpg':
+                content_type = 'image/jpeg'
+
+            if options['dry_run']:
+                migrated += 1
+                saved_bytes += len(user['profile']['avatar'])
+                continue
+
+            try:
+                avatar_id, variants = avatar_service.store(image_data, content_type)
+            except ValueError as e:
+                self.stdout.write(self.style.WARNING(f"Skipping user {user['_id']}: {e}"))
+                skipped += 1
+                continue
+
+            display_variant = AvatarService.DISPLAY_VARIANT if AvatarService.DISPLAY_VARIANT in variants else None
+            avatar_service.db.users.update_one(
+                {'_id': user['_id']},
+                {'$set': {
+                    'profile.avatar': f"{base_url}{AvatarService.avatar_path(avatar_id, display_variant)}",
+                    'profile.avatar_id': avatar_id
+                }}
+            )
+            UserCache.invalidate(user['_id'])
+            migrated += 1
+            saved_bytes += len(user['profile']['avatar'])
+
+        summary = f"{migrated} avatars {'to migrate' if options['dry_run'] else 'migrated'}, {skipped} skipped, " \
+                  f"{saved_bytes / 1024:.0f} KB out of user documents"
+        self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,47 @@
+"""
+Diff the declarative index manifest against the live MongoDB indexes and apply it.
+
+    python manage.py reconcile_indexes --dry-run   # show the plan only
+    python manage.py reconcile_indexes             # create missing indexes, swap replaced ones
+    python manage.py reconcile_indexes --drop      # also rebuild changed and drop extra indexes
+"""
+
+from django.core.management.base import BaseCommand
+
+from mongodb_config import MongoDBConfig
+from api.mongodb_indexes import diff_indexes, apply_index_plan
+
+
+class Command(BaseCommand):
+    help = "Reconcile MongoDB indexes with api/mongodb_indexes.INDEX_MANIFEST"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Print the plan without changing anything')
+        parser.add_argument('--drop', action='store_true', help='Drop indexes that are not in the manifest and rebuild changed ones')
+
+    def handle(self, *args, **options):
+        db = MongoDBConfig.get_database()
+        plan = diff_indexes(db)
+
+        for entry in plan['create']:
+            self.stdout.write(f"+ {entry['collection']}.{entry['name']} {entry['options'] or ''}")
+        for entry in plan['changed']:
+            self.stdout.write(f"~ {entry['collection']}.{entry['name']} {entry['live_options']} -> {entry['options']}")
+        for entry in plan['replaced']:
+            self.stdout.write(f"- {entry['collection']}.{entry['name']} (replaced by {entry['replaced_by']})")
+        for entry in plan['extra']:
+            self.stdout.write(f"- {entry['collection']}.{entry['name']} (not in manifest)")
+
+        if not any(plan.values()):
+            self.stdout.write(self.style.SUCCESS("Indexes match the manifest"))
+            return
+
+        if options['dry_run']:
+            self.stdout.write("Dry run - no changes applied")
+            return
+
+        applied = apply_index_plan(db, plan, drop=options['drop'])
+        if applied['failed']:
+            self.stdout.write(self.style.ERROR(f"Applied with failures: {applied}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Applied: {applied}"))
@@ -0,0 +1,52 @@
+"""
+explain() every service query shape and fail if any of them needs a COLLSCAN.
+
+Meant for a local (or CI) mongod, e.g.:
+
+    MONGODB_ATLAS_URI=mongodb://localhost:27017 MONGODB_NAME=index_check \\
+        python manage.py verify_indexes --reconcile --seed
+"""
+
+from urllib.parse import urlparse
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mongodb_config import MongoDBConfig
+from api.mongodb_indexes import (
+    reconcile_indexes, seed_query_shapes, remove_seeded_documents, verify_query_plans
+)
+
+_LOCAL_HOSTS = {'localhost', '127.0.0.1', '::1', 'mongo', 'mongodb'}
+
+
+class Command(BaseCommand):
+    help = "Fail if any query in api/mongodb_indexes.QUERY_SHAPES is not index-backed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reconcile', action='store_true', help='Create missing manifest indexes first')
+        parser.add_argument('--seed', action='store_true', help='Insert (and afterwards remove) one sample document per collection')
+        parser.add_argument('--allow-remote', action='store_true', help='Allow running against a non-local cluster')
+
+    def handle(self, *args, **options):
+        config = MongoDBConfig.get_config()
+        host = urlparse(config['uri']).hostname or ''
+        if host not in _LOCAL_HOSTS and not options['allow_remote']:
+            raise CommandError(f"Refusing to run against '{host}' - pass --allow-remote to override")
+
+        db = MongoDBConfig.get_database()
+        if options['reconcile']:
+            reconcile_indexes(db)
+
+        seeded = seed_query_shapes(db) if options['seed'] else {}
+        try:
+            failures = verify_query_plans(db)
+        finally:
+            remove_seeded_documents(db, seeded)
+
+        for failure in failures:
+            self.stdout.write(self.style.ERROR(
+                f"COLLSCAN: {failure['collection']} filter={failure['filter']} sort={failure['sort']}"
+            ))
+        if failures:
+            raise CommandError(f"{len(failures)} query shape(s) are not index-backed")
+        self.stdout.write(self.style.SUCCESS("All query shapes use an index"))
@@ -8,9 +8,10 @@ from rest_framework.decorators import api_view, permission_classes, authenticati
 from rest_framework.permissions import IsAuthenticated, BasePermission
 from rest_framework.response import Response
 from django.http import JsonResponse
-from .mongodb_authentication import MongoDBJWTAuthentication, MongoDBUser
+from .mongodb_authentication import MongoDBJWTAuthentication, MongoDBUser, get_auth_context
 import json
 import logging
+from datetime import datetime, timezone
 
 class MongoDBIsAuthenticated(BasePermission):
     """
@@ -25,9 +26,11 @@ class MongoDBIsAuthenticated(BasePermission):
         )
 
 from .mongodb_service import (
-    UserService, AccountService, DebtService, BudgetService, TransactionService, JWTAuthService, WealthProjectionSettingsService
+    UserService, AccountService, DebtService, BudgetService, TransactionService, JWTAuthService, WealthProjectionSettingsService,
+    SyncService
 )
 from .mongodb_json_encoder import convert_objectid_to_str
+from .conditional_get import conditional_on
 from .wealth_projection import calculate_wealth_projection
 
 logger = logging.getLogger(__name__)
@@ -45,22 +48,10 @@ class MongoDBApiViews:
     
     @staticmethod
     def get_user_from_token(request):
-        """Extract user from JWT token"""
+        """Extract user from JWT token (reuses the request's auth context)"""
         try:
-            auth_header = request.headers.get('Authorization')
-            if not auth_header or not auth_header.startswith('Bearer '):
-                return None
-            
-            token = auth_header.split(' ')[1]
-            jwt_service = JWTAuthService()
-            payload = jwt_service.verify_token(token)
-            
-            if not payload:
-                return None
-            
-            user_service = UserService()
-            user = user_service.get_user_by_id(payload.get('user_id'))
-            return user
+            context = get_auth_context(request)
+            return context.user_data if context else None
             
         except Exception as e:
             logger.error(f"Error extracting user from token: {e}")
@@ -73,6 +64,7 @@ class AccountViews(MongoDBApiViews):
     @api_view(['GET'])
     @authentication_classes([MongoDBJWTAuthentication])
     @permission_classes([MongoDBIsAuthenticated])
+    @conditional_on('accounts')
     def get_accounts(request):
         """Get all accounts for the authenticated user"""
         try:
@@ -206,6 +198,7 @@ class DebtViews(MongoDBApiViews):
     @api_view(['GET'])
     @authentication_classes([MongoDBJWTAuthentication])
     @permission_classes([MongoDBIsAuthenticated])
+    @conditional_on('debts')
     def get_debts(request):
         """Get all debts for the authenticated user"""
         try:
@@ -400,6 +393,7 @@ class BudgetViews(MongoDBApiViews):
     @api_view(['GET'])
     @authentication_classes([MongoDBJWTAuthentication])
     @permission_classes([MongoDBIsAuthenticated])
+    @conditional_on('budgets')
     def get_budgets(request):
         """Get all budgets for the authenticated user"""
         try:
@@ -561,6 +555,7 @@ class BudgetViews(MongoDBApiViews):
     @api_view(['GET'])
     @authentication_classes([MongoDBJWTAuthentication])
     @permission_classes([MongoDBIsAuthenticated])
+    @conditional_on('budgets')
     def get_month_budget(request):
         """Get budget for a specific month and year"""
         try:
@@ -686,6 +681,229 @@ class BudgetViews(MongoDBApiViews):
                 'error': 'Internal server error'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    # Longest window the range endpoints accept, in months
+    MAX_RANGE_MONTHS = 120
+    
+    @staticmethod
+    def _parse_year_month(value: str):
+        """'2025-03' -> (2025, 3); raises ValueError for anything else"""
+        year, month = (int(part) for part in str(value).split('-'))
+        if month < 1 or month > 12:
+            raise ValueError(f"Invalid month in {value}")
+        return year, month
+
+    @staticmethod
+    @api_view(['GET'])
+    @authentication_classes([MongoDBJWTAuthentication])
+    @permission_classes([MongoDBIsAuthenticated])
+    @conditional_on('budgets')
+    def get_budget_range(request):
+        """Get every saved month from start to end inclusive (?start=2025-01&end=2026-12) in one query"""
+        try:
+            user = MongoDBApiViews.get_user_from_token(request)
+            if not user:
+                return Response({
+                    'error': 'Authentication required'
+                }, status=status.HTTP_401_UNAUTHORIZED)
+            
+            try:
+                start = BudgetViews._parse_year_month(request.GET.get('start'))
+                end = BudgetViews._parse_year_month(request.GET.get('end'))
+            except (TypeError, ValueError):
+                return Response({
+                    'error': 'start and end must be given as YYYY-MM'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            months = (end[0] - start[0]) * 12 + end[1] - start[1] + 1
+            if months < 1 or months > BudgetViews.MAX_RANGE_MONTHS:
+                return Response({
+                    'error': f'The range must cover between 1 and {BudgetViews.MAX_RANGE_MONTHS} months'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            budget_service = BudgetService()
+            budgets = budget_service.get_budgets_in_range(str(user['_id']), start, end)
+            
+            return Response({
+                'start': f'{start[0]}-{start[1]:02d}',
+                'end': f'{end[0]}-{end[1]:02d}',
+                'budgets': convert_objectid_to_str(budgets)
+            }, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            logger.error(f"Get budget range error: {e}")
+            return Response({
+                'error': 'Internal server error'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @staticmethod
+    @api_view(['POST'])
+    @authentication_classes([MongoDBJWTAuthentication])
+    @permission_classes([MongoDBIsAuthenticated])
+    def save_budget_range(request):
+        """
+        Save many months at once - the multi-month form of save_month_budget.
+        
+        Body: {"budgets": [{"month": 1, "year": 2026, "income": ..., "expenses": {...}}, ...]}
+        Each month is saved exactly as save-month would save it; all of them
+        go to MongoDB in one bulk write.
+        """
+        try:
+            user = MongoDBApiViews.get_user_from_token(request)
+            if not user:
+                return Response({
+                    'error': 'Authentication required'
+                }, status=status.HTTP_401_UNAUTHORIZED)
+            
+            data = json.loads(request.body)
+            budgets = data.get('budgets')
+            if not isinstance(budgets, list) or not budgets:
+                return Response({
+                    'error': 'budgets must be a non-empty list'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            if len(budgets) > BudgetViews.MAX_RANGE_MONTHS:
+                return Response({
+                    'error': f'At most {BudgetViews.MAX_RANGE_MONTHS} months can be saved at once'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Validate every month before writing any
+            for budget in budgets:
+                if not isinstance(budget, dict) or 'month' not in budget or 'year' not in budget:
+                    return Response({
+                        'error': 'Month and year are required for every budget'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                try:
+                    month = int(budget['month'])
+                    year = int(budget['year'])
+                except (TypeError, ValueError):
+                    return Response({
+                        'error': 'Month and year must be numbers'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                if month < 1 or month > 12:
+                    return Response({
+                        'error': 'Month must be between 1 and 12'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                if year < 2020 or year > 2030:
+                    return Response({
+                        'error': 'Year must be between 2020 and 2030'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+            
+            budget_service = BudgetService()
+            saved = budget_service.save_budgets(str(user['_id']), budgets)
+            
+            results = [
+                {'month': month, 'year': year, 'success': budget is not None}
+                for (month, year), budget in saved.items()
+            ]
+            saved_budgets = sorted(
+                (budget for budget in saved.values() if budget is not None),
+                key=lambda budget: (budget.get('year', 0), budget.get('month', 0))
+            )
+            
+            return Response({
+                'message': f'Saved {len(saved_budgets)} of {len(saved)} months',
+                'budgets': convert_objectid_to_str(saved_budgets),
+                'results': results
+            }, status=status.HTTP_200_OK)
+            
+        except json.JSONDecodeError:
+            return Response({
+                'error': 'Invalid JSON data'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as e:
+            return Response({
+                'error': f'Invalid data format: {str(e)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Save budget range error: {e}")
+            return Response({
+                'error': 'Internal server error'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @staticmethod
+    @api_view(['POST'])
+    @authentication_classes([MongoDBJWTAuthentication])
+    @permission_classes([MongoDBIsAuthenticated])
+    def propagate_budget(request):
+        """
+        Carry a month's income (and optionally expenses) into the months after it.
+        
+        Body: {"month": 3, "year": 2026, "months": 12,
+               "income": 6000, "additional_income": 1000,   # optional, default: the month's split
+               "copy_expenses": true | ["food", "housing"]}  # optional
+        Months that list a category in manually_edited_categories keep it.
+        Everything is written in one bulk upsert.
+        """
+        try:
+            user = MongoDBApiViews.get_user_from_token(request)
+            if not user:
+                return Response({
+                    'error': 'Authentication required'
+                }, status=status.HTTP_401_UNAUTHORIZED)
+            
+            data = json.loads(request.body)
+            if 'month' not in data or 'year' not in data:
+                return Response({
+                    'error': 'Month and year are required'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            month = int(data['month'])
+            year = int(data['year'])
+            months = int(data.get('months', 12))
+            if month < 1 or month > 12:
+                return Response({
+                    'error': 'Month must be between 1 and 12'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            if months < 1 or months > BudgetViews.MAX_RANGE_MONTHS:
+                return Response({
+                    'error': f'months must be between 1 and {BudgetViews.MAX_RANGE_MONTHS}'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            income = data.get('income')
+            additional_income = data.get('additional_income')
+            copy_expenses = data.get('copy_expenses') or []
+            if copy_expenses is True:
+                copy_expenses = BudgetService.EXPENSE_CATEGORIES
+            
+            budget_service = BudgetService()
+            result = budget_service.propagate_forward(
+                str(user['_id']), month, year, months,
+                total_income=float(income) if income is not None else None,
+                additional_income=float(additional_income) if additional_income is not None else None,
+                expense_categories=copy_expenses
+            )
+            
+            updated = result['updated']
+            updated_budgets = sorted(
+                (budget for budget in updated.values() if budget is not None),
+                key=lambda budget: (budget.get('year', 0), budget.get('month', 0))
+            )
+            failed = [{'month': m, 'year': y} for (m, y), budget in updated.items() if budget is None]
+            skipped = [
+                {'month': m, 'year': y, 'categories': categories}
+                for (m, y), categories in result['skipped'].items()
+            ]
+            
+            return Response({
+                'message': f'Propagated to {len(updated_budgets)} of {months} months',
+                'updated_budgets': convert_objectid_to_str(updated_budgets),
+                'skipped': skipped,
+                'failed': failed
+            }, status=status.HTTP_200_OK)
+            
+        except json.JSONDecodeError:
+            return Response({
+                'error': 'Invalid JSON data'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except (TypeError, ValueError) as e:
+            return Response({
+                'error': f'Invalid data format: {str(e)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Propagate budget error: {e}")
+            return Response({
+                'error': 'Internal server error'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
     @staticmethod
     @api_view(['GET'])
     @authentication_classes([])
@@ -805,6 +1023,62 @@ class BudgetViews(MongoDBApiViews):
                 'error': 'Internal server error'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class SyncViews(MongoDBApiViews):
+    """Delta sync for budgets, accounts and debts"""
+    
+    @staticmethod
+    def _parse_watermark(value: str):
+        """ISO 8601 watermark -> naive UTC datetime (as stored by the services)"""
+        watermark = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if watermark.tzinfo is not None:
+            watermark = watermark.astimezone(timezone.utc).replace(tzinfo=None)
+        return watermark
+    
+    @staticmethod
+    @api_view(['GET'])
+    @authentication_classes([MongoDBJWTAuthentication])
+    @permission_classes([MongoDBIsAuthenticated])
+    def get_changes(request):
+        """
+        Budgets, accounts and debts changed since ?since=<watermark>, plus the
+        ids deleted since then. Without since (or with one too old to have
+        every delete on record) the response is a full snapshot with
+        full=true. Pass the returned watermark as since on the next call.
+        """
+        try:
+            user = MongoDBApiViews.get_user_from_token(request)
+            if not user:
+                return Response({
+                    'error': 'Authentication required'
+                }, status=status.HTTP_401_UNAUTHORIZED)
+            
+            since = request.GET.get('since')
+            if since:
+                try:
+                    since = SyncViews._parse_watermark(since)
+                except ValueError:
+                    return Response({
+                        'error': 'since must be a watermark returned by a previous sync'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+            else:
+                since = None
+            
+            sync_service = SyncService()
+            result = sync_service.changes_since(str(user['_id']), since)
+            
+            return Response({
+                'watermark': result['watermark'].isoformat(),
+                'full': result['full'],
+                'changes': convert_objectid_to_str(result['changes']),
+                'deleted': result['deleted']
+            }, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            logger.error(f"Sync error: {e}")
+            return Response({
+                'error': 'Internal server error'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class TransactionViews(MongoDBApiViews):
     """Transaction management views"""
     
@@ -984,6 +1258,18 @@ def mongodb_save_month_budget(request):
 def mongodb_get_month_budget_test(request):
     return BudgetViews.get_month_budget_test(request)
 
+def mongodb_get_budget_range(request):
+    return BudgetViews.get_budget_range(request)
+
+def mongodb_save_budget_range(request):
+    return BudgetViews.save_budget_range(request)
+
+def mongodb_propagate_budget(request):
+    return BudgetViews.propagate_budget(request)
+
+def mongodb_sync(request):
+    return SyncViews.get_changes(request)
+
 def mongodb_get_transactions(request):
     return TransactionViews.get_transactions(request)
 
@@ -1016,53 +1302,58 @@ def mongodb_batch_update_budgets(request):
         
         logger.info(f"Batch updating {len(changes)} budget changes for user {user['_id']}")
         
-        # Process batch updates
-        budget_service = BudgetService()
-        updated_budgets = []
-        
-        for change in changes:
+        # Turn each change into the fields it sets; invalid changes are
+        # reported without touching the database
+        results = []
+        updates = []
+        for index, change in enumerate(changes):
             month = change.get('month')
             year = change.get('year')
             category = change.get('category')
             value = change.get('value')
             additional_income = change.get('additional_income')  # For income propagation
+            result = {'index': index, 'month': month, 'year': year, 'category': category, 'success': False}
+            results.append(result)
             
             if not all([month, year, category, value is not None]):
                 logger.warning(f"Invalid change data: {change}")
+                result['error'] = 'Invalid change data'
                 continue
             
-            try:
-                # For income changes with additional_income specified, use special handling
-                if category == 'Income' and additional_income is not None:
-                    result = budget_service.update_income_with_additional(
-                        user_id=str(user['_id']),
-                        month=month,
-                        year=year,
-                        total_income=value,
-                        additional_income=additional_income
-                    )
-                else:
-                    # Update or create budget entry
-                    result = budget_service.update_budget_field(
-                        user_id=str(user['_id']),
-                        month=month,
-                        year=year,
-                        category=category,
-                        value=value
-                    )
-                
-                if result:
-                    updated_budgets.append(result)
-                    logger.info(f"Updated {category} for {month}/{year}: {value}")
-                
-            except Exception as e:
-                logger.error(f"Failed to update {category} for {month}/{year}: {str(e)}")
+            # For income changes with additional_income specified, use special handling
+            if category == 'Income' and additional_income is not None:
+                fields = BudgetService.income_split_fields(value, additional_income)
+            else:
+                field_path = BudgetService.budget_field_path(category)
+                if field_path is None:
+                    logger.warning(f"Unknown category: {category}")
+                    result['error'] = 'Unknown category'
+                    continue
+                fields = {field_path: value}
+            updates.append((month, year, fields))
+            result['success'] = None
+        
+        # One bulk write for every month touched, one read to fetch them back
+        budget_service = BudgetService()
+        budgets = budget_service.batch_update_fields(str(user['_id']), updates)
+        
+        updated_budgets = []
+        for result in results:
+            if result['success'] is False:
                 continue
+            budget = budgets.get((result['month'], result['year']))
+            result['success'] = budget is not None
+            if budget is not None:
+                updated_budgets.append(budget)
+            else:
+                result['error'] = 'Write failed'
+                logger.error(f"Failed to update {result['category']} for {result['month']}/{result['year']}")
         
         return JsonResponse({
             'success': True,
             'message': f'Successfully updated {len(updated_budgets)} budget entries',
             'updated_budgets': [convert_objectid_to_str(budget) for budget in updated_budgets],
+            'results': results,
             'total_changes': len(changes),
             'successful_changes': len(updated_budgets)
         })
@@ -1135,6 +1426,7 @@ def mongodb_project_wealth(request):
 @api_view(['GET'])
 @authentication_classes([MongoDBJWTAuthentication])
 @permission_classes([MongoDBIsAuthenticated])
+@conditional_on('wealth_projection_settings')
 def mongodb_get_wealth_projection_settings(request):
     """
     Get wealth projection settings for the authenticated user.
@@ -1334,24 +1626,15 @@ def mongodb_import_financials(request):
         avg_debt_interest = sum(debt_interest_rates) / len(debt_interest_rates) if debt_interest_rates else 0.0
         
         # Get user's budget for annual contributions
-        budgets = budget_service.get_user_budgets(user_id)
-        budget = budgets[0] if budgets else None
+        budget = budget_service.get_latest_budget(
+            user_id, fields=['totals', 'income', 'additional_income', 'additional_income_items',
+                             'expenses', 'additional_items', 'savings_items']
+        )
         annual_contributions = 0.0
         
         if budget:
-            # Calculate annual contributions from budget
-            monthly_income = float(budget.get('income', 0))
-            additional_income_items = budget.get('additional_income_items', [])
-            additional_income = sum(float(item.get('amount', 0)) for item in additional_income_items)
-            total_monthly_income = monthly_income + additional_income
-            
-            # Calculate monthly expenses
-            expenses = budget.get('expenses', {})
-            monthly_expenses = sum(float(expenses.get(category, 0)) for category in expenses)
-            
-            # Annual contribution = (monthly income - monthly expenses) * 12
-            monthly_savings = total_monthly_income - monthly_expenses
-            annual_contributions = monthly_savings * 12
+            # Annual contribution = monthly net savings * 12
+            annual_contributions = BudgetService.totals_of(budget)['net_savings'] * 12
         
         # Return imported financial data
         financial_data = {
@@ -9,17 +9,30 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
 from django.views.decorators.http import require_http_methods
 import json
 import logging
 import os
 
 
-from .mongodb_service import UserService, JWTAuthService, SettingsService
+from .mongodb_service import UserService, JWTAuthService, SettingsService, AvatarService
+from .password_hashing import PasswordHasherBusy
+from .avatar_images import AvatarProcessingBusy, variant_names
+from .conditional_get import conditional_on, etag_matches
 
 logger = logging.getLogger(__name__)
 
+def avatar_url(request, avatar_id: str, variant: str = None) -> str:
+    """Absolute URL of an avatar (AVATAR_URL_BASE overrides the request's host)"""
+    path = AvatarService.avatar_path(avatar_id, variant)
+    base_url = getattr(settings, 'AVATAR_URL_BASE', '')
+    if base_url:
+        return f"{base_url.rstrip('/')}{path}"
+    return request.build_absolute_uri(path)
+
+
 class MongoDBAuthViews:
     """MongoDB-based authentication views"""
     
@@ -51,27 +64,24 @@ class MongoDBAuthViews:
                     'message': 'Please enter your username and password to continue'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Check if user exists first
+            # One user fetch; bcrypt runs on the bounded hashing pool
             user_service = UserService()
-            existing_user = user_service.get_user_by_username(username)
+            outcome, user = user_service.login_user(username, password)
             
-            if not existing_user:
+            if outcome == UserService.LOGIN_USER_NOT_FOUND:
                 return Response({
                     'error': 'User not found',
                     'message': f"No account found with username '{username}'. Please check your username or sign up for a new account."
                 }, status=status.HTTP_401_UNAUTHORIZED)
             
             # Check if account is active
-            if not existing_user.get('is_active', True):
+            if outcome == UserService.LOGIN_DISABLED:
                 return Response({
                     'error': 'Account disabled',
                     'message': 'Your account has been disabled. Please contact support for assistance.'
                 }, status=status.HTTP_401_UNAUTHORIZED)
             
-            # Authenticate user with password
-            user = user_service.authenticate_user(username, password)
-            
-            if not user:
+            if outcome != UserService.LOGIN_OK:
                 return Response({
                     'error': 'Incorrect password',
                     'message': 'The password you entered is incorrect. Please try again or reset your password.'
@@ -111,6 +121,11 @@ class MongoDBAuthViews:
                 'error': 'Invalid request format',
                 'message': 'The request data is not properly formatted. Please try again.'
             }, status=status.HTTP_400_BAD_REQUEST)
+        except PasswordHasherBusy:
+            return Response({
+                'error': 'Server busy',
+                'message': 'We are handling a lot of sign-ins right now. Please try again in a few seconds.'
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '5'})
         except Exception as e:
             logger.error(f"Login error: {e}")
             return Response({
@@ -230,6 +245,11 @@ class MongoDBAuthViews:
                 'error': 'Invalid request format',
                 'message': 'The request data is not properly formatted. Please try again.'
             }, status=status.HTTP_400_BAD_REQUEST)
+        except PasswordHasherBusy:
+            return Response({
+                'error': 'Server busy',
+                'message': 'We are handling a lot of sign-ins right now. Please try again in a few seconds.'
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '5'})
         except Exception as e:
             logger.error(f"Registration error: {e}")
             return Response({
@@ -564,17 +584,30 @@ class MongoDBAuthViews:
             
             # Update profile image
             user_service = UserService()
-            image_url = user_service.update_profile_image(
+            avatar = user_service.update_profile_image(
                 payload.get('user_id'), 
                 image_data, 
-                image_file.name
+                image_file.name,
+                content_type=image_file.content_type,
+                url_for=lambda avatar_id, variant=None: avatar_url(request, avatar_id, variant)
             )
             
             return Response({
                 'message': 'Profile image uploaded successfully',
-                'image_url': image_url
+                'image_url': avatar['image_url'],
+                'thumbnails': avatar['thumbnails']
             }, status=status.HTTP_200_OK)
             
+        except ValueError as e:
+            return Response({
+                'error': 'Invalid image file',
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except AvatarProcessingBusy:
+            return Response({
+                'error': 'Server busy',
+                'message': 'We are processing a lot of images right now. Please try again in a few seconds.'
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '5'})
         except Exception as e:
             logger.error(f"Upload profile image error: {e}")
             return Response({
@@ -623,6 +656,7 @@ class MongoDBAuthViews:
     
     @staticmethod
     @api_view(['GET'])
+    @conditional_on('settings')
     def get_settings(request):
         """Get user settings endpoint"""
         try:
@@ -759,4 +793,34 @@ def mongodb_get_settings(request):
 @csrf_exempt
 def mongodb_update_settings(request):
     """MongoDB update settings view function"""
-    return MongoDBAuthViews.update_settings(request) 
\ No newline at end of file
+    return MongoDBAuthViews.update_settings(request) 
+
+@require_http_methods(["GET", "HEAD"])
+def mongodb_get_avatar(request, avatar_id, variant=None):
+    """
+    Serve an avatar image, or one of its thumbnails (e.g. 128.webp).
+    
+    Avatars are content-addressed, so the id (plus variant) is a strong ETag
+    and the response can be cached for a year; a new image always gets a new
+    URL. No token is needed, as image tags cannot send one.
+    """
+    if variant is not None and variant not in variant_names():
+        return JsonResponse({'error': 'Unknown avatar size'}, status=404)
+    
+    etag = f'"{avatar_id}-{variant}"' if variant else f'"{avatar_id}"'
+    cache_control = 'public, max-age=31536000, immutable'
+    
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
+    
+    avatar = AvatarService().get(avatar_id, variant)
+    if not avatar:
+        return JsonResponse({'error': 'Avatar not found'}, status=404)
+    
+    response = HttpResponse(bytes(avatar['data']), content_type=avatar.get('content_type', 'image/jpeg'))
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    return response
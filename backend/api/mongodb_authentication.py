@@ -8,43 +8,78 @@ from django.contrib.auth.models import AnonymousUser
 from .mongodb_service import JWTAuthService, UserService
 
 
-class MongoDBJWTAuthentication(authentication.BaseAuthentication):
-    """Custom authentication class for MongoDB JWT tokens"""
+AUTH_CONTEXT_ATTR = '_mongodb_auth_context'
+
+
+class MongoDBAuthContext:
+    """Result of verifying a request's JWT and loading its user (computed once per request)"""
     
-    def authenticate(self, request):
-        """Authenticate the request and return a two-tuple of (user, token)."""
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
+    __slots__ = ('token', 'payload', 'user_data', 'user')
+    
+    def __init__(self, token, payload, user_data):
+        self.token = token
+        self.payload = payload
+        self.user_data = user_data
+        self.user = MongoDBUser(user_data)
+
+
+def _build_auth_context(http_request):
+    """Verify the bearer token and load the user from MongoDB"""
+    auth_header = http_request.META.get('HTTP_AUTHORIZATION')
+    
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None
+    
+    token = auth_header.split(' ')[1]
+    
+    try:
+        # Verify token using our MongoDB JWT service
+        jwt_service = JWTAuthService()
+        payload = jwt_service.verify_token(token)
         
-        if not auth_header:
+        if not payload:
             return None
         
-        if not auth_header.startswith('Bearer '):
+        # Get user from MongoDB
+        user_service = UserService()
+        user_data = user_service.get_user_by_id(payload.get('user_id'))
+        
+        if not user_data:
             return None
         
-        token = auth_header.split(' ')[1]
+        return MongoDBAuthContext(token, payload, user_data)
         
-        try:
-            # Verify token using our MongoDB JWT service
-            jwt_service = JWTAuthService()
-            payload = jwt_service.verify_token(token)
-            
-            if not payload:
-                return None
-            
-            # Get user from MongoDB
-            user_service = UserService()
-            user_data = user_service.get_user_by_id(payload.get('user_id'))
-            
-            if not user_data:
-                return None
-            
-            # Create a simple user object for Django
-            user = MongoDBUser(user_data)
-            
-            return (user, token)
-            
-        except Exception as e:
+    except Exception as e:
+        return None
+
+
+def get_auth_context(request):
+    """
+    Get the request's auth context, verifying the token and fetching the user
+    at most once per request. Accepts either a DRF Request or a Django
+    HttpRequest; the context is stored on the underlying HttpRequest so the
+    authentication class and every view helper share it.
+    """
+    http_request = getattr(request, '_request', request)
+    if hasattr(http_request, AUTH_CONTEXT_ATTR):
+        return getattr(http_request, AUTH_CONTEXT_ATTR)
+    
+    context = _build_auth_context(http_request)
+    setattr(http_request, AUTH_CONTEXT_ATTR, context)
+    return context
+
+
+class MongoDBJWTAuthentication(authentication.BaseAuthentication):
+    """Custom authentication class for MongoDB JWT tokens"""
+    
+    def authenticate(self, request):
+        """Authenticate the request and return a two-tuple of (user, token)."""
+        context = get_auth_context(request)
+        
+        if not context:
             return None
+        
+        return (context.user, context.token)
 
 class MongoDBUser:
     """Simple user object for MongoDB authentication"""
@@ -82,32 +117,5 @@ class MongoDBUser:
 
 def get_user_from_token(request):
     """Extract user from JWT token in request"""
-    auth_header = request.META.get('HTTP_AUTHORIZATION')
-    
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return None
-    
-    token = auth_header.split(' ')[1]
-    
-    try:
-        # Verify token using our MongoDB JWT service
-        jwt_service = JWTAuthService()
-        payload = jwt_service.verify_token(token)
-        
-        if not payload:
-            return None
-        
-        # Get user from MongoDB
-        user_service = UserService()
-        user_data = user_service.get_user_by_id(payload.get('user_id'))
-        
-        if not user_data:
-            return None
-        
-        # Create a simple user object for Django
-        user = MongoDBUser(user_data)
-        
-        return user
-        
-    except Exception as e:
-        return None 
\ No newline at end of file
+    context = get_auth_context(request)
+    return context.user if context else None
@@ -0,0 +1,322 @@
+"""
+In-process and shared caches for MongoDB-backed data
+
+LocalTTLCache is a bounded, thread-safe LRU with per-entry expiry that lives
+in one worker process. DjangoCacheBackend stores entries in a Django cache
+alias (e.g. Redis or Memcached configured in CACHES) so every worker sees the
+same data and the same invalidations. Both expose the same small interface:
+get / set / delete / clear / stats.
+
+Caches register their stats with register_metrics(); collect_metrics() is
+served by the /api/mongodb/metrics/ endpoint.
+"""
+
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+
+_MISSING = object()
+
+# name -> callable returning a stats dict, reported by the metrics endpoint
+_METRICS_SOURCES: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def register_metrics(name: str, source: Callable[[], Dict[str, Any]]) -> None:
+    _METRICS_SOURCES[name] = source
+
+
+def collect_metrics() -> Dict[str, Dict[str, Any]]:
+    return {name: source() for name, source in _METRICS_SOURCES.items()}
+
+
+class LocalTTLCache:
+    """Bounded LRU cache with a TTL, local to this process"""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'backend': 'local',
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class DjangoCacheBackend:
+    """Cache stored in a Django cache alias, shared by all worker processes"""
+
+    def __init__(self, alias: str = 'default', prefix: str = 'mongodb', ttl: float = 60.0):
+        self.alias = alias
+        self.prefix = prefix
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def _cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def _generation(self) -> int:
+        # clear() bumps the generation instead of deleting every key
+        generation_key = f'{self.prefix}:generation'
+        generation = self._cache.get(generation_key)
+        if generation is None:
+            self._cache.add(generation_key, 1, timeout=None)
+            generation = self._cache.get(generation_key, 1)
+        return generation
+
+    def _key(self, key: str) -> str:
+        return f'{self.prefix}:{self._generation()}:{key}'
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._cache.get(self._key(key), _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._cache.set(self._key(key), value, timeout=self.ttl if ttl is None else ttl)
+
+    def delete(self, key: str) -> None:
+        self._cache.delete(self._key(key))
+
+    def clear(self) -> None:
+        generation_key = f'{self.prefix}:generation'
+        try:
+            self._cache.incr(generation_key)
+        except ValueError:
+            self._cache.set(generation_key, 2, timeout=None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'backend': f'django:{self.alias}',
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+def build_cache(setting_name: str, prefix: str, defaults: Dict[str, Any]):
+    """
+    Build a cache from a settings dict such as:
+
+        MONGODB_USER_CACHE = {'BACKEND': 'django', 'ALIAS': 'default', 'TTL': 60}
+        MONGODB_USER_CACHE = {'BACKEND': 'local', 'MAX_SIZE': 1024, 'TTL': 60}
+    """
+    config = dict(defaults)
+    config.update(getattr(settings, setting_name, None) or {})
+    if config.get('BACKEND') == 'django':
+        return DjangoCacheBackend(alias=config.get('ALIAS', 'default'), prefix=prefix, ttl=config['TTL'])
+    return LocalTTLCache(max_size=config['MAX_SIZE'], ttl=config['TTL'])
+
+
+class UserCache:
+    """
+    Cache of user documents (without password hashes) keyed by user id.
+
+    Entries are copied on the way in and out so callers can mutate the
+    returned document without corrupting the cache. Every UserService write
+    invalidates the user's entry.
+    """
+
+    _backend = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def backend(cls):
+        if cls._backend is None:
+            with cls._lock:
+                if cls._backend is None:
+                    cls._backend = build_cache('MONGODB_USER_CACHE', 'user', {
+                        'BACKEND': 'local', 'MAX_SIZE': 1024, 'TTL': 60,
+                    })
+        return cls._backend
+
+    @classmethod
+    def set_backend(cls, backend) -> None:
+        """Swap the backend (e.g. a fresh LocalTTLCache in tests)"""
+        cls._backend = backend
+
+    @classmethod
+    def get(cls, user_id) -> Optional[Dict]:
+        user = cls.backend().get(str(user_id))
+        return copy.deepcopy(user) if user is not None else None
+
+    @classmethod
+    def set(cls, user_id, user: Dict) -> None:
+        cls.backend().set(str(user_id), copy.deepcopy(user))
+
+    @classmethod
+    def invalidate(cls, user_id) -> None:
+        cls.backend().delete(str(user_id))
+
+    @classmethod
+    def clear(cls) -> None:
+        cls.backend().clear()
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return cls.backend().stats()
+
+
+class TokenPayloadCache:
+    """
+    Verified JWT payloads keyed by the token's SHA-256, local to this process.
+
+    An entry never outlives the token's own exp claim, so a cached payload is
+    exactly what jwt.decode would have returned. Only tokens that passed
+    signature verification are ever stored.
+    """
+
+    _backend = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def backend(cls) -> LocalTTLCache:
+        if cls._backend is None:
+            with cls._lock:
+                if cls._backend is None:
+                    config = {'MAX_SIZE': 4096, 'TTL': 300}
+                    config.update(getattr(settings, 'MONGODB_TOKEN_CACHE', None) or {})
+                    cls._backend = LocalTTLCache(max_size=config['MAX_SIZE'], ttl=config['TTL'])
+        return cls._backend
+
+    @classmethod
+    def set_backend(cls, backend) -> None:
+        cls._backend = backend
+
+    @classmethod
+    def get(cls, token_hash: str) -> Optional[Dict]:
+        payload = cls.backend().get(token_hash)
+        return dict(payload) if payload is not None else None
+
+    @classmethod
+    def set(cls, token_hash: str, payload: Dict) -> None:
+        backend = cls.backend()
+        ttl = backend.ttl
+        if 'exp' in payload:
+            ttl = min(ttl, float(payload['exp']) - time.time())
+        if ttl > 0:
+            backend.set(token_hash, dict(payload), ttl=ttl)
+
+    @classmethod
+    def invalidate(cls, token_hash: str) -> None:
+        cls.backend().delete(token_hash)
+
+    @classmethod
+    def clear(cls) -> None:
+        cls.backend().clear()
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return cls.backend().stats()
+
+
+class PlanCache:
+    """
+    Debt planner responses keyed by a hash of their normalized inputs.
+
+    Plans are pure functions of the debts, strategy and budget schedule, so
+    the key is the content itself: the same request from any screen finds
+    the same entry. Callers add the user's debts and budgets versions
+    (MongoDBService.bump_versions) to the key, so any DebtService or
+    BudgetService write makes the user's older entries unreachable.
+
+    Bodies are returned as stored and must not be mutated; copying one
+    would cost about as much as recomputing it.
+    """
+
+    _backend = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def backend(cls):
+        if cls._backend is None:
+            with cls._lock:
+                if cls._backend is None:
+                    cls._backend = build_cache('MONGODB_PLAN_CACHE', 'debt_plan', {
+                        'BACKEND': 'local', 'MAX_SIZE': 256, 'TTL': 600,
+                    })
+        return cls._backend
+
+    @classmethod
+    def set_backend(cls, backend) -> None:
+        cls._backend = backend
+
+    @staticmethod
+    def key(*parts) -> str:
+        """SHA-256 of the parts as canonical JSON"""
+        canonical = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    @classmethod
+    def get(cls, key: str) -> Optional[Dict]:
+        return cls.backend().get(key)
+
+    @classmethod
+    def set(cls, key: str, body: Dict) -> None:
+        cls.backend().set(key, body)
+
+    @classmethod
+    def clear(cls) -> None:
+        cls.backend().clear()
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return cls.backend().stats()
+
+
+register_metrics('user_cache', UserCache.stats)
+register_metrics('jwt_payload_cache', TokenPayloadCache.stats)
+register_metrics('debt_plan_cache', PlanCache.stats)
@@ -5,11 +5,21 @@ from rest_framework import status
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.contrib.auth.models import User
 from .mongodb_authentication import get_user_from_token, MongoDBJWTAuthentication
-import math
+from .debt_payoff import (
+    COMPARABLE_STRATEGIES, MAX_MONTHS, PAID_OFF, STRATEGIES, canonical_net_savings, parse_debts, parse_net_savings,
+    simulate_payoff, simulate_payoff_events, simulate_strategies, strategy_order
+)
+from .mongodb_cache import PlanCache
+from .mongodb_service import MongoDBService
 import logging
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
+PLAN_MODES = ('monthly', 'events')
+PLAN_FORMATS = ('rows', 'columnar', 'summary')
+
 @api_view(['POST'])
 @authentication_classes([])
 @permission_classes([])
@@ -19,6 +29,142 @@ def mongodb_debt_planner_test(request):
     """
     return mongodb_debt_planner_logic(request)
 
+def _round_rows(names, *columns):
+    """Per-debt plan rows for one month, every figure rounded to cents"""
+    balance, paid, interest, total_paid, total_interest = (column.tolist() for column in columns)
+    return [{
+        'name': name,
+        'balance': round(balance[i], 2),
+        'paid': round(paid[i], 2),
+        'interest': round(interest[i], 2),
+        'interest_payment': round(interest[i], 2),
+        'total_paid': round(total_paid[i], 2),
+        'total_interest': round(total_interest[i], 2)
+    } for i, name in enumerate(names)]
+
+
+def _sampled_rows(row_count, points):
+    """At most points row indices spread evenly over the plan, keeping the first and last"""
+    return np.unique(np.linspace(0, row_count - 1, min(points, row_count)).round().astype(int))
+
+
+def _period_sums(values, rows):
+    """values summed over each sampled row's period (after the previous sampled row)"""
+    running = np.cumsum(values, axis=0)[rows]
+    running[1:] -= running[:-1].copy()
+    return running
+
+
+def _cents(values):
+    """Rounded to cents in one vectorized pass (the row format rounds per value)"""
+    return np.round(values, 2).tolist()
+
+
+def _plan_cache_key(user, *inputs):
+    """
+    PlanCache key for normalized planner inputs. A signed-in user's debts and
+    budgets versions are part of it, so their writes retire older entries;
+    None (no caching) when those versions cannot be read.
+    """
+    versions = {}
+    if user is not None:
+        try:
+            versions = MongoDBService().get_versions(user.id)
+        except Exception as e:
+            logger.warning(f"Could not read collection versions, planning without the cache: {e}")
+            return None
+    return PlanCache.key(*inputs, versions.get('debts', 0), versions.get('budgets', 0))
+
+
+def parse_plan_format(data):
+    """
+    (format, points) from a planner request: format is "rows" (default, one
+    dict per debt per month), "columnar" (one array per debt and figure) or
+    "summary" (totals only); points downsamples the plan to at most that many
+    rows. Raises ValueError for invalid values.
+    """
+    plan_format = data.get('format', 'rows')
+    if plan_format not in PLAN_FORMATS:
+        raise ValueError(f'Format must be one of: {", ".join(PLAN_FORMATS)}.')
+    points = data.get('points')
+    if points is not None and (not isinstance(points, int) or isinstance(points, bool) or points < 2):
+        raise ValueError('Points must be a whole number of at least 2.')
+    return plan_format, points
+
+
+def plan_response(names, rates, result, mode='monthly', plan_format='rows', points=None):
+    """
+    The debt planner's JSON body for a simulated plan.
+
+    With points, paid and interest are summed over the months between kept
+    rows so the sampled plan still adds up, and so are the interest payments:
+    monthly_interest_payments then has one entry per plan row (0 for the
+    starting month) like the event-mode interest_payments.
+    """
+    body = {}
+    monthly_interest = result.monthly_interest
+    if plan_format != 'summary':
+        month_numbers = result.month_numbers
+        balance, total_paid, total_interest = result.balance, result.total_paid, result.total_interest_by_debt
+        paid, interest, row_interest = result.paid, result.interest, result.monthly_interest
+        if points is not None and len(month_numbers) > points:
+            rows = _sampled_rows(len(month_numbers), points)
+            if mode == 'events':
+                row_interest = _period_sums(row_interest, rows)
+            else:
+                # Row 0 is the starting month, before any interest accrues
+                monthly_interest = _period_sums(np.concatenate(([0.0], monthly_interest)), rows)
+            month_numbers, balance, total_paid, total_interest = (
+                values[rows] for values in (month_numbers, balance, total_paid, total_interest)
+            )
+            paid, interest = _period_sums(paid, rows), _period_sums(interest, rows)
+
+        if plan_format == 'columnar':
+            balance, paid, interest, total_paid, total_interest = (
+                _cents(values.T) for values in (balance, paid, interest, total_paid, total_interest)
+            )
+            body['columns'] = {
+                'month': month_numbers.tolist(),
+                'debts': [{
+                    'name': name,
+                    'balance': balance[i],
+                    'paid': paid[i],
+                    'interest': interest[i],
+                    'total_paid': total_paid[i],
+                    'total_interest': total_interest[i]
+                } for i, name in enumerate(names)]
+            }
+        else:
+            body['plan'] = [{
+                'month': month,
+                'debts': _round_rows(names, balance[row], paid[row], interest[row], total_paid[row], total_interest[row])
+            } for row, month in enumerate(month_numbers.tolist())]
+
+    final_balance = result.final_balance.tolist()
+    final_paid = result.final_total_paid.tolist()
+    final_interest = result.final_total_interest.tolist()
+    body['months'] = result.months
+    body['total_interest'] = round(result.total_interest, 2)
+    if plan_format != 'summary' and mode == 'events':
+        # One entry per plan row: interest accrued over the row's period
+        body['mode'] = mode
+        body['interest_payments'] = [round(x, 2) for x in row_interest.tolist()]
+    elif plan_format != 'summary':
+        body['monthly_interest_payments'] = [round(x, 2) for x in monthly_interest.tolist()]
+    return {
+        **body,
+        'hit_max_months': result.hit_max_months,
+        'remaining_debts': int((result.final_balance > PAID_OFF).sum()),
+        'debts': [{
+            'name': name,
+            'balance': round(final_balance[i], 2),
+            'rate': round(rates[i] * 100, 2),
+            'total_paid': round(final_paid[i], 2),
+            'total_interest': round(final_interest[i], 2)
+        } for i, name in enumerate(names)]
+    }
+
+
 def mongodb_debt_planner_logic(request):
     """
     MongoDB-specific debt planner logic (shared between authenticated and test endpoints)
@@ -27,233 +173,69 @@ def mongodb_debt_planner_logic(request):
         # For test endpoint, use default user ID
         if request.path.endswith('/test/') or request.path.endswith('/debt-planner-test/'):
             user = {'_id': '68a48a902dcc7d3db3e997e6'}  # Default test user
+            owner = None
         else:
             # Get user from token using MongoDB authentication
             user = get_user_from_token(request)
             if not user:
                 return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
-        
+            owner = user
+
         data = request.data
-        debts = data.get('debts', [])
         strategy = data.get('strategy', 'snowball')
         monthly_budget_data = data.get('monthly_budget_data', [])
 
-        # Validate strategy
-        if strategy not in ['snowball', 'avalanche']:
+        if strategy not in STRATEGIES:
             return Response({'error': 'Strategy must be either "snowball" or "avalanche".'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Validate monthly_budget_data
         if monthly_budget_data and not isinstance(monthly_budget_data, list):
             return Response({'error': 'Monthly budget data must be a list.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        logger.info(f"Starting debt planner with strategy: {strategy}")
-        logger.info(f"Monthly budget data provided: {len(monthly_budget_data)} months")
-        logger.info("Monthly budget data details:")
-        for budget_item in monthly_budget_data:
-            logger.info(f"  Month {budget_item.get('month')}: Net savings ${budget_item.get('net_savings', 0):.2f}")
-        logger.info("Initial debts:")
-        for d in debts:
-            logger.info(f"- {d.get('name', 'Unknown')}: ${d.get('balance', 0):.2f} at {d.get('rate', 0)*100}% (rate as decimal: {d.get('rate', 0)})")
-
-        # Validate debts
-        if not debts or not isinstance(debts, list):
-            return Response({'error': 'Debts must be a list.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Prepare debts with proper validation and field mapping
-        for d in debts:
-            try:
-                # Ensure required fields exist
-                if 'name' not in d or not d['name']:
-                    return Response({'error': f'Debt name is required for all debts.'}, status=status.HTTP_400_BAD_REQUEST)
-                
-                if 'balance' not in d or d['balance'] is None:
-                    return Response({'error': f'Balance is required for debt: {d["name"]}'}, status=status.HTTP_400_BAD_REQUEST)
-                
-                if 'rate' not in d or d['rate'] is None:
-                    return Response({'error': f'Interest rate is required for debt: {d["name"]}'}, status=status.HTTP_400_BAD_REQUEST)
-                
-                # Convert and validate balance
-                d['balance'] = float(d['balance'])
-                if d['balance'] < 0:
-                    return Response({'error': f'Balance cannot be negative for debt: {d["name"]}'}, status=status.HTTP_400_BAD_REQUEST)
-                
-                # Convert and validate interest rate
-                original_rate = d['rate']
-                d['rate'] = float(d['rate'])  # Already converted to decimal by frontend
-                if d['rate'] < 0 or d['rate'] > 1:  # Rate should be between 0 and 1 (0% to 100%)
-                    return Response({'error': f'Interest rate must be between 0 and 1 (0% to 100%) for debt: {d["name"]}'}, status=status.HTTP_400_BAD_REQUEST)
-                
-                # Set default values
-                d['name'] = d.get('name', 'Debt')
-                d['total_paid'] = 0
-                d['total_interest'] = 0
-                
-                logger.info(f"Prepared {d['name']} - Original rate: {original_rate}, Final rate: {d['rate']} ({d['rate']*100}%), Balance: ${d['balance']:.2f}")
-                
-            except (ValueError, TypeError) as e:
-                return Response({'error': f'Invalid data format for debt: {d.get("name", "Unknown")}. Error: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Sort debts based on strategy
-        if strategy == 'snowball':
-            debts.sort(key=lambda d: d['balance'])
-            logger.info("Sorted debts by balance (snowball - smallest to largest)")
-        else:  # avalanche
-            debts.sort(key=lambda d: d['rate'], reverse=True)
-            logger.info("Sorted debts by interest rate (avalanche - highest to lowest)")
-
-        month = 0
-        plan = []
-        total_interest = 0
-        monthly_interest_payments = []
-
-        # Add initial month
-        initial_month = {'month': 0, 'debts': []}
-        for d in debts:
-            initial_month['debts'].append({
-                'name': d['name'],
-                'balance': round(d['balance'], 2),
-                'paid': 0,
-                'interest': 0,
-                'interest_payment': 0,
-                'total_paid': 0,
-                'total_interest': 0
-            })
-        plan.append(initial_month)
-
-        max_months = 360  # 30 years maximum (more realistic for long-term debt)
-        while any(d['balance'] > 0.01 for d in debts) and month < max_months:
-            month += 1
-            month_plan = {'month': month, 'debts': []}
-            
-            # Calculate net savings for this month
-            net_savings = 0
-            if monthly_budget_data and len(monthly_budget_data) > 0:
-                # Find the budget data for this specific month
-                # The frontend sends month numbers starting from 1, so we need to convert to 0-based index
-                month_budget = None
-                if month <= len(monthly_budget_data):
-                    # Use the month index (0-based) to get the corresponding budget data
-                    month_budget = monthly_budget_data[month - 1]
-                    logger.info(f"Debt Payoff Month {month} using budget data index {month - 1}")
-                else:
-                    # If we've exceeded the available budget data, use the last available month
-                    month_budget = monthly_budget_data[-1]
-                    logger.info(f"Debt Payoff Month {month} using last available budget data (index {len(monthly_budget_data) - 1})")
-                
-                if month_budget:
-                    try:
-                        net_savings = float(month_budget.get('net_savings', 0))
-                        logger.info(f"Debt Payoff Month {month} net savings: ${net_savings:.2f} (found budget data)")
-                    except (ValueError, TypeError) as e:
-                        logger.warning(f"Invalid net_savings value for month {month}: {month_budget.get('net_savings')}. Using 0. Error: {e}")
-                        net_savings = 0
-                else:
-                    # Use the last available month's data as fallback
-                    if monthly_budget_data:
-                        last_month_budget = monthly_budget_data[-1]
-                        try:
-                            net_savings = float(last_month_budget.get('net_savings', 0))
-                            logger.info(f"Debt Payoff Month {month} using last available net savings: ${net_savings:.2f} (fallback)")
-                        except (ValueError, TypeError) as e:
-                            logger.warning(f"Invalid net_savings value in fallback: {last_month_budget.get('net_savings')}. Using 0. Error: {e}")
-                            net_savings = 0
-                    else:
-                        net_savings = 0
-                        logger.info(f"Debt Payoff Month {month} no budget data available, net savings: $0.00")
-            else:
-                net_savings = 0
-                logger.info(f"Debt Payoff Month {month} no budget data available, net savings: $0.00")
-            
-            # Calculate monthly interest for all debts and add it to balances
-            month_interest = 0
-            debt_interest = {}
-            for d in debts:
-                if d['balance'] <= 0:
-                    debt_interest[d['name']] = 0
-                    continue
-                initial_balance = d['balance']
-                monthly_rate = d['rate'] / 12
-                interest = d['balance'] * monthly_rate
-                debt_interest[d['name']] = interest
-                month_interest += interest
-                total_interest += interest
-                d['total_interest'] += interest
-                d['balance'] += interest
-                logger.info(f"{d['name']} - Initial balance: ${initial_balance:.2f}, Monthly interest: ${interest:.2f}, New balance: ${d['balance']:.2f}")
-
-            # One-by-one allocation (snowball or avalanche ordering)
-            available_to_pay = max(0, net_savings)
-            ordered_debts = [d for d in debts if d['balance'] > 0.01]
-            if strategy == 'snowball':
-                ordered_debts.sort(key=lambda d: d['balance'])
+        # "events" jumps between payoffs and budget changes instead of
+        # stepping every month; "sample_months" then picks the rows to report
+        # ("months" is already sent by clients as the number of budget months)
+        mode = data.get('mode', 'monthly')
+        if mode not in PLAN_MODES:
+            return Response({'error': 'Mode must be either "monthly" or "events".'}, status=status.HTTP_400_BAD_REQUEST)
+        sample_months = data.get('sample_months') if mode == 'events' else None
+        if sample_months is not None and (
+            not isinstance(sample_months, list)
+            or not all(isinstance(m, int) and not isinstance(m, bool) and 0 <= m <= MAX_MONTHS for m in sample_months)
+        ):
+            return Response({'error': f'Sample months must be a list of month numbers from 0 to {MAX_MONTHS}.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            plan_format, points = parse_plan_format(data)
+            names, balances, rates = parse_debts(data.get('debts', []))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Debts are reported in strategy order
+        order = strategy_order(balances, rates, strategy).tolist()
+        names = [names[i] for i in order]
+        balances = [balances[i] for i in order]
+        rates = [rates[i] for i in order]
+
+        net_savings = parse_net_savings(monthly_budget_data)
+        cache_key = _plan_cache_key(
+            owner, 'plan', names, balances, rates, strategy, canonical_net_savings(net_savings),
+            mode, sorted(set(sample_months)) if sample_months is not None else None, plan_format, points
+        )
+        body = PlanCache.get(cache_key) if cache_key else None
+        if body is None:
+            if mode == 'events':
+                result = simulate_payoff_events(balances, rates, net_savings, strategy, months=sample_months)
             else:
-                ordered_debts.sort(key=lambda d: d['rate'], reverse=True)
-
-            # Initialize month rows for all debts (paid defaults to 0)
-            debt_to_plan = {d['name']: {'name': d['name'], 'balance': d['balance'], 'paid': 0, 'interest': round(debt_interest[d['name']], 2), 'interest_payment': round(debt_interest[d['name']], 2), 'total_paid': d['total_paid'], 'total_interest': d['total_interest']} for d in debts}
-
-            for d in ordered_debts:
-                if available_to_pay <= 0:
-                    break
-                pay = min(available_to_pay, d['balance'])
-                d['balance'] -= pay
-                d['total_paid'] += pay
-                available_to_pay -= pay
-                # Update snapshot
-                debt_to_plan[d['name']]['balance'] = d['balance']
-                debt_to_plan[d['name']]['paid'] = round(pay, 2)
-                debt_to_plan[d['name']]['total_paid'] = round(d['total_paid'], 2)
-                debt_to_plan[d['name']]['total_interest'] = round(d['total_interest'], 2)
-
-            # Push all debts for this month into plan in stable order
-            for d in debts:
-                month_plan['debts'].append({
-                    'name': d['name'],
-                    'balance': round(debt_to_plan[d['name']]['balance'], 2),
-                    'paid': round(debt_to_plan[d['name']]['paid'], 2),
-                    'interest': round(debt_to_plan[d['name']]['interest'], 2),
-                    'interest_payment': round(debt_to_plan[d['name']]['interest_payment'], 2),
-                    'total_paid': round(debt_to_plan[d['name']]['total_paid'], 2),
-                    'total_interest': round(debt_to_plan[d['name']]['total_interest'], 2)
-                })
-
-            monthly_interest_payments.append(month_interest)
-            plan.append(month_plan)
-
-        logger.info("\nFinal Summary:")
-        for d in debts:
-            logger.info(f"{d['name']}:")
-            logger.info(f"- Total paid: ${d['total_paid']:.2f}")
-            logger.info(f"- Total interest: ${d['total_interest']:.2f}")
-            logger.info(f"- Final balance: ${d['balance']:.2f}")
-
-        # Check if we hit the maximum months limit
-        hit_max_months = month >= max_months
-        remaining_debts = [d for d in debts if d['balance'] > 0.01]
-        
-        logger.info(f"\nFinal Summary:")
-        logger.info(f"Total months calculated: {month}")
-        logger.info(f"Hit max months: {hit_max_months}")
-        logger.info(f"Remaining debts: {len(remaining_debts)}")
-        for d in debts:
-            logger.info(f"{d['name']}: Final balance ${d['balance']:.2f}, Total paid ${d['total_paid']:.2f}")
-        
-        return Response({
-            'plan': plan,
-            'months': month,
-            'total_interest': round(total_interest, 2),
-            'monthly_interest_payments': [round(x, 2) for x in monthly_interest_payments],
-            'hit_max_months': hit_max_months,
-            'remaining_debts': len(remaining_debts),
-            'debts': [{
-                'name': d['name'],
-                'balance': round(d['balance'], 2),
-                'rate': round(d['rate'] * 100, 2),
-                'total_paid': round(d['total_paid'], 2),
-                'total_interest': round(d['total_interest'], 2)
-            } for d in debts]
-        })
-        
+                result = simulate_payoff(balances, rates, net_savings, strategy)
+            logger.debug(
+                f"Debt planner ({strategy}, {mode}, {len(names)} debts): {result.months} months in {result.steps} steps, "
+                f"interest {result.total_interest:.2f}, hit max months: {result.hit_max_months}"
+            )
+            body = plan_response(names, rates, result, mode, plan_format, points)
+            if cache_key:
+                PlanCache.set(cache_key, body)
+        return Response(body)
+
     except Exception as e:
         logger.error(f"Unexpected error in debt planner: {str(e)}")
         return Response({'error': f'An unexpected error occurred: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -265,4 +247,122 @@ def mongodb_debt_planner(request):
     """
     MongoDB-specific debt planner endpoint that integrates with MongoDB authentication
     """
-    return mongodb_debt_planner_logic(request) 
\ No newline at end of file
+    return mongodb_debt_planner_logic(request) 
+
+def mongodb_debt_planner_compare_logic(request):
+    """
+    Compare payoff strategies for one set of debts in a single simulation.
+
+    Body: debts and monthly_budget_data as for the planner, plus
+    strategies (default: snowball, avalanche, highest_interest, and custom
+    when custom_order is given), custom_order (debt names in payment order;
+    debts left out follow in request order), baseline (the strategy
+    interest_saved is measured against, default the first) and
+    include_plans (add each strategy's full monthly plan, in the planner's
+    format and points options).
+    """
+    try:
+        data = request.data
+        monthly_budget_data = data.get('monthly_budget_data', [])
+        if monthly_budget_data and not isinstance(monthly_budget_data, list):
+            return Response({'error': 'Monthly budget data must be a list.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            names, balances, rates = parse_debts(data.get('debts', []))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        custom_names = data.get('custom_order')
+        default_strategies = ['snowball', 'avalanche', 'highest_interest'] + (['custom'] if custom_names else [])
+        strategies = data.get('strategies') or default_strategies
+        if not isinstance(strategies, list) or any(strategy not in COMPARABLE_STRATEGIES for strategy in strategies) \
+                or len(set(strategies)) != len(strategies):
+            return Response({'error': f'Strategies must be a list of distinct values from: {", ".join(COMPARABLE_STRATEGIES)}.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        custom_order = None
+        if 'custom' in strategies:
+            if not isinstance(custom_names, list) or not custom_names:
+                return Response({'error': 'The custom strategy needs custom_order, a list of debt names.'}, status=status.HTTP_400_BAD_REQUEST)
+            if len(set(names)) != len(names):
+                return Response({'error': 'Debt names must be unique to use a custom order.'}, status=status.HTTP_400_BAD_REQUEST)
+            position = {name: i for i, name in enumerate(names)}
+            unknown = [name for name in custom_names if name not in position]
+            if unknown or len(set(custom_names)) != len(custom_names):
+                return Response({'error': 'Custom order must list known debt names at most once.'}, status=status.HTTP_400_BAD_REQUEST)
+            custom_order = [position[name] for name in custom_names]
+            custom_order += [i for i in range(len(names)) if i not in custom_order]
+
+        baseline = data.get('baseline', strategies[0])
+        if baseline not in strategies:
+            return Response({'error': 'Baseline must be one of the compared strategies.'}, status=status.HTTP_400_BAD_REQUEST)
+        include_plans = bool(data.get('include_plans', False))
+        try:
+            plan_format, points = parse_plan_format(data)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        net_savings = parse_net_savings(monthly_budget_data)
+        cache_key = _plan_cache_key(
+            get_user_from_token(request), 'compare', names, balances, rates, strategies, custom_order,
+            canonical_net_savings(net_savings), baseline, include_plans, plan_format, points
+        )
+        body = PlanCache.get(cache_key) if cache_key else None
+        if body is None:
+            body = _compare_strategies(
+                names, balances, rates, net_savings, strategies, custom_order, baseline, include_plans, plan_format, points
+            )
+            if cache_key:
+                PlanCache.set(cache_key, body)
+        return Response(body)
+
+    except Exception as e:
+        logger.error(f"Unexpected error in debt planner comparison: {str(e)}")
+        return Response({'error': f'An unexpected error occurred: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _compare_strategies(names, balances, rates, net_savings, strategies, custom_order, baseline, include_plans, plan_format, points):
+    """The comparison endpoint's JSON body"""
+    results = simulate_strategies(
+        balances, rates, net_savings, strategies, custom_order=custom_order, keep_history=include_plans
+    )
+    baseline_interest = results[strategies.index(baseline)].total_interest
+
+    comparison = []
+    for strategy, result in zip(strategies, results):
+        if include_plans:
+            entry = plan_response(names, rates, result, plan_format=plan_format, points=points)
+        else:
+            entry = {
+                'months': result.months,
+                'total_interest': round(result.total_interest, 2),
+                'total_paid': round(float(result.final_total_paid.sum()), 2),
+                'hit_max_months': result.hit_max_months,
+                'remaining_debts': int((result.final_balance > PAID_OFF).sum()),
+            }
+        comparison.append({
+            'strategy': strategy,
+            **entry,
+            'interest_saved': round(baseline_interest - result.total_interest, 2),
+        })
+
+    best = min(comparison, key=lambda entry: (entry['hit_max_months'], entry['total_interest'], entry['months']))
+    return {'baseline': baseline, 'best': best['strategy'], 'strategies': comparison}
+
+@api_view(['POST'])
+@authentication_classes([MongoDBJWTAuthentication])
+@permission_classes([IsAuthenticated])
+def mongodb_debt_planner_compare(request):
+    """
+    Summary metrics (months, total interest, interest saved) for several payoff
+    strategies in one request
+    """
+    return mongodb_debt_planner_compare_logic(request)
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([])
+def mongodb_debt_planner_compare_test(request):
+    """
+    Test endpoint for the strategy comparison without authentication
+    """
+    return mongodb_debt_planner_compare_logic(request)
@@ -0,0 +1,283 @@
+"""
+Declarative MongoDB index manifest
+
+INDEX_MANIFEST is the single source of truth for the indexes the services in
+api/mongodb_service.py rely on. reconcile_indexes() diffs it against the live
+indexes and applies the difference; QUERY_SHAPES lists every query the
+services issue so verify_query_plans() can explain() them and flag COLLSCANs.
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from .mongodb_service import BudgetService
+
+logger = logging.getLogger(__name__)
+
+# Options that change index semantics and therefore have to match exactly
+_COMPARED_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression')
+
+INDEX_MANIFEST: Dict[str, List[Dict[str, Any]]] = {
+    'users': [
+        {'keys': [('username', 1)], 'unique': True},
+        {'keys': [('email', 1)], 'unique': True},
+        # AvatarService.release: is any user still using this avatar?
+        {'keys': [('profile.avatar_id', 1)], 'sparse': True},
+    ],
+    'accounts': [
+        # get_user_accounts: {user_id} sorted by created_at desc
+        {'keys': [('user_id', 1), ('created_at', -1)]},
+        {'keys': [('user_id', 1), ('name', 1)]},
+        # SyncService.changes_since: {user_id, updated_at > since}
+        {'keys': [('user_id', 1), ('updated_at', 1)]},
+    ],
+    'debts': [
+        # get_user_debts: {user_id} sorted by created_at desc
+        {'keys': [('user_id', 1), ('created_at', -1)]},
+        {'keys': [('user_id', 1), ('name', 1)]},
+        # SyncService.changes_since: {user_id, updated_at > since}
+        {'keys': [('user_id', 1), ('updated_at', 1)]},
+    ],
+    'budgets': [
+        # One budget per month: get_budget_by_month_year / update_budget_field /
+        # create_budget; year before month so month windows and chronological
+        # sorts (get_budgets_in_range) are tight index ranges too. It replaces
+        # the earlier (user_id, month, year) unique index on the same fields.
+        {'keys': [('user_id', 1), ('year', 1), ('month', 1)], 'unique': True,
+         'replaces': [[('user_id', 1), ('month', 1), ('year', 1)]]},
+        # get_user_budgets(latest_by='updated_at'): {user_id} sorted by updated_at desc;
+        # SyncService.changes_since: {user_id, updated_at > since}
+        {'keys': [('user_id', 1), ('updated_at', -1)]},
+    ],
+    'transactions': [
+        # get_user_transactions: {user_id} sorted by date desc
+        {'keys': [('user_id', 1), ('date', -1)]},
+        {'keys': [('account_id', 1)]},
+    ],
+    'notifications': [
+        # get_user_notifications: {user_id} sorted by created_at desc
+        {'keys': [('user_id', 1), ('created_at', -1)]},
+        # bundle lookups and mark_all_as_read: {user_id, type}
+        {'keys': [('user_id', 1), ('type', 1)]},
+    ],
+    'wealth_projection_settings': [
+        {'keys': [('user_id', 1)]},
+    ],
+    'sync_tombstones': [
+        # SyncService.changes_since: deletes after the client's watermark
+        {'keys': [('user_id', 1), ('deleted_at', 1)]},
+        # Tombstones older than SyncService.TOMBSTONE_RETENTION_SECONDS (30 days)
+        {'keys': [('deleted_at', 1)], 'expireAfterSeconds': 30 * 24 * 3600},
+    ],
+    'session_activity': [
+        # Records are looked up by _id; this TTL index removes expired sessions
+        {'keys': [('expires_at', 1)], 'expireAfterSeconds': 0},
+    ],
+}
+
+# Every query shape issued by api/mongodb_service.py: (collection, filter, sort)
+_SAMPLE_USER_ID = ObjectId('000000000000000000000001')
+_SAMPLE_TIME = datetime(2025, 1, 1)
+
+QUERY_SHAPES: List[Tuple[str, Dict[str, Any], Optional[List[Tuple[str, int]]]]] = [
+    ('users', {'username': 'index-check'}, None),
+    ('users', {'username': 'index-check', 'is_active': True}, None),
+    ('users', {'email': 'index-check@example.com'}, None),
+    ('users', {'profile.avatar_id': 'index-check'}, None),
+    ('accounts', {'user_id': _SAMPLE_USER_ID}, [('created_at', -1)]),
+    ('debts', {'user_id': _SAMPLE_USER_ID}, [('created_at', -1)]),
+    ('budgets', {'user_id': _SAMPLE_USER_ID}, [('year', 1), ('month', 1)]),
+    ('budgets', {'user_id': _SAMPLE_USER_ID}, [('year', -1), ('month', -1)]),
+    ('budgets', {'user_id': _SAMPLE_USER_ID}, [('updated_at', -1)]),
+    ('budgets', {'user_id': _SAMPLE_USER_ID, 'updated_at': {'$gt': _SAMPLE_TIME}}, [('updated_at', 1)]),
+    ('accounts', {'user_id': _SAMPLE_USER_ID, 'updated_at': {'$gt': _SAMPLE_TIME}}, [('updated_at', 1)]),
+    ('debts', {'user_id': _SAMPLE_USER_ID, 'updated_at': {'$gt': _SAMPLE_TIME}}, [('updated_at', 1)]),
+    ('sync_tombstones', {'user_id': _SAMPLE_USER_ID, 'deleted_at': {'$gt': _SAMPLE_TIME}}, None),
+    ('budgets', {'user_id': _SAMPLE_USER_ID, 'month': 1, 'year': 2025}, None),
+    # Month windows, built by the same helper the services use: get_budgets_in_range
+    # across years (an $or of three ranges) and propagate_forward within one year
+    ('budgets', {'user_id': _SAMPLE_USER_ID, **BudgetService.month_range_query((2024, 11), (2026, 2))},
+     [('year', 1), ('month', 1)]),
+    ('budgets', {'user_id': _SAMPLE_USER_ID, **BudgetService.month_range_query((2025, 3), (2025, 9))}, None),
+    ('transactions', {'user_id': _SAMPLE_USER_ID}, [('date', -1)]),
+    ('notifications', {'user_id': _SAMPLE_USER_ID}, [('created_at', -1)]),
+    ('notifications', {'user_id': _SAMPLE_USER_ID, 'type': 'bundle'}, None),
+    ('notifications', {'user_id': _SAMPLE_USER_ID, 'is_read': False, 'type': {'$ne': 'bundle'}}, None),
+    ('wealth_projection_settings', {'user_id': _SAMPLE_USER_ID}, None),
+]
+
+
+def index_name(keys: List[Tuple[str, Any]]) -> str:
+    """Default MongoDB index name for a key pattern (e.g. user_id_1_date_-1)"""
+    return '_'.join(f"{field}_{direction}" for field, direction in keys)
+
+
+def _spec_options(spec: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: spec[key] for key in _COMPARED_OPTIONS if key in spec}
+
+
+def diff_indexes(db, manifest: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Compare the manifest with the live indexes.
+
+    Returns {'create': [...], 'changed': [...], 'replaced': [...], 'extra': [...]}
+    where every entry carries the collection, index name and key pattern.
+    'replaced' lists live indexes a manifest entry declares it supersedes
+    (its 'replaces' key patterns); they are not reported as extra.
+    """
+    manifest = manifest or INDEX_MANIFEST
+    plan = {'create': [], 'changed': [], 'replaced': [], 'extra': []}
+
+    for collection, specs in manifest.items():
+        live = {}
+        for index in db[collection].list_indexes():
+            keys = tuple((field, direction) for field, direction in index['key'].items())
+            live[keys] = index
+
+        wanted = set()
+        for spec in specs:
+            keys = tuple((field, direction) for field, direction in spec['keys'])
+            wanted.add(keys)
+            for replaced in spec.get('replaces', []):
+                replaced = tuple((field, direction) for field, direction in replaced)
+                wanted.add(replaced)
+                if replaced in live:
+                    plan['replaced'].append({
+                        'collection': collection,
+                        'name': live[replaced]['name'],
+                        'keys': list(replaced),
+                        'replaced_by': index_name(spec['keys']),
+                    })
+            entry = {
+                'collection': collection,
+                'name': index_name(spec['keys']),
+                'keys': list(keys),
+                'options': _spec_options(spec),
+            }
+            existing = live.get(keys)
+            if existing is None:
+                plan['create'].append(entry)
+                continue
+            live_options = {key: existing[key] for key in _COMPARED_OPTIONS if key in existing}
+            if live_options != entry['options']:
+                entry['name'] = existing['name']
+                entry['live_options'] = live_options
+                plan['changed'].append(entry)
+
+        for keys, index in live.items():
+            if index['name'] == '_id_' or keys in wanted:
+                continue
+            plan['extra'].append({
+                'collection': collection,
+                'name': index['name'],
+                'keys': list(keys),
+            })
+
+    return plan
+
+
+def apply_index_plan(db, plan: Dict[str, List[Dict[str, Any]]], drop: bool = False) -> Dict[str, int]:
+    """
+    Apply a plan from diff_indexes().
+
+    Missing indexes are always created, and a replaced index is dropped once
+    its replacement exists. Changed and extra indexes are only dropped (and
+    changed ones rebuilt) when drop=True.
+    """
+    applied = {'created': 0, 'rebuilt': 0, 'replaced': 0, 'dropped': 0, 'failed': 0}
+
+    def _apply(action: str, entry: Dict[str, Any], operation) -> None:
+        try:
+            operation()
+            applied[action] += 1
+        except Exception as e:
+            applied['failed'] += 1
+            logger.error(f"Index {entry['collection']}.{entry['name']} not {action}: {e}")
+
+    if drop:
+        for entry in plan['changed']:
+            collection = db[entry['collection']]
+            _apply('rebuilt', entry, lambda: (
+                collection.drop_index(entry['name']),
+                collection.create_index(entry['keys'], name=index_name(entry['keys']), **entry['options'])
+            ))
+        for entry in plan['extra']:
+            collection = db[entry['collection']]
+            _apply('dropped', entry, lambda: collection.drop_index(entry['name']))
+
+    for entry in plan['create']:
+        collection = db[entry['collection']]
+        _apply('created', entry, lambda: collection.create_index(entry['keys'], name=entry['name'], **entry['options']))
+
+    for entry in plan.get('replaced', []):
+        collection = db[entry['collection']]
+        if entry['replaced_by'] not in collection.index_information():
+            # Never leave the collection without either index (e.g. the build failed)
+            logger.warning(f"Keeping {entry['collection']}.{entry['name']}: {entry['replaced_by']} does not exist")
+            continue
+        _apply('replaced', entry, lambda: collection.drop_index(entry['name']))
+
+    return applied
+
+
+def reconcile_indexes(db, drop: bool = False) -> Dict[str, int]:
+    """Create any manifest index missing from the live database"""
+    plan = diff_indexes(db)
+    applied = apply_index_plan(db, plan, drop=drop)
+    if plan['changed'] and not drop:
+        logger.warning(
+            "Indexes differ from the manifest (run manage.py reconcile_indexes --drop): %s",
+            ', '.join(f"{entry['collection']}.{entry['name']}" for entry in plan['changed'])
+        )
+    logger.info(f"Index reconciliation complete: {applied}")
+    return applied
+
+
+def _find_stages(plan: Any, stage: str) -> bool:
+    """Recursively look for a stage name anywhere in an explain() plan"""
+    if isinstance(plan, dict):
+        if plan.get('stage') == stage:
+            return True
+        return any(_find_stages(value, stage) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_find_stages(item, stage) for item in plan)
+    return False
+
+
+def seed_query_shapes(db) -> Dict[str, List[ObjectId]]:
+    """Insert one marker document per collection so the planner has data to explain against"""
+    inserted = {}
+    for collection in {shape[0] for shape in QUERY_SHAPES}:
+        doc = {
+            'user_id': _SAMPLE_USER_ID,
+            'username': f'index-check-{ObjectId()}',
+            'email': f'index-check-{ObjectId()}@example.com',
+            '_index_check': True,
+        }
+        inserted[collection] = [db[collection].insert_one(doc).inserted_id]
+    return inserted
+
+
+def remove_seeded_documents(db, inserted: Dict[str, List[ObjectId]]) -> None:
+    for collection, ids in inserted.items():
+        db[collection].delete_many({'_id': {'$in': ids}})
+
+
+def verify_query_plans(db) -> List[Dict[str, Any]]:
+    """
+    explain() every query shape and return the ones whose winning plan
+    contains a COLLSCAN (an empty list means every query is index-backed).
+    """
+    failures = []
+    for collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = cursor.explain()
+        winning_plan = explain.get('queryPlanner', {}).get('winningPlan', {})
+        if _find_stages(winning_plan, 'COLLSCAN'):
+            failures.append({'collection': collection, 'filter': query, 'sort': sort})
+    return failures
@@ -3,15 +3,20 @@ MongoDB Service Layer - Replaces Django ORM for MongoDB operations
 """
 
 import os
-import bcrypt
+import threading
+import time
 import jwt
 import hashlib
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
-from pymongo import MongoClient
-from pymongo.errors import DuplicateKeyError, ConnectionFailure
-from bson import ObjectId
+from typing import Dict, List, Optional, Any, Tuple
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, ConnectionFailure, PyMongoError
+from bson import Binary, ObjectId
 from django.conf import settings
+from .mongodb_cache import TokenPayloadCache, UserCache
+from .password_hashing import PasswordHasher
+from .avatar_images import AvatarImages
+from .session_activity import build_activity_store
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,46 +24,73 @@ logger = logging.getLogger(__name__)
 class MongoDBService:
     """MongoDB service for handling all database operations"""
     
-    _instance = None
+    # Connection state lives on the base class so every service subclass
+    # (UserService, BudgetService, ...) shares one pool, one connectivity
+    # check and one index check per process
+    client = None
+    db = None
+    _instances = {}
+    _connect_lock = threading.Lock()
     
     def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(MongoDBService, cls).__new__(cls)
-            # Initialize the instance here
-            cls._instance.client = None
-            cls._instance.db = None
-            cls._instance.connect()
-        return cls._instance
+        instance = MongoDBService._instances.get(cls)
+        if instance is None:
+            instance = super(MongoDBService, cls).__new__(cls)
+            MongoDBService._instances[cls] = instance
+        if MongoDBService.db is None:
+            instance.connect()
+        return instance
     
     def __init__(self):
         # No need to do anything in __init__ since initialization is done in __new__
         pass
     
+    @staticmethod
+    def _reset_connection():
+        """Forget the shared handles (called when the shared client is discarded, e.g. after fork)"""
+        MongoDBService.client = None
+        MongoDBService.db = None
+    
     def connect(self):
-        """Connect to MongoDB using unified configuration"""
+        """Connect to MongoDB using unified configuration (once per process)"""
+        with MongoDBService._connect_lock:
+            if MongoDBService.db is not None:
+                return
+            self._connect()
+    
+    def _connect(self):
+        """Set up the shared client and database handle"""
         try:
             # Import unified MongoDB configuration
-            from mongodb_config import MongoDBConfig
+            from mongodb_config import MongoDBConfig, MongoDBClientRegistry, MongoDBReadiness
             
             # Get configuration from unified config
             config = MongoDBConfig.get_config()
-            mongodb_uri = config['uri']
             db_name = config['database']
-            options = config['options']
-            
-            # MongoDB connection using unified configuration
-            self.client = MongoClient(mongodb_uri, **options)
             
-            # Test the connection with retry mechanism
-            self._test_connection_with_retry()
-            logger.info("Connected to MongoDB successfully")
+            # Shared process-wide client (same pool as mongoengine and health checks)
+            MongoDBService.client = MongoDBConfig.get_client()
             
-            self.db = self.client[db_name]
+            if MongoDBConfig.get_startup_mode() == 'blocking':
+                # Test the connection with retry mechanism
+                self._test_connection_with_retry()
+                logger.info("Connected to MongoDB successfully")
+                
+                MongoDBService.db = MongoDBService.client[db_name]
+                
+                # Create indexes for better performance
+                self._create_indexes()
+            else:
+                # Deferred startup: the client connects in the background and the
+                # readiness probe reconciles indexes once the cluster answers
+                MongoDBService.db = MongoDBService.client[db_name]
+                MongoDBReadiness.add_ready_task('mongodb_indexes', self._create_indexes)
+                MongoDBReadiness.ensure_started()
             
-            # Create indexes for better performance
-            self._create_indexes()
+            MongoDBClientRegistry.add_reset_callback(MongoDBService._reset_connection)
             
         except ConnectionFailure as e:
+            MongoDBService._reset_connection()
             logger.error(f"MongoDB connection failed: {e}")
             # Provide detailed error analysis for production debugging
             if "SSL handshake failed" in str(e):
@@ -77,6 +109,7 @@ class MongoDBService:
                 logger.error("3. Firewall/proxy interference")
             raise
         except Exception as e:
+            MongoDBService._reset_connection()
             logger.error(f"Unexpected MongoDB connection error: {e}")
             logger.error(f"Error type: {type(e).__name__}")
             raise
@@ -111,54 +144,71 @@ class MongoDBService:
             logger.warning(f"MongoDB health check failed: {e}")
             return False
     
+    def bump_versions(self, user_id, *collections: str):
+        """
+        Advance the user's version counter for each collection after a write.
+        
+        The counters live in one collection_versions document per user and
+        back the ETags of the read endpoints (api/conditional_get.py), so every
+        write to a user's data has to bump the collections it touched.
+        """
+        if isinstance(user_id, str):
+            user_id = ObjectId(user_id)
+        try:
+            self.db.collection_versions.update_one(
+                {"_id": user_id},
+                {"$inc": {collection: 1 for collection in collections}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Error bumping {collections} versions for user {user_id}: {e}")
+    
+    def get_versions(self, user_id) -> Dict[str, int]:
+        """The user's collection version counters ({} before the first write)"""
+        if isinstance(user_id, str):
+            user_id = ObjectId(user_id)
+        return self.db.collection_versions.find_one({"_id": user_id}, {"_id": 0}) or {}
+    
     def _create_indexes(self):
-        """Create database indexes for better performance"""
+        """Create any index from the declarative manifest that is missing (never drops)"""
         try:
-            # Check if indexes already exist to avoid recreating them
-            existing_indexes = self.db.users.list_indexes()
-            if len(list(existing_indexes)) > 1:  # More than just _id index
-                logger.info("Database indexes already exist, skipping creation")
-                return
-            
-            # Users collection indexes
-            self.db.users.create_index("username", unique=True)
-            self.db.users.create_index("email", unique=True)
-            
-            # Accounts collection indexes
-            self.db.accounts.create_index("user_id")
-            self.db.accounts.create_index([("user_id", 1), ("name", 1)])
-            
-            # Debts collection indexes
-            self.db.debts.create_index("user_id")
-            self.db.debts.create_index([("user_id", 1), ("name", 1)])
-            
-            # Budgets collection indexes
-            self.db.budgets.create_index("user_id")
-            self.db.budgets.create_index([("user_id", 1), ("month", 1), ("year", 1)], unique=True)
-            
-            # Transactions collection indexes
-            self.db.transactions.create_index("user_id")
-            self.db.transactions.create_index("account_id")
-            self.db.transactions.create_index("date")
-            
-            logger.info("Database indexes created successfully")
-            
+            from .mongodb_indexes import reconcile_indexes
+            reconcile_indexes(self.db)
         except Exception as e:
             logger.error(f"Error creating indexes: {e}")
 
 class UserService(MongoDBService):
     """Service for user management operations"""
     
+    LOGIN_OK = 'ok'
+    LOGIN_USER_NOT_FOUND = 'user_not_found'
+    LOGIN_DISABLED = 'disabled'
+    LOGIN_INVALID_PASSWORD = 'invalid_password'
+    
+    # Profile fields only update_profile_image / delete_profile_image may write
+    AVATAR_FIELDS = ('avatar', 'avatar_id')
+    
+    @classmethod
+    def profile_updates(cls, profile_data: Dict) -> Dict:
+        """
+        $set paths for a client-supplied profile, one per field, so fields the
+        client left out (notably the avatar reference) are kept as they are.
+        """
+        return {
+            "profile." + field: value for field, value in profile_data.items()
+            if field not in cls.AVATAR_FIELDS and '.' not in field and not field.startswith('$')
+        }
+    
     def create_user(self, username: str, email: str, password: str) -> Dict:
         """Create a new user"""
         try:
             # Hash password
-            password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+            password_hash = PasswordHasher.hash(password)
             
             user_data = {
                 "username": username,
                 "email": email,
-                "password_hash": password_hash.decode('utf-8'),
+                "password_hash": password_hash,
                 "is_active": True,
                 "date_joined": datetime.utcnow(),
                 "last_login": None,
@@ -183,31 +233,52 @@ class UserService(MongoDBService):
             logger.error(f"Error creating user: {e}")
             raise
     
+    def login_user(self, username: str, password: str) -> Tuple[str, Optional[Dict]]:
+        """
+        Check a login with a single user fetch.
+        
+        Returns (outcome, user) where outcome is one of LOGIN_OK,
+        LOGIN_USER_NOT_FOUND, LOGIN_DISABLED or LOGIN_INVALID_PASSWORD; user
+        (without its password hash) is only set for LOGIN_OK and still carries
+        the previous last_login. Hashes made with an outdated cost factor are
+        replaced in the same write that records the login. Raises
+        PasswordHasherBusy when the bcrypt pool is saturated.
+        """
+        user = self.db.users.find_one({"username": username})
+        if not user:
+            return self.LOGIN_USER_NOT_FOUND, None
+        if not user.get('is_active', True):
+            return self.LOGIN_DISABLED, None
+        
+        password_hash = user.pop('password_hash', '')
+        if not PasswordHasher.verify(password, password_hash):
+            return self.LOGIN_INVALID_PASSWORD, None
+        
+        update = {"last_login": datetime.utcnow()}
+        if PasswordHasher.needs_rehash(password_hash):
+            update["password_hash"] = PasswordHasher.hash(password)
+            logger.info(f"Rehashed password for user {user['_id']} with the current cost factor")
+        
+        self.db.users.update_one({"_id": user["_id"]}, {"$set": update})
+        UserCache.invalidate(user["_id"])
+        return self.LOGIN_OK, user
+    
     def authenticate_user(self, username: str, password: str) -> Optional[Dict]:
         """Authenticate user with username and password"""
         try:
-            user = self.db.users.find_one({"username": username, "is_active": True})
-            
-            if user and bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
-                # Update last login
-                self.db.users.update_one(
-                    {"_id": user["_id"]},
-                    {"$set": {"last_login": datetime.utcnow()}}
-                )
-                
-                # Remove password hash from response
-                user.pop('password_hash', None)
-                return user
-            
-            return None
-            
+            outcome, user = self.login_user(username, password)
+            return user if outcome == self.LOGIN_OK else None
         except Exception as e:
             logger.error(f"Error authenticating user: {e}")
             return None
     
     def get_user_by_id(self, user_id: str) -> Optional[Dict]:
-        """Get user by ID"""
+        """Get user by ID (served from the user cache when possible)"""
         try:
+            cached = UserCache.get(user_id)
+            if cached is not None:
+                return cached
+            
             # Handle both ObjectId and string user IDs
             try:
                 user_id_obj = ObjectId(user_id)
@@ -217,6 +288,7 @@ class UserService(MongoDBService):
             user = self.db.users.find_one({"_id": user_id_obj})
             if user:
                 user.pop('password_hash', None)
+                UserCache.set(user_id, user)
             return user
         except Exception as e:
             logger.error(f"Error getting user by ID: {e}")
@@ -246,6 +318,7 @@ class UserService(MongoDBService):
                 {"_id": user_id_obj},
                 {"$set": {"onboarding_complete": complete}}
             )
+            UserCache.invalidate(user_id_obj)
             return result.modified_count > 0
         except Exception as e:
             logger.error(f"Error updating onboarding_complete: {e}")
@@ -258,10 +331,15 @@ class UserService(MongoDBService):
             if isinstance(user_id, str):
                 user_id = ObjectId(user_id)
             
+            updates = self.profile_updates(profile_data)
+            if not updates:
+                return False
+            
             result = self.db.users.update_one(
                 {"_id": user_id},
-                {"$set": {"profile": profile_data}}
+                {"$set": updates}
             )
+            UserCache.invalidate(user_id)
             return result.modified_count > 0
         except Exception as e:
             logger.error(f"Error updating user profile: {e}")
@@ -283,6 +361,7 @@ class UserService(MongoDBService):
                 {"_id": user_id},
                 {"$set": {"username": new_username}}
             )
+            UserCache.invalidate(user_id)
             return result.modified_count > 0
         except Exception as e:
             logger.error(f"Error updating username: {e}")
@@ -296,12 +375,13 @@ class UserService(MongoDBService):
                 user_id = ObjectId(user_id)
             
             # Hash the new password
-            password_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
+            password_hash = PasswordHasher.hash(new_password)
             
             result = self.db.users.update_one(
                 {"_id": user_id},
-                {"$set": {"password_hash": password_hash.decode('utf-8')}}
+                {"$set": {"password_hash": password_hash}}
             )
+            UserCache.invalidate(user_id)
             return result.modified_count > 0
         except Exception as e:
             logger.error(f"Error updating password: {e}")
@@ -323,6 +403,7 @@ class UserService(MongoDBService):
                 {"_id": user_id},
                 {"$set": {"email": new_email}}
             )
+            UserCache.invalidate(user_id)
             return result.modified_count > 0
         except Exception as e:
             logger.error(f"Error updating email: {e}")
@@ -347,9 +428,20 @@ class UserService(MongoDBService):
             # Delete user's transactions
             self.db.transactions.delete_many({"user_id": user_id})
             
+            # Delete the user's sync tombstones and version counters
+            self.db.sync_tombstones.delete_many({"user_id": user_id})
+            self.db.collection_versions.delete_one({"_id": user_id})
+            
             # Finally delete the user
-            result = self.db.users.delete_one({"_id": user_id})
-            return result.deleted_count > 0
+            user = self.db.users.find_one_and_delete({"_id": user_id}, projection={"profile.avatar_id": 1})
+            UserCache.invalidate(user_id)
+            if user is None:
+                return False
+            
+            avatar_id = user.get('profile', {}).get('avatar_id')
+            if avatar_id:
+                AvatarService().release(avatar_id)
+            return True
         except Exception as e:
             logger.error(f"Error deleting user: {e}")
             return False
@@ -365,7 +457,7 @@ class UserService(MongoDBService):
             
             # Handle profile data
             if 'profile' in user_data:
-                update_data['profile'] = user_data['profile']
+                update_data.update(self.profile_updates(user_data['profile']))
             
             # Handle username update
             if 'username' in user_data:
@@ -385,8 +477,7 @@ class UserService(MongoDBService):
             
             # Handle password update
             if 'password' in user_data:
-                password_hash = bcrypt.hashpw(user_data['password'].encode('utf-8'), bcrypt.gensalt())
-                update_data['password_hash'] = password_hash.decode('utf-8')
+                update_data['password_hash'] = PasswordHasher.hash(user_data['password'])
             
             if not update_data:
                 return False
@@ -395,38 +486,59 @@ class UserService(MongoDBService):
                 {"_id": user_id},
                 {"$set": update_data}
             )
+            UserCache.invalidate(user_id)
             return result.modified_count > 0
         except Exception as e:
             logger.error(f"Error updating user comprehensively: {e}")
             return False
     
-    def update_profile_image(self, user_id: str, image_data: bytes, filename: str) -> str:
-        """Update user profile image and return the image URL"""
+    def update_profile_image(self, user_id: str, image_data: bytes, filename: str,
+                             content_type: Optional[str] = None, url_for=None) -> Dict:
+        """
+        Store the image in the avatars collection and point the profile at it.
+        
+        The user document keeps only the avatar's content hash and the URL
+        clients display (the 256px JPEG thumbnail when there is one).
+        url_for(avatar_id, variant) builds URLs (defaults to relative paths).
+        Returns {'image_url', 'avatar_id', 'thumbnails'} where thumbnails maps
+        variant names such as "128.webp" to URLs.
+        """
         try:
             # Ensure user_id is properly converted to ObjectId
             if isinstance(user_id, str):
                 user_id = ObjectId(user_id)
             
-            # Generate unique filename
-            import uuid
-            import base64
-            file_extension = filename.split('.')[-1] if '.' in filename else 'jpg'
-            unique_filename = f"profile_{user_id}_{uuid.uuid4().hex[:8]}.{file_extension}"
+            if not content_type:
+                file_extension = filename.split('.')[-1].lower() if '.' in filename else 'jpeg'
+                content_type = f"image/{'jpeg' if file_extension == 'jpg' else file_extension}"
             
-            # Store image as base64 in profile
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
-            image_url = f"data:image/{file_extension};base64,{image_base64}"
+            url_for = url_for or AvatarService.avatar_path
+            avatar_service = AvatarService()
+            avatar_id, variants = avatar_service.store(image_data, content_type)
+            display_variant = AvatarService.DISPLAY_VARIANT if AvatarService.DISPLAY_VARIANT in variants else None
+            image_url = url_for(avatar_id, display_variant)
             
-            # Update user profile with image
-            result = self.db.users.update_one(
+            # Update user profile with the reference
+            previous = self.db.users.find_one_and_update(
                 {"_id": user_id},
-                {"$set": {"profile.avatar": image_url}}
+                {"$set": {"profile.avatar": image_url, "profile.avatar_id": avatar_id}},
+                projection={"profile.avatar_id": 1}
             )
+            UserCache.invalidate(user_id)
             
-            if result.modified_count > 0:
-                return image_url
-            else:
+            if previous is None:
+                avatar_service.release(avatar_id)
                 raise Exception("Failed to update profile image")
+            
+            previous_id = previous.get('profile', {}).get('avatar_id')
+            if previous_id and previous_id != avatar_id:
+                avatar_service.release(previous_id)
+            
+            return {
+                'image_url': image_url,
+                'avatar_id': avatar_id,
+                'thumbnails': {variant: url_for(avatar_id, variant) for variant in variants}
+            }
                 
         except Exception as e:
             logger.error(f"Error updating profile image: {e}")
@@ -440,17 +552,100 @@ class UserService(MongoDBService):
                 user_id = ObjectId(user_id)
             
             # Remove avatar from profile
-            result = self.db.users.update_one(
+            previous = self.db.users.find_one_and_update(
                 {"_id": user_id},
-                {"$unset": {"profile.avatar": ""}}
+                {"$unset": {"profile.avatar": "", "profile.avatar_id": ""}},
+                projection={"profile.avatar": 1, "profile.avatar_id": 1}
             )
+            UserCache.invalidate(user_id)
             
-            return result.modified_count > 0
+            if previous is None:
+                return False
+            
+            previous_profile = previous.get('profile', {})
+            if previous_profile.get('avatar_id'):
+                AvatarService().release(previous_profile['avatar_id'])
+            return bool(previous_profile.get('avatar') or previous_profile.get('avatar_id'))
             
         except Exception as e:
             logger.error(f"Error deleting profile image: {e}")
             return False
 
+class AvatarService(MongoDBService):
+    """
+    Profile images stored once per distinct upload in the avatars collection.
+    
+    Documents are keyed by the SHA-256 of the uploaded bytes, so identical
+    uploads share one document and skip image processing entirely, and the
+    key doubles as a strong ETag. Each document holds the sanitized image plus
+    its thumbnails (see api/avatar_images.py). A document is removed when no
+    user references it any more.
+    """
+    
+    # What profile.avatar points at when thumbnails exist
+    DISPLAY_VARIANT = '256.jpeg'
+    
+    @staticmethod
+    def avatar_path(avatar_id: str, variant: Optional[str] = None) -> str:
+        from django.urls import reverse
+        if variant:
+            return reverse('mongodb_get_avatar_variant', kwargs={'avatar_id': avatar_id, 'variant': variant})
+        return reverse('mongodb_get_avatar', kwargs={'avatar_id': avatar_id})
+    
+    @staticmethod
+    def _variant_key(variant: str) -> str:
+        # Field names cannot contain dots
+        return variant.replace('.', '_')
+    
+    def store(self, image_data: bytes, content_type: str) -> Tuple[str, List[str]]:
+        """
+        Store the upload (if not already present) and return its avatar id and
+        variant names. Raises ValueError if the data is not a decodable image.
+        """
+        avatar_id = hashlib.sha256(image_data).hexdigest()
+        existing = self.db.avatars.find_one({"_id": avatar_id}, {"variant_names": 1})
+        if existing:
+            return avatar_id, existing.get('variant_names', [])
+        
+        processed = AvatarImages.process(image_data, content_type)
+        self.db.avatars.update_one(
+            {"_id": avatar_id},
+            {"$setOnInsert": {
+                "data": Binary(processed.data),
+                "content_type": processed.content_type,
+                "size": len(processed.data),
+                "variant_names": list(processed.variants),
+                "variants": {
+                    self._variant_key(name): {"data": Binary(data), "content_type": variant_type}
+                    for name, (data, variant_type) in processed.variants.items()
+                },
+                "created_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+        return avatar_id, list(processed.variants)
+    
+    def get(self, avatar_id: str, variant: Optional[str] = None) -> Optional[Dict]:
+        """The image (or one variant) as {'data', 'content_type'}"""
+        if not variant:
+            return self.db.avatars.find_one({"_id": avatar_id}, {"data": 1, "content_type": 1})
+        
+        key = self._variant_key(variant)
+        avatar = self.db.avatars.find_one({"_id": avatar_id}, {f"variants.{key}": 1})
+        if not avatar:
+            return None
+        return avatar.get('variants', {}).get(key)
+    
+    def release(self, avatar_id: str) -> bool:
+        """Delete the blob if no user references it any more"""
+        try:
+            if self.db.users.find_one({"profile.avatar_id": avatar_id}, {"_id": 1}):
+                return False
+            return self.db.avatars.delete_one({"_id": avatar_id}).deleted_count > 0
+        except Exception as e:
+            logger.error(f"Error releasing avatar {avatar_id}: {e}")
+            return False
+
 class SettingsService(MongoDBService):
     """Service for user settings management"""
     
@@ -488,6 +683,8 @@ class SettingsService(MongoDBService):
                 {"_id": user_id},
                 {"$set": {"settings": updated_settings}}
             )
+            UserCache.invalidate(user_id)
+            self.bump_versions(user_id, 'settings')
             
             # Return True if document was found (even if no changes were made)
             return result.matched_count > 0
@@ -538,6 +735,7 @@ class NotificationService(MongoDBService):
             }
             
             result = self.db.notifications.insert_one(notification)
+            self.bump_versions(user_id, 'notifications')
             logger.info(f"Created notification {result.inserted_id} for user {user_id}")
             return str(result.inserted_id)
             
@@ -565,6 +763,7 @@ class NotificationService(MongoDBService):
                         }
                     }
                 )
+                self.bump_versions(user_id, 'notifications')
                 logger.info(f"Updated notification bundle for user {user_id}")
                 return str(existing["_id"])
             else:
@@ -579,6 +778,7 @@ class NotificationService(MongoDBService):
                 }
                 
                 result = self.db.notifications.insert_one(notification_bundle)
+                self.bump_versions(user_id, 'notifications')
                 logger.info(f"Created notification bundle {result.inserted_id} for user {user_id}")
                 return str(result.inserted_id)
             
@@ -692,6 +892,7 @@ class NotificationService(MongoDBService):
                 )
                 
                 if result.modified_count > 0:
+                    self.bump_versions(user_id, 'notifications')
                     logger.info(f"Marked notification {notification_id} as read for user {user_id}")
                     return True
                 else:
@@ -731,6 +932,7 @@ class NotificationService(MongoDBService):
                 )
                 
                 if result.modified_count > 0:
+                    self.bump_versions(user_id, 'notifications')
                     logger.info(f"Marked notification {notification_id} as unread for user {user_id}")
                     return True
                 else:
@@ -763,6 +965,7 @@ class NotificationService(MongoDBService):
             )
             
             if result.modified_count > 0:
+                self.bump_versions(user_id, 'notifications')
                 logger.info(f"Marked message {message_index} in bundle {bundle_id} as read for user {user_id}")
                 return True
             else:
@@ -795,6 +998,7 @@ class NotificationService(MongoDBService):
             )
             
             if result.modified_count > 0:
+                self.bump_versions(user_id, 'notifications')
                 logger.info(f"Marked message {message_index} in bundle {bundle_id} as unread for user {user_id}")
                 return True
             else:
@@ -847,6 +1051,7 @@ class NotificationService(MongoDBService):
                     }
                 )
             
+            self.bump_versions(user_id, 'notifications')
             logger.info(f"Marked all notifications as read for user {user_id}")
             return True
             
@@ -868,6 +1073,7 @@ class NotificationService(MongoDBService):
             })
             
             if result.deleted_count > 0:
+                self.bump_versions(user_id, 'notifications')
                 logger.info(f"Deleted notification {notification_id} for user {user_id}")
                 return True
             else:
@@ -980,6 +1186,7 @@ class WealthProjectionSettingsService(MongoDBService):
                     {"user_id": user_id},
                     {"$set": settings_data}
                 )
+                self.bump_versions(user_id, 'wealth_projection_settings')
                 if result.modified_count > 0:
                     # Return updated settings
                     updated = self.db.wealth_projection_settings.find_one({"user_id": user_id})
@@ -990,6 +1197,7 @@ class WealthProjectionSettingsService(MongoDBService):
                 # Create new settings
                 settings_data['created_at'] = now
                 result = self.db.wealth_projection_settings.insert_one(settings_data)
+                self.bump_versions(user_id, 'wealth_projection_settings')
                 if result.inserted_id:
                     # Return created settings
                     created = self.db.wealth_projection_settings.find_one({"_id": result.inserted_id})
@@ -1011,6 +1219,8 @@ class WealthProjectionSettingsService(MongoDBService):
                 user_id = ObjectId(user_id)
             
             result = self.db.wealth_projection_settings.delete_one({"user_id": user_id})
+            if result.deleted_count > 0:
+                self.bump_versions(user_id, 'wealth_projection_settings')
             return result.deleted_count > 0
             
         except Exception as e:
@@ -1020,6 +1230,17 @@ class WealthProjectionSettingsService(MongoDBService):
 class AccountService(MongoDBService):
     """Service for account management operations"""
     
+    # Fields returned by account lists (get_user_accounts, sync)
+    LIST_PROJECTION = {
+        "_id": 1,
+        "name": 1,
+        "type": 1,
+        "balance": 1,
+        "currency": 1,
+        "created_at": 1,
+        "updated_at": 1
+    }
+    
     def __init__(self):
         super().__init__()  # Call parent __init__
     
@@ -1034,6 +1255,7 @@ class AccountService(MongoDBService):
             
             result = self.db.accounts.insert_one(account_data)
             account_data['_id'] = result.inserted_id
+            self.bump_versions(user_id, 'accounts')
             return account_data
             
         except Exception as e:
@@ -1045,16 +1267,7 @@ class AccountService(MongoDBService):
         try:
             # Use projection to only fetch needed fields
             accounts = list(self.db.accounts.find(
-                {"user_id": ObjectId(user_id)},
-                {
-                    "_id": 1,
-                    "name": 1,
-                    "type": 1,
-                    "balance": 1,
-                    "currency": 1,
-                    "created_at": 1,
-                    "updated_at": 1
-                }
+                {"user_id": ObjectId(user_id)}, self.LIST_PROJECTION
             ).sort("created_at", -1))  # Sort by creation date
             return accounts
         except Exception as e:
@@ -1074,11 +1287,15 @@ class AccountService(MongoDBService):
         """Update account"""
         try:
             account_data["updated_at"] = datetime.utcnow()
-            result = self.db.accounts.update_one(
+            updated = self.db.accounts.find_one_and_update(
                 {"_id": ObjectId(account_id)},
-                {"$set": account_data}
+                {"$set": account_data},
+                projection={"user_id": 1}
             )
-            return result.modified_count > 0
+            if updated is None:
+                return False
+            self.bump_versions(updated["user_id"], 'accounts')
+            return True
         except Exception as e:
             logger.error(f"Error updating account: {e}")
             return False
@@ -1086,8 +1303,14 @@ class AccountService(MongoDBService):
     def delete_account(self, account_id: str) -> bool:
         """Delete account"""
         try:
-            result = self.db.accounts.delete_one({"_id": ObjectId(account_id)})
-            return result.deleted_count > 0
+            deleted = self.db.accounts.find_one_and_delete(
+                {"_id": ObjectId(account_id)}, projection={"user_id": 1}
+            )
+            if deleted is None:
+                return False
+            SyncService().record_deletion('accounts', deleted)
+            self.bump_versions(deleted["user_id"], 'accounts')
+            return True
         except Exception as e:
             logger.error(f"Error deleting account: {e}")
             return False
@@ -1147,6 +1370,19 @@ class AccountService(MongoDBService):
 class DebtService(MongoDBService):
     """Service for debt management operations"""
     
+    # Fields returned by debt lists (get_user_debts, sync)
+    LIST_PROJECTION = {
+        "_id": 1,
+        "name": 1,
+        "debt_type": 1,
+        "amount": 1,
+        "balance": 1,
+        "interest_rate": 1,
+        "effective_date": 1,
+        "created_at": 1,
+        "updated_at": 1
+    }
+    
     def __init__(self):
         super().__init__()  # Call parent __init__
     
@@ -1161,6 +1397,7 @@ class DebtService(MongoDBService):
             
             result = self.db.debts.insert_one(debt_data)
             debt_data['_id'] = result.inserted_id
+            self.bump_versions(user_id, 'debts')
             return debt_data
             
         except Exception as e:
@@ -1172,18 +1409,7 @@ class DebtService(MongoDBService):
         try:
             # Use projection to only fetch needed fields
             debts = list(self.db.debts.find(
-                {"user_id": ObjectId(user_id)},
-                {
-                    "_id": 1,
-                    "name": 1,
-                    "debt_type": 1,
-                    "amount": 1,
-                    "balance": 1,
-                    "interest_rate": 1,
-                    "effective_date": 1,
-                    "created_at": 1,
-                    "updated_at": 1
-                }
+                {"user_id": ObjectId(user_id)}, self.LIST_PROJECTION
             ).sort("created_at", -1))  # Sort by creation date
             return debts
         except Exception as e:
@@ -1203,11 +1429,15 @@ class DebtService(MongoDBService):
         """Update debt"""
         try:
             debt_data["updated_at"] = datetime.utcnow()
-            result = self.db.debts.update_one(
+            updated = self.db.debts.find_one_and_update(
                 {"_id": ObjectId(debt_id)},
-                {"$set": debt_data}
+                {"$set": debt_data},
+                projection={"user_id": 1}
             )
-            return result.modified_count > 0
+            if updated is None:
+                return False
+            self.bump_versions(updated["user_id"], 'debts')
+            return True
         except Exception as e:
             logger.error(f"Error updating debt: {e}")
             return False
@@ -1215,8 +1445,14 @@ class DebtService(MongoDBService):
     def delete_debt(self, debt_id: str) -> bool:
         """Delete debt"""
         try:
-            result = self.db.debts.delete_one({"_id": ObjectId(debt_id)})
-            return result.deleted_count > 0
+            deleted = self.db.debts.find_one_and_delete(
+                {"_id": ObjectId(debt_id)}, projection={"user_id": 1}
+            )
+            if deleted is None:
+                return False
+            SyncService().record_deletion('debts', deleted)
+            self.bump_versions(deleted["user_id"], 'debts')
+            return True
         except Exception as e:
             logger.error(f"Error deleting debt: {e}")
             return False
@@ -1227,43 +1463,178 @@ class BudgetService(MongoDBService):
     def __init__(self):
         super().__init__()  # Call parent __init__
     
+    # Fields a saved month carries besides expenses
+    BUDGET_FIELDS = ["income", "additional_income", "additional_income_items", "additional_items",
+                     "savings_items", "manually_edited_categories"]
+    
+    @staticmethod
+    def budget_contents(budget_data: Dict, include_debt_total: bool = False) -> Dict:
+        """A full month's contents: provided fields merged over the defaults"""
+        default_budget = {
+            "income": 0.0,
+            "additional_income": 0.0,
+            "additional_income_items": [],
+            "expenses": {
+                "housing": 0.0,
+                "debt_payments": 0.0,
+                "transportation": 0.0,
+                "food": 0.0,
+                "healthcare": 0.0,
+                "entertainment": 0.0,
+                "shopping": 0.0,
+                "travel": 0.0,
+                "education": 0.0,
+                "utilities": 0.0,
+                "childcare": 0.0,
+                "others": 0.0
+            },
+            "additional_items": [],
+            "savings_items": [],
+            "manually_edited_categories": []
+        }
+        
+        # Merge provided data with defaults
+        if "expenses" in budget_data and isinstance(budget_data["expenses"], dict):
+            default_budget["expenses"].update(budget_data["expenses"])
+        
+        keys = BudgetService.BUDGET_FIELDS + (["total_remaining_debt"] if include_debt_total else [])
+        for key in keys:
+            if key in budget_data:
+                default_budget[key] = budget_data[key]
+        return default_budget
+    
+    @staticmethod
+    def _amount(value) -> float:
+        try:
+            return float(value or 0)
+        except (TypeError, ValueError):
+            return 0.0
+    
+    @classmethod
+    def budget_totals(cls, budget: Dict) -> Dict:
+        """
+        The canonical derived totals of a month, stored on it as "totals":
+        
+        - income: income plus additional income (the itemized
+          additional_income_items when there are any, else additional_income)
+        - expenses: every expenses category plus additional_items of type expense
+        - savings: the savings_items
+        - net_savings: income - expenses
+        - savings_rate: net_savings / income (0 without income)
+        """
+        amount = cls._amount
+        income_items = budget.get("additional_income_items") or []
+        if income_items:
+            additional_income = sum((amount(item.get("amount")) for item in income_items), 0.0)
+        else:
+            additional_income = amount(budget.get("additional_income"))
+        income = amount(budget.get("income")) + additional_income
+        
+        expenses = sum((amount(value) for value in (budget.get("expenses") or {}).values()), 0.0)
+        expenses += sum(
+            amount(item.get("amount")) for item in budget.get("additional_items") or []
+            if item.get("type", "expense") == "expense"
+        )
+        savings = sum((amount(item.get("amount")) for item in budget.get("savings_items") or []), 0.0)
+        
+        net_savings = income - expenses
+        return {
+            "income": round(income, 2),
+            "expenses": round(expenses, 2),
+            "savings": round(savings, 2),
+            "net_savings": round(net_savings, 2),
+            "savings_rate": round(net_savings / income, 4) if income > 0 else 0.0,
+        }
+    
+    @staticmethod
+    def _amount_expression(value) -> Dict:
+        """MQL twin of _amount: the value as a double, 0 when missing or not a number"""
+        return {"$convert": {"input": value, "to": "double", "onError": 0.0, "onNull": 0.0}}
+    
+    @classmethod
+    def totals_expression(cls) -> Dict:
+        """
+        budget_totals as an aggregation expression over the document, so an
+        update pipeline can store the totals in the same write as the fields.
+        """
+        amount = cls._amount_expression
+        
+        def amounts(path, cond=None):
+            items = {"$ifNull": [path, []]}
+            if cond is not None:
+                items = {"$filter": {"input": items, "as": "item", "cond": cond}}
+            return {"$sum": {"$map": {"input": items, "as": "item", "in": amount("$$item.amount")}}}
+        
+        additional_income = {"$cond": [
+            {"$gt": [{"$size": {"$ifNull": ["$additional_income_items", []]}}, 0]},
+            amounts("$additional_income_items"),
+            amount("$additional_income"),
+        ]}
+        expenses = {"$add": [
+            {"$sum": {"$map": {
+                "input": {"$objectToArray": {"$ifNull": ["$expenses", {}]}},
+                "as": "expense", "in": amount("$$expense.v"),
+            }}},
+            amounts("$additional_items", {"$eq": [{"$ifNull": ["$$item.type", "expense"]}, "expense"]}),
+        ]}
+        return {"$let": {
+            "vars": {
+                "income": {"$add": [amount("$income"), additional_income]},
+                "expenses": expenses,
+                "savings": amounts("$savings_items"),
+            },
+            "in": {
+                "income": {"$round": ["$$income", 2]},
+                "expenses": {"$round": ["$$expenses", 2]},
+                "savings": {"$round": ["$$savings", 2]},
+                "net_savings": {"$round": [{"$subtract": ["$$income", "$$expenses"]}, 2]},
+                "savings_rate": {"$cond": [
+                    {"$gt": ["$$income", 0]},
+                    {"$round": [{"$divide": [{"$subtract": ["$$income", "$$expenses"]}, "$$income"]}, 4]},
+                    0.0,
+                ]},
+            },
+        }}
+    
+    @classmethod
+    def totals_of(cls, budget: Dict) -> Dict:
+        """A budget's stored totals, computed on the spot for documents not yet backfilled"""
+        return budget.get("totals") or cls.budget_totals(budget)
+    
+    def _store_totals(self, budgets: List[Dict]) -> int:
+        """
+        Write the totals of budgets read without them (see backfill_budget_totals).
+        
+        Each write only applies while updated_at still has the value read
+        back, so a slower writer never replaces totals computed from a newer
+        version of the month. The budgets get their totals set in place.
+        Returns the number of documents written.
+        """
+        updates = []
+        for budget in budgets:
+            if not budget:
+                continue
+            budget["totals"] = self.budget_totals(budget)
+            updates.append(UpdateOne(
+                {"_id": budget["_id"], "updated_at": budget.get("updated_at")},
+                {"$set": {"totals": budget["totals"]}}
+            ))
+        if not updates:
+            return 0
+        try:
+            return self.db.budgets.bulk_write(updates, ordered=False).modified_count
+        except PyMongoError as e:
+            logger.error(f"Error storing budget totals: {e}")
+            return 0
+    
     def create_budget(self, user_id: str, budget_data: Dict) -> Dict:
         """Create a new budget with all required fields"""
         try:
             logger.info(f"Creating budget for user {user_id} with data: {budget_data}")
             
             # Ensure all required fields are present with default values
-            default_budget = {
-                "income": 0.0,
-                "additional_income": 0.0,
-                "additional_income_items": [],
-                "expenses": {
-                    "housing": 0.0,
-                    "debt_payments": 0.0,
-                    "transportation": 0.0,
-                    "food": 0.0,
-                    "healthcare": 0.0,
-                    "entertainment": 0.0,
-                    "shopping": 0.0,
-                    "travel": 0.0,
-                    "education": 0.0,
-                    "utilities": 0.0,
-                    "childcare": 0.0,
-                    "others": 0.0
-                },
-                "additional_items": [],
-                "savings_items": [],
-                "manually_edited_categories": []
-            }
-            
-            # Merge provided data with defaults
-            if "expenses" in budget_data and isinstance(budget_data["expenses"], dict):
-                default_budget["expenses"].update(budget_data["expenses"])
-            
-            # Update other fields
-            for key in ["income", "additional_income", "additional_income_items", "additional_items", "savings_items", "manually_edited_categories", "total_remaining_debt"]:
-                if key in budget_data:
-                    default_budget[key] = budget_data[key]
+            default_budget = self.budget_contents(budget_data, include_debt_total=True)
+            default_budget["totals"] = self.budget_totals(default_budget)
             
             # Add month and year
             default_budget.update({
@@ -1294,6 +1665,7 @@ class BudgetService(MongoDBService):
                 )
                 
                 if result.modified_count > 0:
+                    self.bump_versions(user_id, 'budgets')
                     # Return the updated budget
                     updated_budget = self.db.budgets.find_one({"_id": existing_budget["_id"]})
                     logger.info(f"Budget updated successfully: {updated_budget}")
@@ -1311,6 +1683,7 @@ class BudgetService(MongoDBService):
                 
                 result = self.db.budgets.insert_one(default_budget)
                 default_budget['_id'] = result.inserted_id
+                self.bump_versions(user_id, 'budgets')
                 logger.info(f"Budget created successfully: {default_budget}")
                 return default_budget
             
@@ -1318,8 +1691,26 @@ class BudgetService(MongoDBService):
             logger.error(f"Error creating budget: {e}")
             raise
     
-    def get_user_budgets(self, user_id: str) -> List[Dict]:
-        """Get all budgets for a user, returning the most recent budget for each month"""
+    def get_user_budgets(self, user_id: str, start: Optional[Tuple[int, int]] = None,
+                         end: Optional[Tuple[int, int]] = None, latest: Optional[int] = None,
+                         latest_by: str = 'month', match: Optional[Dict] = None,
+                         fields: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Get a user's budgets (one per month), oldest month first.
+        
+        With no options every month is returned. The options narrow that down
+        in the query itself rather than after loading the whole history:
+        
+        - start / end: (year, month) bounds of a window, inclusive
+        - latest: only the newest N months; latest_by='updated_at' picks the
+          N most recently edited months instead
+        - match: an extra filter, e.g. {"savings_items.name": "Emergency Fund"}
+          with latest=1 for the newest month that has an Emergency Fund
+        - fields: return only these fields (plus _id, month and year)
+        
+        The unique (user_id, year, month) index keeps one document per month
+        and serves the window, the month ordering and the latest-N limit.
+        """
         try:
             # Handle both ObjectId and string user IDs
             try:
@@ -1327,25 +1718,39 @@ class BudgetService(MongoDBService):
             except:
                 user_id_obj = user_id
             
-            # Get all budgets for the user, ordered by creation date (newest first)
-            all_budgets = list(self.db.budgets.find({"user_id": user_id_obj}).sort("created_at", -1))
+            query = {"user_id": user_id_obj}
+            if start or end:
+                query.update(self.month_range_query(start or (1, 1), end or (9999, 12)))
+            if match:
+                query = {"$and": [query, match]}
             
-            # Group budgets by month/year and keep only the most recent one for each
-            unique_budgets = {}
-            for budget in all_budgets:
-                month_key = f"{budget.get('month')}_{budget.get('year')}"
-                if month_key not in unique_budgets:
-                    unique_budgets[month_key] = budget
+            projection = None
+            if fields:
+                projection = dict.fromkeys(["month", "year", *fields], 1)
             
-            # Convert back to list and sort by month/year
-            budgets = list(unique_budgets.values())
-            budgets.sort(key=lambda x: (x.get('year', 0), x.get('month', 0)))
+            cursor = self.db.budgets.find(query, projection)
+            if latest:
+                if latest_by == 'updated_at':
+                    cursor = cursor.sort("updated_at", -1)
+                else:
+                    cursor = cursor.sort([("year", -1), ("month", -1)])
+                cursor = cursor.limit(latest)
+            else:
+                cursor = cursor.sort([("year", 1), ("month", 1)])
             
+            budgets = list(cursor)
+            if latest:
+                budgets.sort(key=lambda x: (x.get('year', 0), x.get('month', 0)))
             return budgets
         except Exception as e:
             logger.error(f"Error getting user budgets: {e}")
             return []
     
+    def get_latest_budget(self, user_id: str, **options) -> Optional[Dict]:
+        """The newest month matching the get_user_budgets options, or None"""
+        budgets = self.get_user_budgets(user_id, latest=1, **options)
+        return budgets[0] if budgets else None
+    
     def get_budget_by_id(self, budget_id: str) -> Optional[Dict]:
         """Get budget by ID"""
         try:
@@ -1382,37 +1787,8 @@ class BudgetService(MongoDBService):
             logger.info(f"Found existing budget: {existing_budget}")
             
             # Ensure all required fields are present with default values
-            default_budget = {
-                "income": 0.0,
-                "additional_income": 0.0,
-                "additional_income_items": [],
-                "expenses": {
-                    "housing": 0.0,
-                    "debt_payments": 0.0,
-                    "transportation": 0.0,
-                    "food": 0.0,
-                    "healthcare": 0.0,
-                    "entertainment": 0.0,
-                    "shopping": 0.0,
-                    "travel": 0.0,
-                    "education": 0.0,
-                    "utilities": 0.0,
-                    "childcare": 0.0,
-                    "others": 0.0
-                },
-                "additional_items": [],
-                "savings_items": [],
-                "manually_edited_categories": []
-            }
-            
-            # Merge provided data with defaults
-            if "expenses" in budget_data and isinstance(budget_data["expenses"], dict):
-                default_budget["expenses"].update(budget_data["expenses"])
-            
-            # Update other fields (but NOT month and year to avoid duplicate key errors)
-            for key in ["income", "additional_income", "additional_income_items", "additional_items", "savings_items", "manually_edited_categories"]:
-                if key in budget_data:
-                    default_budget[key] = budget_data[key]
+            default_budget = self.budget_contents(budget_data)
+            default_budget["totals"] = self.budget_totals(default_budget)
             
             # DO NOT update month and year for existing budgets to prevent duplicate key errors
             # The month and year should remain constant for an existing budget
@@ -1428,6 +1804,8 @@ class BudgetService(MongoDBService):
             
             # Check if the update operation was successful (even if no changes were made)
             success = result.matched_count > 0
+            if success:
+                self.bump_versions(existing_budget["user_id"], 'budgets')
             logger.info(f"Budget update result: {success}, matched count: {result.matched_count}, modified count: {result.modified_count}")
             
             if success:
@@ -1444,103 +1822,236 @@ class BudgetService(MongoDBService):
     def delete_budget(self, budget_id: str) -> bool:
         """Delete budget"""
         try:
-            result = self.db.budgets.delete_one({"_id": ObjectId(budget_id)})
-            return result.deleted_count > 0
+            deleted = self.db.budgets.find_one_and_delete(
+                {"_id": ObjectId(budget_id)}, projection={"user_id": 1}
+            )
+            if deleted is None:
+                return False
+            SyncService().record_deletion('budgets', deleted)
+            self.bump_versions(deleted["user_id"], 'budgets')
+            return True
         except Exception as e:
             logger.error(f"Error deleting budget: {e}")
             return False
     
+    # Expense categories the budget grid edits one cell at a time
+    EXPENSE_CATEGORIES = ['housing', 'transportation', 'food', 'healthcare',
+                          'entertainment', 'shopping', 'travel', 'education',
+                          'utilities', 'childcare', 'others']
+    
+    @classmethod
+    def budget_field_path(cls, category: str) -> Optional[str]:
+        """Document path a budget grid category is stored under (None if unknown)"""
+        category = category.lower()
+        if category in ('income', 'additional_income'):
+            return category
+        if category in cls.EXPENSE_CATEGORIES:
+            return "expenses." + category
+        if category == 'savings':
+            # For savings, we might need to handle this differently
+            # For now, we'll add it as an additional field
+            return "savings"
+        return None
+    
+    @classmethod
+    def new_budget_fields(cls, now: datetime, exclude=()) -> Dict:
+        """
+        Defaults for a month created by a field update.
+        
+        Expenses are listed per category so the skeleton never overlaps a
+        path that the same update sets (e.g. expenses.food).
+        """
+        skeleton = {
+            "income": 0.0,
+            "additional_income": 0.0,
+            "additional_items": [],
+            "savings_items": [],
+            "manually_edited_categories": [],
+            "created_at": now,
+        }
+        skeleton.update({"expenses." + category: 0.0 for category in cls.EXPENSE_CATEGORIES})
+        return {path: value for path, value in skeleton.items() if path not in exclude}
+    
+    @staticmethod
+    def income_split_fields(total_income: float, additional_income: float) -> Dict:
+        """Fields for a total income that keeps the given additional income"""
+        return {
+            "income": max(0, total_income - additional_income),
+            "additional_income": additional_income
+        }
+    
+    @classmethod
+    def _field_update(cls, fields: Dict, now: datetime) -> List[Dict]:
+        """
+        Update pipeline that sets fields on a month and stores its recomputed
+        totals in the same write. A pipeline cannot $setOnInsert, so the
+        skeleton of a new month is filled in with $ifNull instead.
+        """
+        defaults = {
+            path: {"$ifNull": ["$" + path, {"$literal": value}]}
+            for path, value in cls.new_budget_fields(now, exclude=fields).items()
+        }
+        values = {path: {"$literal": value} for path, value in fields.items()}
+        return [
+            {"$set": {**defaults, **values, "updated_at": {"$literal": now}}},
+            {"$set": {"totals": cls.totals_expression()}},
+        ]
+    
+    def _upsert_budget_fields(self, user_id: str, month: int, year: int, fields: Dict) -> Dict:
+        """
+        Set fields on a month's budget, creating the month if needed, in one
+        atomic round trip; returns the budget after the update.
+        """
+        query = {"user_id": ObjectId(user_id), "month": month, "year": year}
+        update = self._field_update(fields, datetime.utcnow())
+        try:
+            budget = self.db.budgets.find_one_and_update(
+                query, update, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # A concurrent upsert created the month first; this one now matches it
+            budget = self.db.budgets.find_one_and_update(
+                query, update, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        self.bump_versions(user_id, 'budgets')
+        return budget
+    
+    def _bulk_upsert_months(self, user_id_obj: ObjectId, updates: Dict[Tuple[int, int], Dict]) -> set:
+        """
+        Upsert one update document per (month, year) in a single unordered
+        bulk_write; returns the months whose write failed. Months a concurrent
+        upsert created first (duplicate key) are retried once as plain updates.
+        """
+        failed = set()
+        pending = list(updates)
+        for attempt in range(2):
+            try:
+                self.db.budgets.bulk_write([
+                    UpdateOne({"user_id": user_id_obj, "month": month, "year": year}, updates[(month, year)], upsert=True)
+                    for month, year in pending
+                ], ordered=False)
+                break
+            except BulkWriteError as e:
+                errors = e.details.get('writeErrors', [])
+                duplicates = [pending[error['index']] for error in errors if error.get('code') == 11000]
+                for error in errors:
+                    if error.get('code') != 11000:
+                        logger.error(f"Budget batch write failed for {pending[error['index']]}: {error.get('errmsg')}")
+                        failed.add(pending[error['index']])
+                if not duplicates or attempt:
+                    failed.update(duplicates)
+                    break
+                pending = duplicates
+            except PyMongoError as e:
+                logger.error(f"Budget batch write failed: {e}")
+                failed.update(pending)
+                break
+        return failed
+    
+    def _find_months(self, user_id_obj: ObjectId, months) -> Dict[Tuple[int, int], Dict]:
+        """Fetch the given (month, year) budgets with one query"""
+        months = set(months)
+        budgets = {}
+        cursor = self.db.budgets.find({
+            "user_id": user_id_obj,
+            "month": {"$in": sorted({month for month, _ in months})},
+            "year": {"$in": sorted({year for _, year in months})}
+        })
+        for budget in cursor:
+            key = (budget.get('month'), budget.get('year'))
+            if key in months:
+                budgets[key] = budget
+        return budgets
+    
+    def batch_update_fields(self, user_id: str, updates: List[Tuple[int, int, Dict]]) -> Dict[Tuple[int, int], Optional[Dict]]:
+        """
+        Apply many (month, year, fields) updates in one unordered bulk_write.
+        
+        Updates for the same month are merged into one upsert (later fields
+        win, as if applied in order) and every affected month is read back
+        with a single query. Returns {(month, year): budget after the batch},
+        with None for months whose write failed.
+        """
+        if not updates:
+            return {}
+        
+        user_id_obj = ObjectId(user_id)
+        now = datetime.utcnow()
+        merged: Dict[Tuple[int, int], Dict] = {}
+        for month, year, fields in updates:
+            merged.setdefault((month, year), {}).update(fields)
+        
+        failed = self._bulk_upsert_months(
+            user_id_obj, {key: self._field_update(fields, now) for key, fields in merged.items()}
+        )
+        budgets = self._find_months(user_id_obj, merged)
+        results = {key: None if key in failed else budgets.get(key) for key in merged}
+        if len(failed) < len(merged):
+            self.bump_versions(user_id_obj, 'budgets')
+        return results
+    
+    @staticmethod
+    def month_range_query(start: Tuple[int, int], end: Tuple[int, int]) -> Dict:
+        """
+        Filter for every month from start to end inclusive, given as (year,
+        month); each branch is a tight range on the (user_id, year, month) index.
+        """
+        (start_year, start_month), (end_year, end_month) = start, end
+        if start_year == end_year:
+            return {"year": start_year, "month": {"$gte": start_month, "$lte": end_month}}
+        return {"$or": [
+            {"year": start_year, "month": {"$gte": start_month}},
+            {"year": {"$gt": start_year, "$lt": end_year}},
+            {"year": end_year, "month": {"$lte": end_month}},
+        ]}
+    
+    def get_budgets_in_range(self, user_id: str, start: Tuple[int, int], end: Tuple[int, int]) -> List[Dict]:
+        """Budgets from start to end inclusive ((year, month) tuples), oldest first, in one query"""
+        query = {"user_id": ObjectId(user_id), **self.month_range_query(start, end)}
+        return list(self.db.budgets.find(query).sort([("year", 1), ("month", 1)]))
+    
+    def save_budgets(self, user_id: str, budgets: List[Dict]) -> Dict[Tuple[int, int], Optional[Dict]]:
+        """
+        Save many full months at once, as save_month_budget does for one:
+        each month's contents are replaced by the provided fields over the
+        defaults, and missing months are created (with the provided
+        total_remaining_debt, like create_budget). One bulk_write, one read.
+        Returns {(month, year): saved budget}, with None for failed months.
+        """
+        if not budgets:
+            return {}
+        
+        user_id_obj = ObjectId(user_id)
+        now = datetime.utcnow()
+        updates = {}
+        for budget_data in budgets:
+            key = (int(budget_data['month']), int(budget_data['year']))
+            contents = self.budget_contents(budget_data)
+            created = {"created_at": now}
+            if "total_remaining_debt" in budget_data:
+                created["total_remaining_debt"] = budget_data["total_remaining_debt"]
+            updates[key] = {
+                "$set": {**contents, "totals": self.budget_totals(contents), "updated_at": now},
+                "$setOnInsert": created,
+            }
+        
+        failed = self._bulk_upsert_months(user_id_obj, updates)
+        if len(failed) < len(updates):
+            self.bump_versions(user_id_obj, 'budgets')
+        saved = self._find_months(user_id_obj, updates)
+        return {key: None if key in failed else saved.get(key) for key in updates}
+    
     def update_budget_field(self, user_id: str, month: int, year: int, category: str, value: float) -> Optional[Dict]:
         """Update a specific field in a budget (optimized for batch updates)"""
         try:
             logger.info(f"Updating budget field: {category} = {value} for {month}/{year}")
             
-            # Find existing budget
-            existing_budget = self.db.budgets.find_one({
-                "user_id": ObjectId(user_id),
-                "month": month,
-                "year": year
-            })
+            field_path = self.budget_field_path(category)
+            if field_path is None:
+                logger.warning(f"Unknown category: {category}")
+                return None
             
-            if existing_budget:
-                # Update existing budget
-                update_data = {"updated_at": datetime.utcnow()}
-                
-                # Handle income fields
-                if category.lower() == 'income':
-                    update_data["income"] = value
-                elif category.lower() == 'additional_income':
-                    update_data["additional_income"] = value
-                # Handle expense fields
-                elif category.lower() in ['housing', 'transportation', 'food', 'healthcare', 
-                                        'entertainment', 'shopping', 'travel', 'education', 
-                                        'utilities', 'childcare', 'others']:
-                    update_data["expenses." + category.lower()] = value
-                # Handle savings
-                elif category.lower() == 'savings':
-                    # For savings, we might need to handle this differently
-                    # For now, we'll add it as an additional field
-                    update_data["savings"] = value
-                else:
-                    logger.warning(f"Unknown category: {category}")
-                    return None
-                
-                result = self.db.budgets.update_one(
-                    {"_id": existing_budget["_id"]},
-                    {"$set": update_data}
-                )
-                
-                if result.modified_count > 0:
-                    # Return updated budget
-                    updated_budget = self.db.budgets.find_one({"_id": existing_budget["_id"]})
-                    return updated_budget
-                else:
-                    return existing_budget
-            else:
-                # Create new budget with this field
-                logger.info(f"Creating new budget for {month}/{year} with {category} = {value}")
-                
-                new_budget = {
-                    "user_id": ObjectId(user_id),
-                    "month": month,
-                    "year": year,
-                    "income": 0.0,
-                    "additional_income": 0.0,
-                    "expenses": {
-                        "housing": 0.0,
-                        "transportation": 0.0,
-                        "food": 0.0,
-                        "healthcare": 0.0,
-                        "entertainment": 0.0,
-                        "shopping": 0.0,
-                        "travel": 0.0,
-                        "education": 0.0,
-                        "utilities": 0.0,
-                        "childcare": 0.0,
-                        "others": 0.0
-                    },
-                    "additional_items": [],
-                    "savings_items": [],
-                    "manually_edited_categories": [],
-                    "created_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow()
-                }
-                
-                # Set the specific field
-                if category.lower() == 'income':
-                    new_budget["income"] = value
-                elif category.lower() == 'additional_income':
-                    new_budget["additional_income"] = value
-                elif category.lower() in ['housing', 'transportation', 'food', 'healthcare', 
-                                        'entertainment', 'shopping', 'travel', 'education', 
-                                        'utilities', 'childcare', 'others']:
-                    new_budget["expenses"][category.lower()] = value
-                elif category.lower() == 'savings':
-                    new_budget["savings"] = value
-                
-                result = self.db.budgets.insert_one(new_budget)
-                new_budget['_id'] = result.inserted_id
-                return new_budget
+            return self._upsert_budget_fields(user_id, month, year, {field_path: value})
                 
         except Exception as e:
             logger.error(f"Error updating budget field: {e}")
@@ -1551,73 +2062,83 @@ class BudgetService(MongoDBService):
         try:
             logger.info(f"Updating income with additional: total={total_income}, additional={additional_income} for {month}/{year}")
             
-            # Calculate primary income
-            primary_income = max(0, total_income - additional_income)
-            
-            # Find existing budget
-            existing_budget = self.db.budgets.find_one({
-                "user_id": ObjectId(user_id),
-                "month": month,
-                "year": year
-            })
-            
-            if existing_budget:
-                # Update existing budget
-                update_data = {
-                    "income": primary_income,
-                    "additional_income": additional_income,
-                    "updated_at": datetime.utcnow()
-                }
-                
-                result = self.db.budgets.update_one(
-                    {"_id": existing_budget["_id"]},
-                    {"$set": update_data}
-                )
-                
-                if result.modified_count > 0:
-                    # Return updated budget
-                    updated_budget = self.db.budgets.find_one({"_id": existing_budget["_id"]})
-                    return updated_budget
-                else:
-                    return existing_budget
-            else:
-                # Create new budget with this income split
-                logger.info(f"Creating new budget for {month}/{year} with income split")
-                
-                new_budget = {
-                    "user_id": ObjectId(user_id),
-                    "month": month,
-                    "year": year,
-                    "income": primary_income,
-                    "additional_income": additional_income,
-                    "expenses": {
-                        "housing": 0.0,
-                        "transportation": 0.0,
-                        "food": 0.0,
-                        "healthcare": 0.0,
-                        "entertainment": 0.0,
-                        "shopping": 0.0,
-                        "travel": 0.0,
-                        "education": 0.0,
-                        "utilities": 0.0,
-                        "childcare": 0.0,
-                        "others": 0.0
-                    },
-                    "additional_items": [],
-                    "savings_items": [],
-                    "manually_edited_categories": [],
-                    "created_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow()
-                }
-                
-                result = self.db.budgets.insert_one(new_budget)
-                new_budget['_id'] = result.inserted_id
-                return new_budget
+            return self._upsert_budget_fields(
+                user_id, month, year, self.income_split_fields(total_income, additional_income)
+            )
                 
         except Exception as e:
             logger.error(f"Error updating income with additional: {e}")
             return None
 
+    # manually_edited_categories labels that mean the income split
+    INCOME_LABELS = {'income', 'primary income'}
+    
+    @staticmethod
+    def shift_month(month: int, year: int, months: int) -> Tuple[int, int]:
+        """(month, year) moved by a number of months"""
+        index = year * 12 + month - 1 + months
+        return index % 12 + 1, index // 12
+    
+    def propagate_forward(self, user_id: str, month: int, year: int, months: int,
+                          total_income: Optional[float] = None, additional_income: Optional[float] = None,
+                          expense_categories=()) -> Dict:
+        """
+        Carry a month's income split, and optionally expense categories,
+        into the following `months` months.
+        
+        Income defaults to the source month's split; expense values always
+        come from the source month. A target month keeps any category listed
+        in its manually_edited_categories. Source and targets are read with
+        one query and written with one bulk upsert (batch_update_fields).
+        
+        Returns {"updated": {(month, year): budget or None}, "skipped":
+        {(month, year): [categories left alone]}}. Raises ValueError when the
+        source month is needed but does not exist, or for unknown categories.
+        """
+        categories = [category.lower() for category in expense_categories]
+        unknown = [category for category in categories if category not in self.EXPENSE_CATEGORIES]
+        if unknown:
+            raise ValueError(f"Unknown expense categories: {', '.join(unknown)}")
+        
+        user_id_obj = ObjectId(user_id)
+        end = self.shift_month(month, year, months)
+        cursor = self.db.budgets.find(
+            {"user_id": user_id_obj, **self.month_range_query((year, month), (end[1], end[0]))},
+            {"month": 1, "year": 1, "income": 1, "additional_income": 1, "expenses": 1, "manually_edited_categories": 1}
+        )
+        existing = {(budget.get("month"), budget.get("year")): budget for budget in cursor}
+        source = existing.get((month, year))
+        
+        if source is None and (total_income is None or additional_income is None or categories):
+            raise ValueError(f"No budget for {month}/{year} to propagate from")
+        if additional_income is None:
+            additional_income = self._amount(source.get("additional_income"))
+        if total_income is None:
+            total_income = self._amount(source.get("income")) + additional_income
+        income_fields = self.income_split_fields(total_income, additional_income)
+        source_expenses = (source or {}).get("expenses") or {}
+        
+        updates = []
+        skipped = {}
+        for offset in range(1, months + 1):
+            key = self.shift_month(month, year, offset)
+            edited = {label.lower() for label in (existing.get(key) or {}).get("manually_edited_categories") or []}
+            
+            fields = {}
+            if edited & self.INCOME_LABELS:
+                skipped.setdefault(key, []).append("income")
+            else:
+                fields.update(income_fields)
+            for category in categories:
+                if category in edited:
+                    skipped.setdefault(key, []).append(category)
+                else:
+                    fields["expenses." + category] = self._amount(source_expenses.get(category))
+            if fields:
+                updates.append((key[0], key[1], fields))
+        
+        return {"updated": self.batch_update_fields(user_id, updates), "skipped": skipped}
+
 class TransactionService(MongoDBService):
     """Service for transaction management operations"""
     
@@ -1681,9 +2202,97 @@ class TransactionService(MongoDBService):
             logger.error(f"Error deleting transaction: {e}")
             return False
 
+class SyncService(MongoDBService):
+    """
+    Delta sync for budgets, accounts and debts.
+    
+    Every write to these collections stamps updated_at, so the changes since
+    a client's watermark are one {user_id, updated_at > since} range per
+    collection on the (user_id, updated_at) indexes. Deletes leave a
+    tombstone in sync_tombstones, which a TTL index drops after
+    TOMBSTONE_RETENTION_SECONDS; a watermark older than that gets a full
+    resync instead, since some deletes could no longer be reported.
+    """
+    
+    COLLECTIONS = ('budgets', 'accounts', 'debts')
+    
+    # Keep in step with the TTL on sync_tombstones in mongodb_indexes.py
+    TOMBSTONE_RETENTION_SECONDS = 30 * 24 * 3600
+    
+    # updated_at is stamped before a write commits, so a write can become
+    # visible just after a newer timestamp was read. Watermarks trail the
+    # read by this much; changes near the edge are sent twice, never missed.
+    WATERMARK_LAG_SECONDS = 5
+    
+    def _projection(self, collection: str) -> Optional[Dict]:
+        if collection == 'accounts':
+            return AccountService.LIST_PROJECTION
+        if collection == 'debts':
+            return DebtService.LIST_PROJECTION
+        return None
+    
+    def record_deletion(self, collection: str, deleted: Dict):
+        """Leave a tombstone for a deleted document (needs its _id and user_id)"""
+        try:
+            self.db.sync_tombstones.insert_one({
+                "user_id": deleted.get("user_id"),
+                "collection": collection,
+                "doc_id": str(deleted["_id"]),
+                "deleted_at": datetime.utcnow()
+            })
+        except Exception as e:
+            logger.error(f"Error recording {collection} deletion for sync: {e}")
+    
+    def changes_since(self, user_id: str, since: Optional[datetime]) -> Dict:
+        """
+        Documents created or updated after `since` and ids deleted since then.
+        
+        Returns {"watermark", "full", "changes": {collection: [docs]},
+        "deleted": {collection: [ids]}}. With full=True (no watermark, or one
+        past the tombstone retention) "changes" holds every document and the
+        client should replace its copy rather than merge.
+        """
+        user_id_obj = ObjectId(user_id)
+        now = datetime.utcnow()
+        full = since is None or since < now - timedelta(seconds=self.TOMBSTONE_RETENTION_SECONDS)
+        
+        query = {"user_id": user_id_obj}
+        if not full:
+            query["updated_at"] = {"$gt": since}
+        changes = {
+            collection: list(self.db[collection].find(query, self._projection(collection)).sort("updated_at", 1))
+            for collection in self.COLLECTIONS
+        }
+        
+        deleted = {collection: [] for collection in self.COLLECTIONS}
+        if not full:
+            tombstones = self.db.sync_tombstones.find(
+                {"user_id": user_id_obj, "deleted_at": {"$gt": since}},
+                {"collection": 1, "doc_id": 1}
+            )
+            for tombstone in tombstones:
+                if tombstone.get("collection") in deleted:
+                    deleted[tombstone["collection"]].append(tombstone["doc_id"])
+        
+        watermark = now - timedelta(seconds=self.WATERMARK_LAG_SECONDS)
+        if since is not None and watermark < since:
+            watermark = since
+        return {"watermark": watermark, "full": full, "changes": changes, "deleted": deleted}
+
 class JWTAuthService:
     """Service for JWT token management"""
     
+    # 30 minutes of inactivity ends a session
+    INACTIVITY_TIMEOUT_SECONDS = 1800
+    
+    # Session activity is kept for as long as a refresh token can be presented
+    SESSION_RETENTION_SECONDS = 7 * 24 * 3600
+    
+    # Shared by every JWTAuthService instance in this process (a new instance
+    # is created per request); see api/session_activity.py
+    _activity_store = None
+    _activity_store_lock = threading.Lock()
+    
     def __init__(self):
         # Use JWT-specific secret key that changes on server restart
         try:
@@ -1695,7 +2304,6 @@ class JWTAuthService:
         
         self.algorithm = 'HS256'
         self.access_token_expire_minutes = 60  # 1 hour for better user experience
-        self.token_usage_tracker = {}  # Track token usage times
     
     def create_access_token(self, data: Dict) -> str:
         """Create JWT access token"""
@@ -1703,6 +2311,10 @@ class JWTAuthService:
         expire = datetime.utcnow() + timedelta(minutes=self.access_token_expire_minutes)
         to_encode.update({"exp": expire})
         encoded_jwt = jwt.encode(to_encode, self.secret_key, algorithm=self.algorithm)
+        
+        # Issuing an access token (login, registration or refresh) is activity
+        if data.get('user_id'):
+            self.activity_store().start(str(data['user_id']), time.time())
         return encoded_jwt
     
     def create_refresh_token(self, data: Dict) -> str:
@@ -1716,32 +2328,18 @@ class JWTAuthService:
     def verify_token(self, token: str) -> Optional[Dict]:
         """Verify JWT token with usage tracking and 30-minute inactivity timeout"""
         try:
-            # First check if token is valid JWT
-            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            
-            # Check if token has been used before
-            current_time = datetime.utcnow()
+            # Reuse the payload of a token this process already verified
             token_hash = hashlib.sha256(token.encode()).hexdigest()
+            payload = TokenPayloadCache.get(token_hash)
+            if payload is None:
+                payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+                TokenPayloadCache.set(token_hash, payload)
             
-            if token_hash in self.token_usage_tracker:
-                # Check if 5 minutes have passed since last usage
-                last_used = self.token_usage_tracker[token_hash]
-                time_since_last_use = current_time - last_used
-                
-                if time_since_last_use.total_seconds() > 1800:  # 30 minutes = 1800 seconds
-                    logger.info(f"Token expired due to 30-minute inactivity: {token_hash[:8]}...")
-                    # Remove expired token from tracker
-                    del self.token_usage_tracker[token_hash]
-                    return None
-            else:
-                # New token, add to tracker
-                self.token_usage_tracker[token_hash] = current_time
-            
-            # Update last used time
-            self.token_usage_tracker[token_hash] = current_time
-            
-            # Clean up old tokens (older than 10 minutes) to prevent memory leaks
-            self._cleanup_old_tokens()
+            # Record this use; fails if the session sat idle past the timeout
+            session_key = self._session_key(token_hash, payload)
+            if not self.activity_store().touch(session_key, time.time(), self.INACTIVITY_TIMEOUT_SECONDS):
+                logger.info(f"Session expired due to 30-minute inactivity: {session_key[:8]}...")
+                return None
             
             return payload
             
@@ -1752,25 +2350,39 @@ class JWTAuthService:
             logger.error(f"JWT error: {e}")
             return None
     
-    def _cleanup_old_tokens(self):
-        """Clean up tokens older than 10 minutes to prevent memory leaks"""
-        current_time = datetime.utcnow()
-        expired_tokens = []
-        
-        for token_hash, last_used in self.token_usage_tracker.items():
-            if (current_time - last_used).total_seconds() > 600:  # 10 minutes
-                expired_tokens.append(token_hash)
-        
-        for token_hash in expired_tokens:
-            del self.token_usage_tracker[token_hash]
-    
     def invalidate_token(self, token: str):
         """Invalidate a specific token"""
         token_hash = hashlib.sha256(token.encode()).hexdigest()
-        if token_hash in self.token_usage_tracker:
-            del self.token_usage_tracker[token_hash]
+        TokenPayloadCache.invalidate(token_hash)
+        try:
+            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm], options={'verify_exp': False})
+        except jwt.PyJWTError:
+            payload = {}
+        self.activity_store().discard(self._session_key(token_hash, payload))
     
     def clear_all_tokens(self):
         """Clear all token usage tracking (call on server restart)"""
-        self.token_usage_tracker.clear()
-        logger.info("All token usage tracking cleared") 
\ No newline at end of file
+        TokenPayloadCache.clear()
+        self.activity_store().clear()
+    
+    @staticmethod
+    def _session_key(token_hash: str, payload: Dict) -> str:
+        """Activity is tracked per user; tokens without a user fall back to their own hash"""
+        if payload.get('user_id'):
+            return str(payload['user_id'])
+        return token_hash
+    
+    @classmethod
+    def activity_store(cls):
+        if cls._activity_store is None:
+            with cls._activity_store_lock:
+                if cls._activity_store is None:
+                    cls._activity_store = build_activity_store(
+                        cls.INACTIVITY_TIMEOUT_SECONDS, cls.SESSION_RETENTION_SECONDS
+                    )
+        return cls._activity_store
+    
+    @classmethod
+    def set_activity_store(cls, store):
+        """Swap the activity store (e.g. an InMemoryActivityStore in tests)"""
+        cls._activity_store = store
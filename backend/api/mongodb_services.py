@@ -7,7 +7,17 @@ import mongoengine
 from mongoengine import connect, Document, StringField, IntField, FloatField, DateTimeField, DateField, BooleanField, ListField, DictField, DecimalField, ObjectIdField
 from decimal import Decimal
 from datetime import datetime, date
-from mongodb_config import get_mongodb_connection
+from mongodb_config import get_mongodb_connection, MongoDBClientRegistry
+
+def _shared_mongo_client(**connection_settings):
+    """mongoengine client factory that hands out the process-wide shared client"""
+    return MongoDBClientRegistry.get_client()
+
+def _forget_mongoengine_connection():
+    """Drop mongoengine's cached client so the next query picks up a fresh shared one"""
+    from mongoengine import connection as mongoengine_connection
+    mongoengine_connection._connections.pop('default', None)
+    mongoengine_connection._dbs.pop('default', None)
 
 # Connect to MongoDB - lazy connection
 def get_mongodb_connection_mongoengine():
@@ -17,14 +27,15 @@ def get_mongodb_connection_mongoengine():
         from mongoengine.connection import get_connection
         get_connection('default')
     except:
-        # Not connected, establish connection using unified config
+        # Not connected, register the shared client under the default alias
         connection_config = get_mongodb_connection()
         connect(
             db=connection_config['db'],
             host=connection_config['host'],
-            port=connection_config.get('port', 27017),
-            alias='default'
+            alias='default',
+            mongo_client_class=_shared_mongo_client
         )
+        MongoDBClientRegistry.add_reset_callback(_forget_mongoengine_connection)
 
 # Initialize connection
 get_mongodb_connection_mongoengine()
@@ -82,6 +93,7 @@ class MongoBudget(Document):
     additional_items = ListField(DictField())
     savings_items = ListField(DictField())
     manually_edited_categories = ListField(StringField())
+    totals = DictField()  # Derived totals stored by BudgetService
     month = IntField()
     year = IntField()
     
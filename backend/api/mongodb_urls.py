@@ -9,19 +9,23 @@ from .mongodb_auth_views import (
     mongodb_complete_onboarding,
     mongodb_login, mongodb_register, mongodb_refresh_token,
     mongodb_get_profile, mongodb_update_profile, mongodb_update_user_comprehensive, mongodb_delete_user,
-    mongodb_upload_profile_image, mongodb_delete_profile_image, mongodb_get_settings, mongodb_update_settings
+    mongodb_upload_profile_image, mongodb_delete_profile_image, mongodb_get_settings, mongodb_update_settings,
+    mongodb_get_avatar
 )
 from .mongodb_api_views import (
     mongodb_get_accounts, mongodb_create_account, mongodb_update_account, mongodb_delete_account,
     mongodb_get_debts, mongodb_create_debt, mongodb_update_debt, mongodb_delete_debt,
     mongodb_get_budgets, mongodb_create_budget, mongodb_update_budget, mongodb_delete_budget, mongodb_get_month_budget,
     mongodb_get_month_budget_test, mongodb_save_month_budget, mongodb_batch_update_budgets,
+    mongodb_get_budget_range, mongodb_save_budget_range, mongodb_propagate_budget, mongodb_sync,
     mongodb_get_transactions, mongodb_create_transaction, mongodb_update_transaction, mongodb_delete_transaction,
     mongodb_project_wealth, mongodb_get_wealth_projection_settings, mongodb_save_wealth_projection_settings,
     mongodb_project_wealth_enhanced, mongodb_import_financials,
     BudgetViews, DebtViews
 )
-from .mongodb_debt_planner import mongodb_debt_planner, mongodb_debt_planner_test
+from .mongodb_debt_planner import (
+    mongodb_debt_planner, mongodb_debt_planner_test, mongodb_debt_planner_compare, mongodb_debt_planner_compare_test
+)
 from .financial_steps import FinancialStepsView, financial_steps_calculate_test
 from .dashboard import DashboardView
 from .test_auth import test_login
@@ -35,6 +39,30 @@ def health_check(request):
     """Simple health check endpoint"""
     return JsonResponse({"status": "healthy", "message": "MongoDB API is running"})
 
+def readiness_check(request):
+    """Readiness endpoint - reports the background MongoDB probe without blocking on it"""
+    from mongodb_config import MongoDBReadiness
+    MongoDBReadiness.ensure_started()
+    state = MongoDBReadiness.status()
+    return JsonResponse({
+        "status": "ready" if state.get('ready') else "not_ready",
+        "mongodb": state
+    }, status=200 if state.get('ready') else 503)
+
+def metrics(request):
+    """Cache hit/miss counters for this worker process, for callers holding METRICS_TOKEN"""
+    import hmac
+    import os
+    from django.conf import settings
+    from .mongodb_cache import collect_metrics
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        return JsonResponse({"error": "Not found"}, status=404)
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if not hmac.compare_digest(supplied.encode(), token.encode()):
+        return JsonResponse({"error": "Invalid metrics token"}, status=401)
+    return JsonResponse({"pid": os.getpid(), "caches": collect_metrics()})
+
 def server_info(request):
     """Server information including startup timestamp"""
     import os
@@ -49,6 +77,8 @@ def server_info(request):
 urlpatterns = [
     # Health check endpoint
     path('', health_check, name='health_check'),
+    path('ready/', readiness_check, name='readiness_check'),
+    path('metrics/', metrics, name='metrics'),
     path('server-info/', server_info, name='server_info'),
     
     # Authentication endpoints
@@ -62,6 +92,8 @@ urlpatterns = [
     path('auth/mongodb/user/delete/', mongodb_delete_user, name='mongodb_delete_user'),
     path('auth/mongodb/user/upload-image/', mongodb_upload_profile_image, name='mongodb_upload_profile_image'),
     path('auth/mongodb/user/delete-image/', mongodb_delete_profile_image, name='mongodb_delete_profile_image'),
+    path('avatars/<str:avatar_id>/', mongodb_get_avatar, name='mongodb_get_avatar'),
+    path('avatars/<str:avatar_id>/<str:variant>/', mongodb_get_avatar, name='mongodb_get_avatar_variant'),
     
 
 
@@ -95,6 +127,12 @@ urlpatterns = [
     path('budgets/save-month/', mongodb_save_month_budget, name='mongodb_save_month_budget'),
     path('budgets/save-month-test/', BudgetViews.save_month_budget_test, name='mongodb_save_month_budget_test'),
     path('budgets/batch-update/', mongodb_batch_update_budgets, name='mongodb_batch_update_budgets'),
+    path('budgets/range/', mongodb_get_budget_range, name='mongodb_get_budget_range'),
+    path('budgets/save-range/', mongodb_save_budget_range, name='mongodb_save_budget_range'),
+    path('budgets/propagate/', mongodb_propagate_budget, name='mongodb_propagate_budget'),
+    
+    # Delta sync (budgets, accounts, debts)
+    path('sync/', mongodb_sync, name='mongodb_sync'),
     
     # Transaction endpoints
     path('transactions/', mongodb_get_transactions, name='mongodb_get_transactions'),
@@ -105,6 +143,8 @@ urlpatterns = [
     # Debt planner endpoint
     path('debt-planner/', mongodb_debt_planner, name='mongodb_debt_planner'),
     path('debt-planner-test/', mongodb_debt_planner_test, name='mongodb_debt_planner_test'),
+    path('debt-planner/compare/', mongodb_debt_planner_compare, name='mongodb_debt_planner_compare'),
+    path('debt-planner-test/compare/', mongodb_debt_planner_compare_test, name='mongodb_debt_planner_compare_test'),
     
     # Financial steps endpoints
     path('financial-steps/calculate/', FinancialStepsView.as_view(), name='financial_steps_calculate'),
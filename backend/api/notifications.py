@@ -10,6 +10,7 @@ from django.http import JsonResponse
 from .mongodb_service import NotificationService
 from .mongodb_api_views import MongoDBIsAuthenticated
 from .mongodb_authentication import MongoDBJWTAuthentication
+from .conditional_get import conditional_on
 from .notification_initializer import NotificationInitializer
 import logging
 
@@ -22,6 +23,7 @@ notification_initializer = NotificationInitializer()
 @api_view(['GET'])
 @authentication_classes([MongoDBJWTAuthentication])
 @permission_classes([MongoDBIsAuthenticated])
+@conditional_on('notifications')
 def get_notifications(request):
     """Get all notifications for the authenticated user"""
     try:
@@ -54,6 +56,7 @@ def get_notifications(request):
 @api_view(['GET'])
 @authentication_classes([MongoDBJWTAuthentication])
 @permission_classes([MongoDBIsAuthenticated])
+@conditional_on('notifications')
 def get_unread_count(request):
     """Get unread notification count for the authenticated user"""
     try:
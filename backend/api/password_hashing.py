@@ -0,0 +1,88 @@
+"""
+bcrypt hashing on a bounded worker pool
+
+bcrypt is deliberately slow and CPU-bound. Running it directly on request
+threads lets a burst of logins (app launch, after a token reset) occupy every
+thread and CPU a worker has and starve the other endpoints. Here all hashing
+and verification goes through one small pool per process: at most WORKERS
+calls run at once, at most MAX_PENDING wait, and anything beyond that is
+refused with PasswordHasherBusy so the caller can answer 503 straight away.
+
+bcrypt releases the GIL while hashing, so the pool threads run in parallel
+with the rest of the worker.
+"""
+
+import logging
+import re
+import threading
+from typing import Optional
+
+import bcrypt
+from django.conf import settings
+
+from .worker_pools import BoundedExecutor, PoolBusy
+
+logger = logging.getLogger(__name__)
+
+_BCRYPT_COST = re.compile(r'^\$2[abxy]?\$(\d{2})\$')
+
+
+class PasswordHasherBusy(PoolBusy):
+    """Raised when the hashing pool and its queue are full"""
+
+
+class PasswordHasher:
+    """Process-wide bcrypt pool configured by settings.PASSWORD_HASHING"""
+
+    _pool = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def config(cls) -> dict:
+        config = {'ROUNDS': 12, 'WORKERS': 2, 'MAX_PENDING': 32, 'TIMEOUT': 10}
+        config.update(getattr(settings, 'PASSWORD_HASHING', None) or {})
+        return config
+
+    @classmethod
+    def _run(cls, fn, *args):
+        if cls._pool is None:
+            with cls._lock:
+                if cls._pool is None:
+                    config = cls.config()
+                    cls._pool = BoundedExecutor(
+                        'bcrypt', config['WORKERS'], config['MAX_PENDING'], config['TIMEOUT'],
+                        busy_error=PasswordHasherBusy
+                    )
+        return cls._pool.run(fn, *args)
+
+    @classmethod
+    def hash(cls, password: str) -> str:
+        rounds = cls.config()['ROUNDS']
+        return cls._run(_hash, password, rounds)
+
+    @classmethod
+    def verify(cls, password: str, password_hash: str) -> bool:
+        return cls._run(_verify, password, password_hash)
+
+    @classmethod
+    def needs_rehash(cls, password_hash: str) -> bool:
+        """True when the hash was made with a different cost factor than configured"""
+        return cost_factor(password_hash) != cls.config()['ROUNDS']
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def _verify(password: str, password_hash: str) -> bool:
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    except ValueError:
+        logger.warning("Stored password hash is not a valid bcrypt hash")
+        return False
+
+
+def cost_factor(password_hash: str) -> Optional[int]:
+    """The bcrypt cost ("rounds") encoded in a hash, e.g. 12 for $2b$12$..."""
+    match = _BCRYPT_COST.match(password_hash or '')
+    return int(match.group(1)) if match else None
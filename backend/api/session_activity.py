@@ -0,0 +1,300 @@
+"""
+Session activity stores for the JWT inactivity timeout
+
+JWTAuthService records when each session was last active and rejects tokens
+whose session has been idle for longer than the inactivity timeout. The
+store decides where that state lives:
+
+- InMemoryActivityStore keeps it in this process (single worker, tests).
+- MongoActivityStore shares it across workers and restarts through the
+  session_activity collection. Last-seen updates are buffered and flushed
+  in coalesced batches by a background thread, so a request only reads
+  MongoDB when its session is unknown to this worker or looks idle.
+
+A TTL index on session_activity.expires_at removes records once every token
+of the session has expired anyway.
+"""
+
+import atexit
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from django.conf import settings
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+
+class TokenActivityTracker:
+    """
+    Last-seen times keyed by session, kept in last-seen order.
+
+    Recording a use moves the key to the end of an OrderedDict, so the
+    stalest entries are always at the front and expiry only ever pops from
+    there. Recording and expiry are O(1) amortized no matter how many
+    sessions are live.
+    """
+
+    def __init__(self, retention_seconds: float = 600):
+        self.retention_seconds = retention_seconds
+        self._last_seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def touch(self, key: str, now: float, inactivity_timeout: float) -> bool:
+        """Record a use of the session; return False if it had been idle past the timeout"""
+        with self._lock:
+            last_used = self._last_seen.get(key)
+            if last_used is not None and now - last_used > inactivity_timeout:
+                return False
+            self._record(key, now)
+            return True
+
+    def last_seen(self, key: str) -> Optional[float]:
+        with self._lock:
+            return self._last_seen.get(key)
+
+    def record(self, key: str, now: float):
+        with self._lock:
+            self._record(key, now)
+
+    def _record(self, key: str, now: float):
+        self._last_seen[key] = now
+        self._last_seen.move_to_end(key)
+        self._expire(now)
+
+    def _expire(self, now: float):
+        """Drop entries not used within the retention window (oldest first)"""
+        cutoff = now - self.retention_seconds
+        last_seen = self._last_seen
+        while last_seen:
+            oldest_key = next(iter(last_seen))
+            if last_seen[oldest_key] >= cutoff:
+                break
+            last_seen.popitem(last=False)
+
+    def discard(self, key: str):
+        with self._lock:
+            self._last_seen.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._last_seen.clear()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._last_seen
+
+    def __len__(self) -> int:
+        return len(self._last_seen)
+
+
+class InMemoryActivityStore:
+    """Session activity held in this process only"""
+
+    def __init__(self, retention_seconds: float):
+        self._tracker = TokenActivityTracker(retention_seconds=retention_seconds)
+
+    def touch(self, key: str, now: float, inactivity_timeout: float) -> bool:
+        return self._tracker.touch(key, now, inactivity_timeout)
+
+    def start(self, key: str, now: float):
+        """Begin (or resume) a session, e.g. on login or token refresh"""
+        self._tracker.record(key, now)
+
+    def last_seen(self, key: str) -> Optional[float]:
+        return self._tracker.last_seen(key)
+
+    def discard(self, key: str):
+        self._tracker.discard(key)
+
+    def clear(self):
+        self._tracker.clear()
+
+    def flush(self) -> int:
+        return 0
+
+
+def _as_datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+def _as_timestamp(value: datetime) -> float:
+    # pymongo returns naive datetimes in UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class MongoActivityStore:
+    """
+    Session activity shared through MongoDB, with buffered writes.
+
+    touch() answers from this worker's own view when the session was seen
+    recently and only consults MongoDB when the session is unknown here or
+    looks idle (another worker may have seen it since). Writes are queued at
+    most once per write_granularity seconds per session and flushed with one
+    unordered bulk_write every flush_interval seconds. $max keeps concurrent
+    flushes from different workers monotonic.
+    """
+
+    collection_name = 'session_activity'
+
+    def __init__(self, retention_seconds: float, inactivity_timeout: float,
+                 flush_interval: float = 30.0, write_granularity: float = 60.0,
+                 max_batch: int = 1000, collection=None):
+        self.retention_seconds = retention_seconds
+        self.flush_interval = flush_interval
+        self.write_granularity = write_granularity
+        self.max_batch = max_batch
+        self._collection = collection
+        # Beyond the inactivity timeout the local view is re-checked against
+        # MongoDB anyway, so there is no point remembering it for longer
+        self._local = TokenActivityTracker(retention_seconds=inactivity_timeout)
+        self._queued = TokenActivityTracker(retention_seconds=write_granularity)
+        self._reset_state()
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_state)
+        atexit.register(self.flush)
+
+    def _reset_state(self):
+        # Also runs in forked children: the flush thread does not survive a
+        # fork and the parent flushes its own pending updates
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pending: Dict[str, float] = {}
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            from mongodb_config import MongoDBConfig
+            self._collection = MongoDBConfig.get_database()[self.collection_name]
+        return self._collection
+
+    def _update(self, key: str, now: float) -> UpdateOne:
+        return UpdateOne(
+            {'_id': key},
+            {'$max': {'last_seen': _as_datetime(now), 'expires_at': _as_datetime(now + self.retention_seconds)}},
+            upsert=True
+        )
+
+    def touch(self, key: str, now: float, inactivity_timeout: float) -> bool:
+        last_used = self._local.last_seen(key)
+        if last_used is None or now - last_used > inactivity_timeout:
+            stored = self.last_seen(key)
+            if stored is not None and (last_used is None or stored > last_used):
+                last_used = stored
+            if last_used is not None and now - last_used > inactivity_timeout:
+                return False
+
+        self._local.record(key, now)
+        self._queue(key, now)
+        return True
+
+    def start(self, key: str, now: float):
+        """Begin (or resume) a session; written through so every worker sees it at once"""
+        self._local.record(key, now)
+        self._queued.record(key, now)
+        try:
+            self.collection.bulk_write([self._update(key, now)])
+        except PyMongoError as e:
+            logger.warning(f"Could not record session start, queueing it instead: {e}")
+            self._queue(key, now, force=True)
+
+    def last_seen(self, key: str) -> Optional[float]:
+        """Last-seen time stored in MongoDB (None if unknown or unreachable)"""
+        try:
+            doc = self.collection.find_one({'_id': key}, {'last_seen': 1})
+        except PyMongoError as e:
+            logger.warning(f"Session activity lookup failed, using local state: {e}")
+            return None
+        return _as_timestamp(doc['last_seen']) if doc else None
+
+    def _queue(self, key: str, now: float, force: bool = False):
+        queued_at = self._queued.last_seen(key)
+        if not force and queued_at is not None and now - queued_at < self.write_granularity:
+            return
+        self._queued.record(key, now)
+
+        self._ensure_flusher()
+        with self._lock:
+            self._pending[key] = max(now, self._pending.get(key, now))
+            if len(self._pending) >= self.max_batch:
+                self._wake.set()
+
+    def _ensure_flusher(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='session-activity-flush', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Write every pending last-seen update in one batch; returns the number written"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        try:
+            self.collection.bulk_write([self._update(key, now) for key, now in pending.items()], ordered=False)
+        except PyMongoError as e:
+            logger.warning(f"Session activity flush of {len(pending)} updates failed, will retry: {e}")
+            with self._lock:
+                for key, now in pending.items():
+                    if len(self._pending) >= self.max_batch * 10:
+                        break
+                    self._pending[key] = max(now, self._pending.get(key, now))
+            return 0
+        return len(pending)
+
+    def discard(self, key: str):
+        self._local.discard(key)
+        self._queued.discard(key)
+        with self._lock:
+            self._pending.pop(key, None)
+        try:
+            self.collection.delete_one({'_id': key})
+        except PyMongoError as e:
+            logger.warning(f"Could not discard session activity: {e}")
+
+    def clear(self):
+        self._local.clear()
+        self._queued.clear()
+        with self._lock:
+            self._pending.clear()
+        try:
+            self.collection.delete_many({})
+        except PyMongoError as e:
+            logger.warning(f"Could not clear session activity: {e}")
+
+
+def build_activity_store(inactivity_timeout: float, retention_seconds: float):
+    """
+    Build the store configured by settings.MONGODB_SESSION_ACTIVITY, e.g.:
+
+        MONGODB_SESSION_ACTIVITY = {'BACKEND': 'mongodb', 'FLUSH_INTERVAL': 30, 'WRITE_GRANULARITY': 60}
+        MONGODB_SESSION_ACTIVITY = {'BACKEND': 'local'}
+    """
+    config = {'BACKEND': 'mongodb', 'FLUSH_INTERVAL': 30, 'WRITE_GRANULARITY': 60}
+    config.update(getattr(settings, 'MONGODB_SESSION_ACTIVITY', None) or {})
+    if config['BACKEND'] == 'local':
+        return InMemoryActivityStore(retention_seconds=retention_seconds)
+    return MongoActivityStore(
+        retention_seconds=retention_seconds,
+        inactivity_timeout=inactivity_timeout,
+        flush_interval=config['FLUSH_INTERVAL'],
+        write_granularity=config['WRITE_GRANULARITY'],
+    )
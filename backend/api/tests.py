@@ -1,3 +1,1186 @@
-from django.test import TestCase
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from io import BytesIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from bson import ObjectId
+import bcrypt
+import jwt
+from django.test import RequestFactory, TestCase as DjangoTestCase, override_settings
+
+from .avatar_images import AvatarImages
+from .mongodb_cache import LocalTTLCache, PlanCache, TokenPayloadCache, UserCache
+from .password_hashing import cost_factor
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+
+import mongodb_config
+from mongodb_config import MongoDBClientRegistry, MongoDBConfig
+
+from .mongodb_service import AccountService, AvatarService, BudgetService, JWTAuthService, MongoDBService, SyncService, UserService
+from .mongodb_api_views import mongodb_get_accounts, mongodb_get_budget_range, mongodb_save_budget_range, mongodb_sync
+from .mongodb_auth_views import mongodb_get_avatar
+from .mongodb_urls import metrics
+from . import mongodb_debt_planner
+from .mongodb_indexes import (
+    INDEX_MANIFEST, QUERY_SHAPES, reconcile_indexes, remove_seeded_documents, seed_query_shapes, verify_query_plans
+)
+from .mongodb_debt_planner import mongodb_debt_planner_compare_test, mongodb_debt_planner_test
+from .debt_payoff import simulate_payoff, simulate_payoff_events, simulate_strategies
+from .session_activity import InMemoryActivityStore, TokenActivityTracker
+from .worker_pools import BoundedExecutor, PoolBusy
+
+
+class _NoLiveDatabase:
+    """
+    Stands in for MongoDBService.db during tests so nothing connects to a
+    real server. Callers that swallow errors (e.g. conditional_on) would hide
+    the AssertionError, so every access is also recorded and fails the test.
+    """
+
+    reached = []
+
+    def __getattr__(self, name):
+        _NoLiveDatabase.reached.append(name)
+        raise AssertionError(f"Test reached for MongoDB collection '{name}' without mocking it")
+
+    __getitem__ = __getattr__
+
+
+def setUpModule():
+    MongoDBService.db = _NoLiveDatabase()
+
+
+def tearDownModule():
+    MongoDBService.db = None
+
+
+class TestCase(DjangoTestCase):
+    """Fails tests whose code used MongoDBService.db without patching it"""
+
+    def _post_teardown(self):
+        super()._post_teardown()
+        reached, _NoLiveDatabase.reached[:] = list(_NoLiveDatabase.reached), []
+        if reached:
+            raise AssertionError(f"Unmocked MongoDB access to: {', '.join(reached)}")
+
+
+_LOCAL_MONGODB_URI = os.getenv('MONGODB_TEST_URI', 'mongodb://localhost:27017')
+
+
+def _local_mongod_available():
+    """Whether a mongod answers on _LOCAL_MONGODB_URI within a fraction of a second"""
+    client = MongoClient(_LOCAL_MONGODB_URI, serverSelectionTimeoutMS=300)
+    try:
+        client.admin.command('ping')
+        return True
+    except PyMongoError:
+        return False
+    finally:
+        client.close()
+
+
+class StartupModeTests(TestCase):
+    """Startup is deferred unless MONGODB_STARTUP_MODE asks to block"""
+
+    def test_defaults_to_deferred(self):
+        with mock.patch.dict(os.environ):
+            os.environ.pop('MONGODB_STARTUP_MODE', None)
+            self.assertEqual(MongoDBConfig.get_startup_mode(), 'deferred')
+
+    def test_blocking_is_case_insensitive_and_anything_else_defers(self):
+        for value, mode in (('BLOCKING', 'blocking'), ('eager', 'deferred'), ('', 'deferred')):
+            with mock.patch.dict(os.environ, {'MONGODB_STARTUP_MODE': value}):
+                self.assertEqual(MongoDBConfig.get_startup_mode(), mode)
+
+
+class ClientRegistryTests(TestCase):
+    """One lazily created client per URI per process, dropped after fork()"""
+
+    def setUp(self):
+        for name, value in (('_clients', {}), ('_pid', os.getpid()), ('_reset_callbacks', [])):
+            patcher = mock.patch.object(MongoDBClientRegistry, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(mongodb_config, 'MongoClient', side_effect=lambda *args, **kwargs: mock.MagicMock())
+        self.client_class = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reuses_the_client_per_uri(self):
+        first = MongoDBClientRegistry.get_client('mongodb://a:27017', {})
+        self.assertIs(MongoDBClientRegistry.get_client('mongodb://a:27017', {}), first)
+        self.assertIsNot(MongoDBClientRegistry.get_client('mongodb://b:27017', {}), first)
+        self.assertEqual(self.client_class.call_count, 2)
+
+    def test_forked_child_drops_inherited_clients(self):
+        callback = mock.Mock()
+        MongoDBClientRegistry.add_reset_callback(callback)
+        inherited = MongoDBClientRegistry.get_client('mongodb://a:27017', {})
+        MongoDBClientRegistry._pid = os.getpid() + 1  # as seen from a child of this process
+
+        fresh = MongoDBClientRegistry.get_client('mongodb://a:27017', {})
+
+        self.assertIsNot(fresh, inherited)
+        inherited.close.assert_not_called()
+        callback.assert_called_once_with()
+        self.assertEqual(MongoDBClientRegistry._pid, os.getpid())
+
+
+_HAS_LOCAL_MONGOD = _local_mongod_available()
+
+
+class IndexReconcileTests(TestCase):
+    """Reconciling swaps a replaced index for its successor instead of keeping both"""
+
+    def test_old_budget_month_index_is_swapped(self):
+        db = mock.MagicMock()
+        live = {
+            '_id_': {'name': '_id_', 'key': {'_id': 1}},
+            'user_id_1_month_1_year_1': {
+                'name': 'user_id_1_month_1_year_1', 'key': {'user_id': 1, 'month': 1, 'year': 1}, 'unique': True,
+            },
+        }
+        db['budgets'].list_indexes.side_effect = lambda: list(live.values())
+        db['budgets'].index_information.side_effect = lambda: live
+        db['budgets'].create_index.side_effect = lambda keys, name, **options: live.setdefault(name, {'name': name})
+
+        with mock.patch.dict(INDEX_MANIFEST, {'budgets': INDEX_MANIFEST['budgets']}, clear=True):
+            applied = reconcile_indexes(db)
+
+        self.assertEqual(applied['replaced'], 1)
+        self.assertEqual(applied['failed'], 0)
+        db['budgets'].drop_index.assert_called_once_with('user_id_1_month_1_year_1')
+
+    def test_range_shape_is_the_query_the_service_sends(self):
+        service = BudgetService()
+        db = mock.MagicMock()
+        with mock.patch.object(service, 'db', db):
+            service.get_budgets_in_range(str(ObjectId()), (2024, 11), (2026, 2))
+
+        query = dict(db.budgets.find.call_args[0][0], user_id=None)
+        shapes = [dict(shape, user_id=None) for collection, shape, _ in QUERY_SHAPES if collection == 'budgets']
+        self.assertIn(query, shapes)
+
+    def test_replaced_index_is_kept_when_its_successor_fails(self):
+        db = mock.MagicMock()
+        db['budgets'].list_indexes.return_value = [
+            {'name': 'user_id_1_month_1_year_1', 'key': {'user_id': 1, 'month': 1, 'year': 1}, 'unique': True},
+        ]
+        db['budgets'].index_information.return_value = {}
+        db['budgets'].create_index.side_effect = PyMongoError('build failed')
+
+        with mock.patch.dict(INDEX_MANIFEST, {'budgets': INDEX_MANIFEST['budgets']}, clear=True):
+            applied = reconcile_indexes(db)
+
+        self.assertEqual(applied['replaced'], 0)
+        db['budgets'].drop_index.assert_not_called()
+
+
+@skipUnless(_HAS_LOCAL_MONGOD, f'No mongod at {_LOCAL_MONGODB_URI}')
+class IndexPlanTests(TestCase):
+    """Every query shape in the index manifest is index-backed on a real mongod"""
+
+    def setUp(self):
+        self.client = MongoClient(_LOCAL_MONGODB_URI, serverSelectionTimeoutMS=2000)
+        self.db = self.client['financability_index_test']
+        self.client.drop_database(self.db.name)
+        self.addCleanup(self.client.close)
+        self.addCleanup(self.client.drop_database, self.db.name)
+
+    def test_no_query_shape_needs_a_collscan(self):
+        reconcile_indexes(self.db)
+        seeded = seed_query_shapes(self.db)
+        try:
+            failures = verify_query_plans(self.db)
+        finally:
+            remove_seeded_documents(self.db, seeded)
+
+        self.assertEqual(failures, [])
+
+
+@skipUnless(_HAS_LOCAL_MONGOD, f'No mongod at {_LOCAL_MONGODB_URI}')
+class StoredBudgetTotalsTests(TestCase):
+    """Field updates store the same totals budget_totals computes, on a real mongod"""
+
+    def setUp(self):
+        self.client = MongoClient(_LOCAL_MONGODB_URI, serverSelectionTimeoutMS=2000)
+        self.db = self.client['financability_totals_test']
+        self.client.drop_database(self.db.name)
+        self.addCleanup(self.client.close)
+        self.addCleanup(self.client.drop_database, self.db.name)
+        self.service = BudgetService()
+        patcher = mock.patch.object(self.service, 'db', self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user_id = str(ObjectId())
+
+    def stored(self, month):
+        return self.db.budgets.find_one({'user_id': ObjectId(self.user_id), 'month': month, 'year': 2026})
+
+    def test_single_update_stores_totals(self):
+        self.db.budgets.insert_one({
+            'user_id': ObjectId(self.user_id), 'month': 1, 'year': 2026, 'income': 5000,
+            'additional_income_items': [{'name': 'Side gig', 'amount': '500'}],
+            'additional_items': [{'name': 'Refund', 'amount': 50, 'type': 'income'}, {'name': 'Gym', 'amount': 100}],
+            'savings_items': [{'name': 'Emergency Fund', 'amount': 300}],
+            'totals': {'income': 0.0},
+        })
+        self.service.update_budget_field(self.user_id, 1, 2026, 'Food', 'not a number')
+        self.service.update_budget_field(self.user_id, 1, 2026, 'Housing', 1500.5)
+
+        budget = self.stored(1)
+        self.assertEqual(budget['totals'], BudgetService.budget_totals(budget))
+        self.assertEqual(budget['totals']['expenses'], 1600.5)
+
+    def test_batch_stores_totals_of_new_months(self):
+        self.service.batch_update_fields(self.user_id, [
+            (1, 2026, {'income': 4000.0}), (2, 2026, {'expenses.food': 120.0}), (1, 2026, {'expenses.food': 50.0}),
+        ])
+
+        for month, net_savings in ((1, 3950.0), (2, -120.0)):
+            budget = self.stored(month)
+            self.assertEqual(budget['totals'], BudgetService.budget_totals(budget))
+            self.assertEqual(budget['totals']['net_savings'], net_savings)
+            self.assertEqual(budget['expenses']['housing'], 0.0)
+
+
+class AuthContextTests(TestCase):
+    """The JWT is verified and the user loaded once per request"""
+
+    def setUp(self):
+        self.user_id = ObjectId()
+        self.user = {'_id': self.user_id, 'username': 'alice', 'email': 'alice@example.com', 'profile': {}}
+        JWTAuthService.set_activity_store(InMemoryActivityStore(retention_seconds=600))
+        token = JWTAuthService().create_access_token({'user_id': str(self.user_id), 'username': 'alice'})
+        self.request = RequestFactory().get('/api/mongodb/accounts/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        UserCache.set_backend(LocalTTLCache())
+
+    def tearDown(self):
+        JWTAuthService.set_activity_store(None)
+
+    def test_one_user_fetch_per_request(self):
+        with mock.patch.object(UserService, 'get_user_by_id', return_value=self.user) as get_user, \
+                mock.patch.object(JWTAuthService, 'verify_token', autospec=True,
+                                  side_effect=JWTAuthService.verify_token) as verify_token, \
+                mock.patch.object(AccountService, 'get_user_accounts', return_value=[]), \
+                mock.patch.object(MongoDBService, 'get_versions', return_value={}):
+            response = mongodb_get_accounts(self.request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_user.call_count, 1)
+        self.assertEqual(verify_token.call_count, 1)
+
+
+class UserCacheTests(TestCase):
+    """The user cache hands out isolated copies and honours its size bound and TTL"""
+
+    def setUp(self):
+        UserCache.set_backend(LocalTTLCache(max_size=2, ttl=60))
+        self.user_id = str(ObjectId())
+
+    def tearDown(self):
+        UserCache.set_backend(None)
+
+    def test_cached_copy_is_isolated(self):
+        UserCache.set(self.user_id, {'_id': self.user_id, 'profile': {'first_name': 'A'}})
+        user = UserCache.get(self.user_id)
+        user['profile']['first_name'] = 'B'
+        self.assertEqual(UserCache.get(self.user_id)['profile']['first_name'], 'A')
+
+    def test_invalidate_and_lru_bound(self):
+        UserCache.set(self.user_id, {'_id': self.user_id})
+        UserCache.invalidate(self.user_id)
+        self.assertIsNone(UserCache.get(self.user_id))
+
+        for key in ('a', 'b', 'c'):
+            UserCache.set(key, {'_id': key})
+        self.assertIsNone(UserCache.get('a'))
+        self.assertIsNotNone(UserCache.get('c'))
+
+    def test_expired_entries_are_misses(self):
+        backend = LocalTTLCache(max_size=10, ttl=0)
+        UserCache.set_backend(backend)
+        UserCache.set(self.user_id, {'_id': self.user_id})
+        self.assertIsNone(UserCache.get(self.user_id))
+        self.assertEqual(backend.stats()['misses'], 1)
+
+
+class SessionActivityTests(TestCase):
+    """Inactivity expiry holds across instances and stale entries are evicted oldest-first"""
+
+    def setUp(self):
+        self.store = InMemoryActivityStore(retention_seconds=JWTAuthService.SESSION_RETENTION_SECONDS)
+        JWTAuthService.set_activity_store(self.store)
+
+    def tearDown(self):
+        JWTAuthService.set_activity_store(None)
+
+    def test_idle_session_stays_rejected_until_login(self):
+        user_id = str(ObjectId())
+        token = JWTAuthService().create_access_token({'user_id': user_id})
+        self.assertIsNotNone(JWTAuthService().verify_token(token))
+
+        self.store.start(user_id, time.time() - JWTAuthService.INACTIVITY_TIMEOUT_SECONDS - 1)
+        self.assertIsNone(JWTAuthService().verify_token(token))
+        self.assertIsNone(JWTAuthService().verify_token(token))
+
+        token = JWTAuthService().create_access_token({'user_id': user_id})
+        self.assertIsNotNone(JWTAuthService().verify_token(token))
+
+    def test_stale_entries_are_evicted(self):
+        tracker = TokenActivityTracker(retention_seconds=600)
+        tracker.touch('a', 0, 1800)
+        tracker.touch('b', 100, 1800)
+        tracker.touch('a', 200, 1800)
+        tracker.touch('c', 750, 1800)
+        self.assertNotIn('b', tracker)
+        self.assertIn('a', tracker)
+        self.assertEqual(len(tracker), 2)
+
+
+@override_settings(PASSWORD_HASHING={'ROUNDS': 5, 'WORKERS': 1, 'MAX_PENDING': 1, 'TIMEOUT': 10})
+class LoginPipelineTests(TestCase):
+    """Login fetches the user once and upgrades hashes made with another cost factor"""
+
+    def setUp(self):
+        self.user = {
+            '_id': ObjectId(), 'username': 'alice', 'is_active': True, 'last_login': None,
+            'password_hash': bcrypt.hashpw(b'correct horse', bcrypt.gensalt(rounds=4)).decode('utf-8'),
+        }
+        self.service = UserService()
+        self.db = mock.MagicMock()
+        self.db.users.find_one.return_value = dict(self.user)
+
+    def test_login_rehashes_outdated_cost(self):
+        with mock.patch.object(self.service, 'db', self.db):
+            outcome, user = self.service.login_user('alice', 'correct horse')
+
+        self.assertEqual(outcome, UserService.LOGIN_OK)
+        self.assertNotIn('password_hash', user)
+        self.assertEqual(self.db.users.find_one.call_count, 1)
+        update = self.db.users.update_one.call_args[0][1]['$set']
+        self.assertEqual(cost_factor(update['password_hash']), 5)
+        self.assertTrue(bcrypt.checkpw(b'correct horse', update['password_hash'].encode('utf-8')))
+
+    def test_wrong_password_writes_nothing(self):
+        with mock.patch.object(self.service, 'db', self.db):
+            outcome, user = self.service.login_user('alice', 'wrong')
+
+        self.assertEqual(outcome, UserService.LOGIN_INVALID_PASSWORD)
+        self.assertIsNone(user)
+        self.db.users.update_one.assert_not_called()
+
+
+class BoundedExecutorTests(TestCase):
+    """A full pool and a call that outlives the timeout both raise the busy error"""
+
+    class Busy(PoolBusy):
+        pass
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.pool = BoundedExecutor('test-pool', workers=1, max_pending=0, timeout=0.05, busy_error=self.Busy)
+
+    def test_timeout_raises_busy_error(self):
+        with self.assertRaises(self.Busy):
+            self.pool.run(self.release.wait)
+
+    def test_full_pool_raises_busy_error(self):
+        self.pool.timeout = 5
+        worker = threading.Thread(target=self.pool.run, args=(self.release.wait,))
+        worker.start()
+        try:
+            time.sleep(0.05)
+            with self.assertRaises(self.Busy):
+                self.pool.run(lambda: None)
+        finally:
+            self.release.set()
+            worker.join()
+
+
+class TokenPayloadCacheTests(TestCase):
+    """Verified payloads are reused until invalidated and never outlive exp"""
+
+    def setUp(self):
+        JWTAuthService.set_activity_store(InMemoryActivityStore(retention_seconds=600))
+        TokenPayloadCache.set_backend(LocalTTLCache(max_size=16, ttl=300))
+        self.token = JWTAuthService().create_access_token({'user_id': str(ObjectId())})
+
+    def tearDown(self):
+        JWTAuthService.set_activity_store(None)
+        TokenPayloadCache.set_backend(None)
+
+    def test_payload_is_decoded_once(self):
+        with mock.patch('api.mongodb_service.jwt.decode', side_effect=jwt.decode) as decode:
+            first = JWTAuthService().verify_token(self.token)
+            second = JWTAuthService().verify_token(self.token)
+            JWTAuthService().invalidate_token(self.token)
+            JWTAuthService().verify_token(self.token)
+
+        self.assertEqual(first, second)
+        # one decode per cache miss, plus one inside invalidate_token
+        self.assertEqual(decode.call_count, 3)
+        self.assertEqual(TokenPayloadCache.stats()['hits'], 1)
+
+    def test_entries_do_not_outlive_exp(self):
+        TokenPayloadCache.set('expired', {'user_id': 'x', 'exp': time.time() - 1})
+        self.assertIsNone(TokenPayloadCache.get('expired'))
+
+
+class AvatarEndpointTests(TestCase):
+    """Avatars are served with a content-hash ETag and revalidate to 304"""
+
+    def setUp(self):
+        self.avatar_id = 'a' * 64
+        self.factory = RequestFactory()
+
+    def test_serves_image_with_cache_headers(self):
+        avatar = {'_id': self.avatar_id, 'data': b'\x89PNG', 'content_type': 'image/png'}
+        with mock.patch.object(AvatarService, 'get', return_value=avatar):
+            response = mongodb_get_avatar(self.factory.get('/'), self.avatar_id)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['ETag'], f'"{self.avatar_id}"')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_matching_etag_skips_the_fetch(self):
+        with mock.patch.object(AvatarService, 'get') as get:
+            response = mongodb_get_avatar(
+                self.factory.get('/', HTTP_IF_NONE_MATCH=f'W/"{self.avatar_id}"'), self.avatar_id
+            )
+
+        self.assertEqual(response.status_code, 304)
+        get.assert_not_called()
+
+
+class ProfileAvatarTests(TestCase):
+    """Profile saves never touch the avatar reference that only uploads own"""
+
+    def setUp(self):
+        self.avatar_id = 'b' * 64
+        self.user = {'_id': ObjectId(), 'profile': {'first_name': 'Alice'}}
+        self.db = mock.MagicMock()
+        self.db.users.find_one_and_update.side_effect = self.set_fields
+        self.db.users.update_one.side_effect = self.set_fields
+        self.db.users.find_one.side_effect = lambda query, projection=None: (
+            self.user if self.user['profile'].get('avatar_id') == query.get('profile.avatar_id') else None
+        )
+
+    def set_fields(self, query, update, **kwargs):
+        previous = {'profile': dict(self.user['profile'])}
+        for path, value in update['$set'].items():
+            if path.startswith('profile.'):
+                self.user['profile'][path.split('.', 1)[1]] = value
+            else:
+                self.user[path] = value
+        return mock.MagicMock(modified_count=1) if 'projection' not in kwargs else previous
+
+    def test_profile_save_keeps_the_avatar(self):
+        service = UserService()
+        with mock.patch.object(MongoDBService, 'db', self.db), \
+                mock.patch.object(AvatarService, 'store', return_value=(self.avatar_id, [])):
+            service.update_profile_image(str(self.user['_id']), b'image', 'me.png',
+                                         url_for=lambda avatar_id, variant: f'/avatars/{avatar_id}')
+            updated = service.update_user_comprehensive(str(self.user['_id']), {
+                'profile': {'first_name': 'Alicia', 'avatar': '/avatars/elsewhere', 'avatar_id': None},
+            })
+            released = AvatarService().release(self.avatar_id)
+
+        self.assertTrue(updated)
+        self.assertEqual(self.user['profile'], {
+            'first_name': 'Alicia', 'avatar': f'/avatars/{self.avatar_id}', 'avatar_id': self.avatar_id,
+        })
+        self.assertFalse(released)
+        self.db.avatars.delete_one.assert_not_called()
+
+    def test_profile_updates_are_per_field(self):
+        self.assertEqual(
+            UserService.profile_updates({'age': 30, 'avatar_id': 'x', 'avatar.size': 1, '$where': 1}),
+            {'profile.age': 30},
+        )
+
+
+@skipUnless(AvatarImages.available(), 'Pillow is not installed')
+class AvatarImagesTests(TestCase):
+    """Uploads are re-encoded without metadata and thumbnailed"""
+
+    def test_thumbnails_and_metadata(self):
+        from PIL import Image
+
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera Maker'
+        buffer = BytesIO()
+        Image.new('RGB', (1600, 1200), (40, 120, 200)).save(buffer, 'JPEG', exif=exif.tobytes())
+
+        processed = AvatarImages.process(buffer.getvalue(), 'image/jpeg')
+
+        original = Image.open(BytesIO(processed.data))
+        self.assertEqual(len(original.getexif()), 0)
+        self.assertEqual(max(original.size), 1024)
+        self.assertEqual(Image.open(BytesIO(processed.variants['128.webp'][0])).size, (128, 128))
+
+    def test_rejects_non_images(self):
+        with self.assertRaises(ValueError):
+            AvatarImages.process(b'not an image', 'image/png')
+
+
+class BudgetFieldUpsertTests(TestCase):
+    """Budget field updates upsert atomically, batch into one write and survive a concurrent insert"""
+
+    def setUp(self):
+        self.service = BudgetService()
+        self.db = mock.MagicMock()
+        self.user_id = str(ObjectId())
+
+    def test_single_upsert_with_skeleton(self):
+        budget = {'_id': ObjectId(), 'month': 1, 'year': 2026, 'expenses': {'food': 120.0}}
+        self.db.budgets.find_one_and_update.return_value = budget
+        with mock.patch.object(self.service, 'db', self.db):
+            result = self.service.update_budget_field(self.user_id, 1, 2026, 'Food', 120.0)
+
+        self.assertEqual(result, budget)
+        self.assertEqual(self.db.budgets.find_one_and_update.call_count, 1)
+        self.db.budgets.bulk_write.assert_not_called()
+        self.db.budgets.find_one.assert_not_called()
+        query, update = self.db.budgets.find_one_and_update.call_args[0]
+        self.assertEqual(query, {'user_id': ObjectId(self.user_id), 'month': 1, 'year': 2026})
+        fields, totals = update
+        self.assertEqual(fields['$set']['expenses.food'], {'$literal': 120.0})
+        self.assertEqual(fields['$set']['expenses.housing'], {'$ifNull': ['$expenses.housing', {'$literal': 0.0}]})
+        self.assertEqual(totals, {'$set': {'totals': BudgetService.totals_expression()}})
+
+    def test_duplicate_key_retries_as_update(self):
+        budget = {'_id': ObjectId(), 'month': 1, 'year': 2026, 'income': 4000}
+        self.db.budgets.find_one_and_update.side_effect = [DuplicateKeyError('E11000'), budget]
+        with mock.patch.object(self.service, 'db', self.db):
+            result = self.service.update_income_with_additional(self.user_id, 1, 2026, 5000, 1000)
+
+        self.assertEqual(result, budget)
+        self.assertEqual(self.db.budgets.find_one_and_update.call_count, 2)
+
+    def test_batch_merges_months_into_one_bulk_write(self):
+        user_id = ObjectId(self.user_id)
+        self.db.budgets.find.return_value = [
+            {'_id': ObjectId(), 'user_id': user_id, 'month': month, 'year': 2026} for month in (1, 2)
+        ]
+        self.db.budgets.bulk_write.side_effect = [
+            BulkWriteError({'writeErrors': [{'index': 1, 'code': 11000, 'errmsg': 'E11000'}]}),
+            None,
+        ]
+        updates = [
+            (1, 2026, {'income': 4000}),
+            (2, 2026, {'expenses.food': 100}),
+            (1, 2026, {'expenses.food': 50}),
+        ]
+        with mock.patch.object(self.service, 'db', self.db):
+            budgets = self.service.batch_update_fields(self.user_id, updates)
+
+        first_batch = self.db.budgets.bulk_write.call_args_list[0][0][0]
+        self.assertEqual(len(first_batch), 2)
+        fields, totals = first_batch[0]._doc
+        self.assertEqual(fields['$set']['income'], {'$literal': 4000})
+        self.assertEqual(fields['$set']['expenses.food'], {'$literal': 50})
+        # the totals are stored by the same write
+        self.assertEqual(totals, {'$set': {'totals': BudgetService.totals_expression()}})
+        # only the month that lost the insert race is retried
+        self.assertEqual(len(self.db.budgets.bulk_write.call_args_list[1][0][0]), 1)
+        self.assertEqual(self.db.budgets.bulk_write.call_count, 2)
+        self.assertEqual(self.db.budgets.find.call_count, 1)
+        self.assertEqual(set(budgets), {(1, 2026), (2, 2026)})
+        self.assertTrue(all(budgets.values()))
+
+
+class BudgetTotalsTests(TestCase):
+    """Derived totals follow one set of rules and never go stale in storage"""
+
+    def test_totals_rules(self):
+        totals = BudgetService.budget_totals({
+            'income': 5000,
+            'additional_income': 999,
+            'additional_income_items': [{'name': 'Side gig', 'amount': 500}],
+            'expenses': {'housing': 1500, 'food': '400'},
+            'additional_items': [{'name': 'Gym', 'amount': 100, 'type': 'expense'},
+                                 {'name': 'Refund', 'amount': 50, 'type': 'income'}],
+            'savings_items': [{'name': 'Emergency Fund', 'amount': 300}],
+        })
+
+        self.assertEqual(totals, {
+            'income': 5500.0, 'expenses': 2000.0, 'savings': 300.0,
+            'net_savings': 3500.0, 'savings_rate': 0.6364,
+        })
+        self.assertEqual(BudgetService.budget_totals({})['savings_rate'], 0.0)
+
+    def test_field_update_stores_totals_in_the_same_write(self):
+        service = BudgetService()
+        db = mock.MagicMock()
+        with mock.patch.object(service, 'db', db):
+            service.update_budget_field(str(ObjectId()), 1, 2026, 'Food', 120.0)
+
+        _, update = db.budgets.find_one_and_update.call_args[0]
+        self.assertEqual(update[-1], {'$set': {'totals': BudgetService.totals_expression()}})
+        db.budgets.bulk_write.assert_not_called()
+
+    def test_stored_totals_guarded_by_updated_at(self):
+        service = BudgetService()
+        db = mock.MagicMock()
+        updated_at = datetime(2026, 1, 5, 12, 0)
+        budget = {'_id': ObjectId(), 'income': 4000, 'expenses': {'food': 120.0}, 'updated_at': updated_at}
+        with mock.patch.object(service, 'db', db):
+            service._store_totals([budget, None])
+
+        (write,) = db.budgets.bulk_write.call_args[0][0]
+        self.assertEqual(write._filter, {'_id': budget['_id'], 'updated_at': updated_at})
+        self.assertEqual(write._doc, {'$set': {'totals': budget['totals']}})
+
+
+class BudgetPropagationTests(TestCase):
+    """Forward propagation reads once, writes once and respects manual edits"""
+
+    def test_propagates_split_and_expenses_around_manual_edits(self):
+        service = BudgetService()
+        user_id = str(ObjectId())
+        service_db = mock.MagicMock()
+        service_db.budgets.find.return_value = [
+            {'month': 12, 'year': 2026, 'income': 5000, 'additional_income': 500, 'expenses': {'food': 300}},
+            {'month': 1, 'year': 2027, 'manually_edited_categories': ['Food']},
+            {'month': 2, 'year': 2027, 'manually_edited_categories': ['Primary Income', 'Food']},
+        ]
+        with mock.patch.object(service, 'db', service_db), \
+                mock.patch.object(BudgetService, 'batch_update_fields', return_value={}) as batch:
+            result = service.propagate_forward(user_id, 12, 2026, 3, expense_categories=['Food'])
+
+        self.assertEqual(service_db.budgets.find.call_count, 1)
+        (called_user, updates), _ = batch.call_args
+        self.assertEqual(called_user, user_id)
+        split = {'income': 5000.0, 'additional_income': 500.0}
+        self.assertEqual(updates, [
+            (1, 2027, split),
+            (3, 2027, {**split, 'expenses.food': 300.0}),
+        ])
+        self.assertEqual(result['skipped'], {(1, 2027): ['food'], (2, 2027): ['income', 'food']})
+
+    def test_missing_source_month_needs_explicit_income(self):
+        service = BudgetService()
+        service_db = mock.MagicMock()
+        service_db.budgets.find.return_value = []
+        with mock.patch.object(service, 'db', service_db):
+            with self.assertRaises(ValueError):
+                service.propagate_forward(str(ObjectId()), 3, 2026, 2)
+
+
+class BudgetQueryOptionsTests(TestCase):
+    """get_user_budgets narrows windows, latest-N and predicates in the query"""
+
+    def setUp(self):
+        self.service = BudgetService()
+        self.db = mock.MagicMock()
+        patcher = mock.patch.object(self.service, 'db', self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cursor = self.db.budgets.find.return_value
+        self.cursor.sort.return_value = self.cursor
+        self.cursor.limit.return_value = self.cursor
+
+    def test_latest_matching_is_one_indexed_lookup(self):
+        user_id = ObjectId()
+        self.cursor.__iter__.return_value = iter([{'month': 4, 'year': 2026}])
+        budget = self.service.get_latest_budget(
+            str(user_id), match={'savings_items.name': 'Emergency Fund'}, fields=['savings_items']
+        )
+
+        self.assertEqual(budget, {'month': 4, 'year': 2026})
+        self.db.budgets.find.assert_called_once_with(
+            {'$and': [{'user_id': user_id}, {'savings_items.name': 'Emergency Fund'}]},
+            {'month': 1, 'year': 1, 'savings_items': 1}
+        )
+        self.cursor.sort.assert_called_once_with([('year', -1), ('month', -1)])
+        self.cursor.limit.assert_called_once_with(1)
+
+    def test_latest_n_comes_back_oldest_first(self):
+        self.cursor.__iter__.return_value = iter([{'month': 2, 'year': 2026}, {'month': 12, 'year': 2025}])
+        budgets = self.service.get_user_budgets(str(ObjectId()), start=(2025, 1), latest=2)
+
+        self.assertEqual([(b['year'], b['month']) for b in budgets], [(2025, 12), (2026, 2)])
+        query = self.db.budgets.find.call_args[0][0]
+        self.assertIn('$or', query)
+        self.cursor.limit.assert_called_once_with(2)
+
+
+class BudgetRangeTests(TestCase):
+    """Month windows are one bounded query and the endpoint validates its window"""
+
+    def test_range_query_spans_years(self):
+        query = BudgetService.month_range_query((2025, 11), (2027, 2))
+        self.assertEqual(query['$or'][0], {'year': 2025, 'month': {'$gte': 11}})
+        self.assertEqual(query['$or'][1], {'year': {'$gt': 2025, '$lt': 2027}})
+        self.assertEqual(query['$or'][2], {'year': 2027, 'month': {'$lte': 2}})
+        self.assertEqual(
+            BudgetService.month_range_query((2026, 3), (2026, 5)),
+            {'year': 2026, 'month': {'$gte': 3, '$lte': 5}}
+        )
+
+    def test_endpoint_reads_the_window_once(self):
+        JWTAuthService.set_activity_store(InMemoryActivityStore(retention_seconds=600))
+        self.addCleanup(JWTAuthService.set_activity_store, None)
+        user_id = ObjectId()
+        token = JWTAuthService().create_access_token({'user_id': str(user_id)})
+        user = {'_id': user_id, 'username': 'alice', 'email': 'alice@example.com', 'profile': {}}
+        factory = RequestFactory()
+
+        with mock.patch.object(UserService, 'get_user_by_id', return_value=user), \
+                mock.patch.object(MongoDBService, 'get_versions', return_value={}), \
+                mock.patch.object(BudgetService, 'get_budgets_in_range', return_value=[]) as get_range:
+            response = mongodb_get_budget_range(factory.get(
+                '/api/mongodb/budgets/range/', {'start': '2025-01', 'end': '2026-12'},
+                HTTP_AUTHORIZATION=f'Bearer {token}'
+            ))
+            too_long = mongodb_get_budget_range(factory.get(
+                '/api/mongodb/budgets/range/', {'start': '2000-01', 'end': '2026-12'},
+                HTTP_AUTHORIZATION=f'Bearer {token}'
+            ))
+
+        self.assertEqual(response.status_code, 200)
+        get_range.assert_called_once_with(str(user_id), (2025, 1), (2026, 12))
+        self.assertEqual(too_long.status_code, 400)
+
+
+    def test_save_range_rejects_malformed_months(self):
+        JWTAuthService.set_activity_store(InMemoryActivityStore(retention_seconds=600))
+        self.addCleanup(JWTAuthService.set_activity_store, None)
+        user_id = ObjectId()
+        token = JWTAuthService().create_access_token({'user_id': str(user_id)})
+        user = {'_id': user_id, 'username': 'alice', 'email': 'alice@example.com', 'profile': {}}
+        factory = RequestFactory()
+
+        with mock.patch.object(UserService, 'get_user_by_id', return_value=user), \
+                mock.patch.object(BudgetService, 'save_budgets') as save:
+            for budgets in (['2026-01'], [{'month': 'March', 'year': 2026}], [{'month': None, 'year': 2026}]):
+                response = mongodb_save_budget_range(factory.post(
+                    '/api/mongodb/budgets/save-range/', {'budgets': budgets},
+                    content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}'
+                ))
+                self.assertEqual(response.status_code, 400)
+
+        save.assert_not_called()
+
+    def test_new_months_keep_the_debt_total_like_single_saves(self):
+        service = BudgetService()
+        db = mock.MagicMock()
+        db.budgets.find.return_value = []
+        with mock.patch.object(service, 'db', db):
+            service.save_budgets(str(ObjectId()), [
+                {'month': 1, 'year': 2026, 'income': 4000, 'total_remaining_debt': 12000},
+                {'month': 2, 'year': 2026, 'income': 4000},
+            ])
+
+        first, second = db.budgets.bulk_write.call_args[0][0]
+        self.assertEqual(first._doc['$setOnInsert']['total_remaining_debt'], 12000)
+        self.assertNotIn('total_remaining_debt', first._doc['$set'])
+        self.assertNotIn('total_remaining_debt', second._doc['$setOnInsert'])
+
+
+class SyncTests(TestCase):
+    """Deletes leave tombstones and stale watermarks fall back to a full resync"""
+
+    def setUp(self):
+        self.db = mock.MagicMock()
+        self.db.__getitem__.side_effect = lambda name: getattr(self.db, name)
+        patcher = mock.patch.object(MongoDBService, 'db', self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user_id = ObjectId()
+
+    def test_delete_leaves_tombstone(self):
+        account_id = ObjectId()
+        self.db.accounts.find_one_and_delete.return_value = {'_id': account_id, 'user_id': self.user_id}
+
+        self.assertTrue(AccountService().delete_account(str(account_id)))
+        tombstone = self.db.sync_tombstones.insert_one.call_args[0][0]
+        self.assertEqual(tombstone['user_id'], self.user_id)
+        self.assertEqual(tombstone['collection'], 'accounts')
+        self.assertEqual(tombstone['doc_id'], str(account_id))
+
+    def test_recent_watermark_is_a_delta(self):
+        since = datetime.utcnow() - timedelta(hours=1)
+        self.db.sync_tombstones.find.return_value = [{'collection': 'debts', 'doc_id': 'abc'}]
+
+        result = SyncService().changes_since(str(self.user_id), since)
+
+        self.assertFalse(result['full'])
+        self.assertEqual(result['deleted']['debts'], ['abc'])
+        query = self.db.budgets.find.call_args[0][0]
+        self.assertEqual(query, {'user_id': self.user_id, 'updated_at': {'$gt': since}})
+        self.assertGreaterEqual(result['watermark'], since)
+
+    def test_stale_watermark_is_a_full_resync(self):
+        since = datetime.utcnow() - timedelta(seconds=SyncService.TOMBSTONE_RETENTION_SECONDS + 60)
+
+        result = SyncService().changes_since(str(self.user_id), since)
+
+        self.assertTrue(result['full'])
+        self.assertEqual(self.db.accounts.find.call_args[0][0], {'user_id': self.user_id})
+        self.db.sync_tombstones.find.assert_not_called()
+
+    def test_endpoint_rejects_bad_watermark(self):
+        JWTAuthService.set_activity_store(InMemoryActivityStore(retention_seconds=600))
+        self.addCleanup(JWTAuthService.set_activity_store, None)
+        token = JWTAuthService().create_access_token({'user_id': str(self.user_id)})
+        user = {'_id': self.user_id, 'username': 'alice', 'email': 'alice@example.com', 'profile': {}}
+
+        with mock.patch.object(UserService, 'get_user_by_id', return_value=user):
+            response = mongodb_sync(RequestFactory().get(
+                '/api/mongodb/sync/', {'since': 'yesterday'}, HTTP_AUTHORIZATION=f'Bearer {token}'
+            ))
+
+        self.assertEqual(response.status_code, 400)
+
+
+class ConditionalGetTests(TestCase):
+    """Read endpoints answer If-None-Match from the user's collection versions"""
+
+    def setUp(self):
+        JWTAuthService.set_activity_store(InMemoryActivityStore(retention_seconds=600))
+        self.addCleanup(JWTAuthService.set_activity_store, None)
+        self.user_id = ObjectId()
+        self.user = {'_id': self.user_id, 'username': 'alice', 'email': 'alice@example.com', 'profile': {}}
+        self.token = JWTAuthService().create_access_token({'user_id': str(self.user_id)})
+        self.factory = RequestFactory()
+
+    def get_accounts(self, **headers):
+        return mongodb_get_accounts(self.factory.get(
+            '/api/mongodb/accounts/', HTTP_AUTHORIZATION=f'Bearer {self.token}', **headers
+        ))
+
+    def test_unchanged_versions_answer_304_without_fetching(self):
+        with mock.patch.object(UserService, 'get_user_by_id', return_value=self.user), \
+                mock.patch.object(MongoDBService, 'get_versions', return_value={'accounts': 3}), \
+                mock.patch.object(AccountService, 'get_user_accounts', return_value=[]) as get_accounts:
+            first = self.get_accounts()
+            second = self.get_accounts(HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(get_accounts.call_count, 1)
+
+    def test_write_changes_the_etag(self):
+        with mock.patch.object(UserService, 'get_user_by_id', return_value=self.user), \
+                mock.patch.object(AccountService, 'get_user_accounts', return_value=[]):
+            with mock.patch.object(MongoDBService, 'get_versions', return_value={'accounts': 3, 'debts': 1}):
+                etag = self.get_accounts()['ETag']
+            with mock.patch.object(MongoDBService, 'get_versions', return_value={'accounts': 3, 'debts': 2}):
+                other_collection = self.get_accounts(HTTP_IF_NONE_MATCH=etag)
+            with mock.patch.object(MongoDBService, 'get_versions', return_value={'accounts': 4, 'debts': 2}):
+                written = self.get_accounts(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(other_collection.status_code, 304)
+        self.assertEqual(written.status_code, 200)
+        self.assertNotEqual(written['ETag'], etag)
+
+    def test_account_writes_bump_the_owner_version(self):
+        db = mock.MagicMock()
+        db.accounts.find_one_and_update.return_value = {'_id': ObjectId(), 'user_id': self.user_id}
+        with mock.patch.object(MongoDBService, 'db', db):
+            self.assertTrue(AccountService().update_account(str(ObjectId()), {'balance': 10}))
+
+        db.collection_versions.update_one.assert_called_once_with(
+            {'_id': self.user_id}, {'$inc': {'accounts': 1}}, upsert=True
+        )
+
+
+class DebtPlannerGoldenTests(TestCase):
+    """The array kernel reproduces the original month-by-month planner to the cent"""
+
+    DEBTS = [
+        {'name': 'Visa', 'balance': 4200.55, 'rate': 0.2199},
+        {'name': 'Car loan', 'balance': 12850.0, 'rate': 0.0649},
+        {'name': 'Store card', 'balance': 860.4, 'rate': 0.2699},
+        {'name': 'Student loan', 'balance': 23000.0, 'rate': 0.045},
+        {'name': 'Medical', 'balance': 1500.0, 'rate': 0.0},
+    ]
+    # Includes a negative month, a zero month and an empty entry (falls back to the last month)
+    VARYING = [{'net_savings': v} for v in [950, 950, 1200.5, -300, 0]] + [{}] + \
+        [{'net_savings': v} for v in [875.25, 1500, 1000, 640.1, 1100]]
+
+    def plan(self, debts, strategy, monthly_budget_data):
+        request = RequestFactory().post(
+            '/api/mongodb/debt-planner-test/',
+            data={'debts': debts, 'strategy': strategy, 'monthly_budget_data': monthly_budget_data},
+            content_type='application/json'
+        )
+        response = mongodb_debt_planner_test(request)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def assertSummary(self, data, months, total_interest, debts, first_interest):
+        self.assertEqual(data['months'], months)
+        self.assertEqual(data['total_interest'], total_interest)
+        self.assertEqual([(d['name'], d['total_paid'], d['total_interest']) for d in data['debts']], debts)
+        self.assertEqual(data['monthly_interest_payments'][:len(first_interest)], first_interest)
+        self.assertEqual(len(data['plan']), months + 1)
+
+    def test_snowball_and_avalanche_match_original_output(self):
+        constant = [{'month': 1, 'net_savings': 1250}]
+        self.assertSummary(self.plan(self.DEBTS, 'snowball', constant), 37, 3628.83, [
+            ('Store card', 879.75, 19.35), ('Medical', 1500.0, 0.0), ('Visa', 4535.9, 335.35),
+            ('Car loan', 13670.34, 820.34), ('Student loan', 25453.79, 2453.79),
+        ], [252.07, 234.83, 234.77, 213.99, 192.82, 171.25])
+        self.assertSummary(self.plan(self.DEBTS, 'avalanche', constant), 37, 3294.65, [
+            ('Store card', 879.75, 19.35), ('Visa', 4432.77, 232.22), ('Car loan', 13572.99, 722.99),
+            ('Student loan', 25320.08, 2320.08), ('Medical', 1500.0, 0.0),
+        ], [252.07, 228.05, 207.16, 185.87, 164.19, 154.21])
+
+    def test_varying_budget_matches_original_output(self):
+        self.assertSummary(self.plan(self.DEBTS, 'snowball', self.VARYING), 46, 4826.84, [
+            ('Store card', 879.75, 19.35), ('Medical', 1500.0, 0.0), ('Visa', 4741.92, 541.37),
+            ('Car loan', 13993.38, 1143.38), ('Student loan', 26122.73, 3122.73),
+        ], [252.07, 234.83, 236.97, 225.93, 227.89, 229.87])
+        self.assertSummary(self.plan(self.DEBTS, 'avalanche', self.VARYING), 46, 4363.46, [
+            ('Store card', 879.75, 19.35), ('Visa', 4567.62, 367.07), ('Car loan', 13870.62, 1020.62),
+            ('Student loan', 25956.42, 2956.42), ('Medical', 1500.0, 0.0),
+        ], [252.07, 233.54, 218.25, 198.08, 199.52, 200.99])
+
+    def test_snowball_reorders_when_interest_overtakes_a_balance(self):
+        debts = [
+            {'name': 'A', 'balance': 1000, 'rate': 0.30},
+            {'name': 'B', 'balance': 1005, 'rate': 0.0},
+            {'name': 'C', 'balance': 1005, 'rate': 0.12},
+        ]
+        budget = [{'net_savings': 10}] * 6 + [{'net_savings': 400}]
+        data = self.plan(debts, 'snowball', budget)
+
+        self.assertSummary(data, 15, 499.42, [('A', 1391.73, 391.73), ('B', 1005.0, 0.0), ('C', 1112.69, 107.69)], [35.05, 35.78])
+        # A accrues past B before the first payment, so B is paid first
+        self.assertEqual(data['plan'][1]['debts'], [
+            {'name': 'A', 'balance': 1025.0, 'paid': 0, 'interest': 25.0, 'interest_payment': 25.0, 'total_paid': 0, 'total_interest': 25.0},
+            {'name': 'B', 'balance': 995.0, 'paid': 10.0, 'interest': 0.0, 'interest_payment': 0.0, 'total_paid': 10.0, 'total_interest': 0.0},
+            {'name': 'C', 'balance': 1015.05, 'paid': 0, 'interest': 10.05, 'interest_payment': 10.05, 'total_paid': 0, 'total_interest': 10.05},
+        ])
+
+    def test_no_budget_runs_to_the_month_limit(self):
+        data = self.plan(self.DEBTS[:2], 'snowball', [])
+        self.assertTrue(data['hit_max_months'])
+        self.assertEqual(data['remaining_debts'], 2)
+        self.assertEqual(data['total_interest'], 2972621.71)
+
+    def test_kernel_reports_debts_in_given_order(self):
+        result = simulate_payoff([300.0, 100.0], [0.0, 0.0], [150.0], 'snowball')
+        self.assertEqual(result.months, 3)
+        self.assertEqual(result.paid[1].tolist(), [50.0, 100.0])
+        self.assertEqual(result.balance[-1].tolist(), [0.0, 0.0])
+
+
+class DebtPlannerEventTests(TestCase):
+    """Event mode jumps between payoffs and budget changes in closed form"""
+
+    BALANCES = [860.4, 1500.0, 4200.55, 12850.0, 23000.0]
+    RATES = [0.2699, 0.0, 0.2199, 0.0649, 0.045]
+
+    def assertSamePlan(self, monthly, events):
+        self.assertEqual(events.months, monthly.months)
+        self.assertAlmostEqual(events.total_interest, monthly.total_interest, places=6)
+        for got, expected in [(events.final_balance, monthly.final_balance), (events.final_total_paid, monthly.final_total_paid)]:
+            for a, b in zip(got.tolist(), expected.tolist()):
+                self.assertAlmostEqual(a, b, places=6)
+
+    def test_long_plan_takes_a_handful_of_steps(self):
+        for strategy in ('snowball', 'avalanche'):
+            monthly = simulate_payoff(self.BALANCES, self.RATES, [300.0], strategy)
+            events = simulate_payoff_events(self.BALANCES, self.RATES, [300.0], strategy)
+
+            self.assertGreater(monthly.months, 200)
+            self.assertLessEqual(events.steps, 2 * len(self.BALANCES))
+            self.assertSamePlan(monthly, events)
+            # Rows close each step, with paid and interest summed over it
+            self.assertEqual(events.month_numbers[-1], monthly.months)
+            self.assertAlmostEqual(events.paid.sum(), monthly.paid.sum(), places=6)
+
+    def test_budget_changes_are_events_and_requested_months_match(self):
+        net_savings = [400.0] * 12 + [-50.0] * 6 + [900.0] * 30 + [1500.0]
+        monthly = simulate_payoff(self.BALANCES, self.RATES, net_savings, 'snowball')
+        sampled = simulate_payoff_events(self.BALANCES, self.RATES, net_savings, 'snowball', months=[0, 6, 12, 15, 40, 500])
+
+        self.assertSamePlan(monthly, sampled)
+        self.assertEqual(sampled.month_numbers.tolist(), [0, 6, 12, 15, 40])
+        for row, month in enumerate(sampled.month_numbers.tolist()):
+            for column in ('balance', 'paid', 'interest', 'total_paid', 'total_interest_by_debt'):
+                for a, b in zip(getattr(sampled, column)[row].tolist(), getattr(monthly, column)[month].tolist()):
+                    self.assertAlmostEqual(a, b, places=6)
+
+    def test_endpoint_reports_event_rows(self):
+        request = RequestFactory().post('/api/mongodb/debt-planner-test/', data={
+            'debts': [{'name': 'Visa', 'balance': 4200.55, 'rate': 0.2199}, {'name': 'Car', 'balance': 12850, 'rate': 0.0649}],
+            'monthly_budget_data': [{'net_savings': 500}],
+            'mode': 'events',
+            'sample_months': [0, 12, 24],
+        }, content_type='application/json')
+        data = mongodb_debt_planner_test(request).data
+
+        self.assertEqual(data['mode'], 'events')
+        self.assertEqual([row['month'] for row in data['plan']], [0, 12, 24])
+        self.assertEqual(len(data['interest_payments']), 3)
+        self.assertNotIn('monthly_interest_payments', data)
+
+        request = RequestFactory().post('/api/mongodb/debt-planner-test/', data={
+            'debts': [{'name': 'Visa', 'balance': 100, 'rate': 0.2}], 'mode': 'events', 'sample_months': 'all'
+        }, content_type='application/json')
+        self.assertEqual(mongodb_debt_planner_test(request).status_code, 400)
+
+    def test_month_count_from_existing_clients_is_ignored(self):
+        request = RequestFactory().post('/api/mongodb/debt-planner-test/', data={
+            'debts': [{'name': 'Visa', 'balance': 100, 'rate': 0.2}], 'months': 12,
+            'monthly_budget_data': [{'net_savings': 50}]
+        }, content_type='application/json')
+        response = mongodb_debt_planner_test(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['months'], 3)
+
+
+class DebtPlannerCompareTests(TestCase):
+    """One comparison request simulates every strategy in a single batch"""
+
+    def compare(self, **body):
+        body = {'debts': DebtPlannerGoldenTests.DEBTS, 'monthly_budget_data': [{'net_savings': 1250}], **body}
+        request = RequestFactory().post('/api/mongodb/debt-planner-test/compare/', data=body, content_type='application/json')
+        return mongodb_debt_planner_compare_test(request)
+
+    def test_summaries_match_the_planner(self):
+        response = self.compare(custom_order=['Student loan', 'Car loan'])
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        by_strategy = {entry['strategy']: entry for entry in data['strategies']}
+
+        self.assertEqual(list(by_strategy), ['snowball', 'avalanche', 'highest_interest', 'custom'])
+        self.assertEqual(data['baseline'], 'snowball')
+        self.assertEqual((by_strategy['snowball']['months'], by_strategy['snowball']['total_interest']), (37, 3628.83))
+        self.assertEqual((by_strategy['avalanche']['months'], by_strategy['avalanche']['total_interest']), (37, 3294.65))
+        self.assertEqual(by_strategy['avalanche']['interest_saved'], 334.18)
+        self.assertEqual(by_strategy['snowball']['interest_saved'], 0)
+        self.assertLess(by_strategy['custom']['interest_saved'], 0)
+        self.assertEqual(data['best'], 'avalanche')
+        self.assertNotIn('plan', by_strategy['snowball'])
+
+    def test_plans_only_on_request_and_match_single_runs(self):
+        balances, rates = [500.0, 2500.0, 900.0], [0.29, 0.2, 0.05]
+        batch = simulate_strategies(balances, rates, [150.0], ['snowball', 'avalanche'], keep_history=True)
+        for strategy, result in zip(['snowball', 'avalanche'], batch):
+            single = simulate_payoff(balances, rates, [150.0], strategy)
+            self.assertEqual(result.balance.tolist(), single.balance.tolist())
+            self.assertEqual(result.total_interest, single.total_interest)
+
+        data = self.compare(strategies=['avalanche', 'snowball'], include_plans=True).data
+        self.assertEqual(data['baseline'], 'avalanche')
+        self.assertEqual(len(data['strategies'][0]['plan']), 38)
+
+    def test_custom_strategy_needs_an_order(self):
+        self.assertEqual(self.compare(strategies=['snowball', 'custom']).status_code, 400)
+        self.assertEqual(self.compare(custom_order=['Nope']).status_code, 400)
+
+
+class DebtPlannerFormatTests(TestCase):
+    """Columnar, summary and downsampled planner responses carry the same figures"""
+
+    def plan(self, **options):
+        body = {'debts': DebtPlannerGoldenTests.DEBTS, 'monthly_budget_data': [{'net_savings': 1250}], **options}
+        request = RequestFactory().post('/api/mongodb/debt-planner-test/', data=body, content_type='application/json')
+        return mongodb_debt_planner_test(request)
+
+    def test_columnar_matches_rows(self):
+        rows = self.plan().data
+        columns = self.plan(format='columnar').data['columns']
+
+        self.assertEqual(columns['month'], [row['month'] for row in rows['plan']])
+        for i, debt in enumerate(columns['debts']):
+            self.assertEqual(debt['name'], rows['debts'][i]['name'])
+            for field in ('balance', 'paid', 'interest', 'total_paid', 'total_interest'):
+                self.assertEqual(debt[field], [row['debts'][i][field] for row in rows['plan']])
+
+    def test_summary_and_downsampled_plans(self):
+        rows = self.plan().data
+        summary = self.plan(format='summary').data
+        self.assertNotIn('plan', summary)
+        self.assertNotIn('monthly_interest_payments', summary)
+        self.assertEqual((summary['months'], summary['total_interest'], summary['debts']), (rows['months'], rows['total_interest'], rows['debts']))
+
+        sampled = self.plan(format='columnar', points=5).data['columns']
+        self.assertEqual(sampled['month'], [0, 9, 18, 28, 37])
+        for i, debt in enumerate(sampled['debts']):
+            # Paid is summed between kept months, so the sample still adds up
+            self.assertAlmostEqual(sum(debt['paid']), rows['debts'][i]['total_paid'], places=1)
+            self.assertEqual(debt['total_paid'][-1], rows['debts'][i]['total_paid'])
+
+        # Interest payments are downsampled with the rows and still add up
+        interest = self.plan(points=5).data['monthly_interest_payments']
+        self.assertEqual(len(interest), 5)
+        self.assertEqual(interest[0], 0.0)
+        self.assertAlmostEqual(sum(interest), rows['total_interest'], places=1)
+
+    def test_invalid_options(self):
+        self.assertEqual(self.plan(format='csv').status_code, 400)
+        self.assertEqual(self.plan(points=1).status_code, 400)
+
+
+class PlanCacheTests(TestCase):
+    """Planner responses are memoized by content and retired by debt/budget writes"""
+
+    def setUp(self):
+        PlanCache.set_backend(LocalTTLCache(max_size=8, ttl=60))
+        self.addCleanup(PlanCache.set_backend, None)
+        self.user = mock.Mock(id=str(ObjectId()))
+
+    def plan(self, monthly_budget_data, **body):
+        request = mock.Mock(path='/api/mongodb/debt-planner/', data={
+            'debts': DebtPlannerGoldenTests.DEBTS, 'monthly_budget_data': monthly_budget_data, **body
+        })
+        with mock.patch.object(mongodb_debt_planner, 'get_user_from_token', return_value=self.user):
+            return mongodb_debt_planner.mongodb_debt_planner_logic(request)
+
+    def test_equivalent_requests_are_one_entry(self):
+        with mock.patch.object(MongoDBService, 'get_versions', return_value={'debts': 2, 'budgets': 5}), \
+                mock.patch.object(mongodb_debt_planner, 'simulate_payoff', wraps=simulate_payoff) as simulate:
+            first = self.plan([{'net_savings': 1250}])
+            # Trailing repeats and the month number do not change the plan
+            second = self.plan([{'month': 1, 'net_savings': '1250'}, {'month': 2, 'net_savings': 1250}])
+            other = self.plan([{'net_savings': 1250}], strategy='avalanche')
+
+        self.assertEqual(simulate.call_count, 2)
+        self.assertEqual(second.data, first.data)
+        self.assertNotEqual(other.data['total_interest'], first.data['total_interest'])
+        self.assertEqual(PlanCache.stats()['hits'], 1)
+
+    def test_debt_or_budget_writes_retire_entries(self):
+        with mock.patch.object(mongodb_debt_planner, 'simulate_payoff', wraps=simulate_payoff) as simulate:
+            for versions in ({'debts': 2, 'budgets': 5}, {'debts': 2, 'budgets': 5}, {'debts': 3, 'budgets': 5}, {'debts': 3, 'budgets': 6}):
+                with mock.patch.object(MongoDBService, 'get_versions', return_value=versions):
+                    self.assertEqual(self.plan([{'net_savings': 1250}]).status_code, 200)
+
+        self.assertEqual(simulate.call_count, 3)
+
+    def test_unreadable_versions_skip_the_cache(self):
+        with mock.patch.object(MongoDBService, 'get_versions', side_effect=Exception('down')):
+            self.assertEqual(self.plan([{'net_savings': 1250}]).status_code, 200)
+        self.assertEqual(len(PlanCache.backend()), 0)
+
+
+class MetricsEndpointTests(TestCase):
+    """Cache metrics are only served to callers holding METRICS_TOKEN"""
+
+    def get(self, **headers):
+        return metrics(RequestFactory().get('/api/mongodb/metrics/', **headers))
+
+    @override_settings(METRICS_TOKEN='')
+    def test_disabled_without_a_token(self):
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer ').status_code, 404)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_requires_the_token(self):
+        self.assertEqual(self.get().status_code, 401)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        response = self.get(HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('debt_plan_cache', json.loads(response.content)['caches'])
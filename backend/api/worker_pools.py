@@ -0,0 +1,61 @@
+"""
+Bounded worker pools for CPU-heavy request work (bcrypt, image processing)
+
+A BoundedExecutor runs at most `workers` calls at once and queues at most
+`max_pending` more; anything beyond that is refused with PoolBusy straight
+away, and a call still unfinished after `timeout` seconds raises it too, so a
+burst of expensive requests cannot tie up every thread in the worker process
+and the caller can answer 503 instead of queueing forever.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+
+class PoolBusy(Exception):
+    """Raised when a pool and its queue are full"""
+
+
+class BoundedExecutor:
+    """Thread pool with a hard limit on running plus queued calls"""
+
+    def __init__(self, name: str, workers: int, max_pending: int, timeout: float, busy_error=PoolBusy):
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.busy_error = busy_error
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # The pool threads do not survive a fork; the child builds its own
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_pending)
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+        return self._executor
+
+    def run(self, fn, *args):
+        """Run fn(*args) on the pool and wait at most `timeout` seconds for the result"""
+        if not self._slots.acquire(blocking=False):
+            raise self.busy_error(f"Too many {self.name} tasks in progress")
+        try:
+            future = self._pool().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Still queued calls give their slot back; a running one finishes unobserved
+            future.cancel()
+            raise self.busy_error(f"{self.name} task did not finish within {self.timeout}s")
@@ -101,7 +101,8 @@ DATABASES = {
 # Import unified MongoDB configuration
 from mongodb_config import get_django_mongodb_config, get_mongodb_connection, MongoDBConfig
 
-# Set MongoDB connection for the application
+# Set MongoDB connection for the application (configuration only - no network
+# I/O at import; connectivity is reported by the /ready endpoint)
 mongodb_config = MongoDBConfig.get_config()
 MONGODB_URI = mongodb_config['uri']
 MONGODB_NAME = mongodb_config['database']
@@ -200,6 +201,74 @@ MONGODB_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
 }
 
+# Shared cache for multi-worker deployments (requires the redis package);
+# falls back to Django's per-process LocMemCache when REDIS_URL is unset
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+
+# User-document cache used on the authentication path. 'local' keeps a
+# bounded LRU per worker; 'django' stores it in the CACHES alias above so
+# invalidations reach every worker.
+MONGODB_USER_CACHE = {
+    'BACKEND': os.getenv('MONGODB_USER_CACHE_BACKEND', 'local'),
+    'ALIAS': 'default',
+    'MAX_SIZE': int(os.getenv('MONGODB_USER_CACHE_SIZE', '1024')),
+    'TTL': int(os.getenv('MONGODB_USER_CACHE_TTL', '60')),
+}
+
+# Debt planner responses keyed by their normalized inputs and the user's
+# debts/budgets versions. 'django' shares entries between workers.
+MONGODB_PLAN_CACHE = {
+    'BACKEND': os.getenv('MONGODB_PLAN_CACHE_BACKEND', 'local'),
+    'ALIAS': 'default',
+    'MAX_SIZE': int(os.getenv('MONGODB_PLAN_CACHE_SIZE', '256')),
+    'TTL': int(os.getenv('MONGODB_PLAN_CACHE_TTL', '600')),
+}
+
+# Public base URL for avatar links (e.g. https://api.example.com) when the
+# request's own host/scheme is not what clients should use
+AVATAR_URL_BASE = os.getenv('AVATAR_URL_BASE', '')
+
+# Avatar decoding/thumbnailing pool (Pillow); uploads beyond WORKERS +
+# MAX_PENDING concurrent images get a 503
+AVATAR_PROCESSING = {
+    'WORKERS': int(os.getenv('AVATAR_PROCESSING_WORKERS', '2')),
+    'MAX_PENDING': int(os.getenv('AVATAR_PROCESSING_MAX_PENDING', '8')),
+    'TIMEOUT': 30,
+}
+
+# Verified JWT payloads, per process; entries never outlive the token's exp
+MONGODB_TOKEN_CACHE = {
+    'MAX_SIZE': int(os.getenv('MONGODB_TOKEN_CACHE_SIZE', '4096')),
+    'TTL': int(os.getenv('MONGODB_TOKEN_CACHE_TTL', '300')),
+}
+
+# Bearer token for /api/mongodb/metrics/; the endpoint answers 404 while unset
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# bcrypt cost factor and the per-process pool that runs it. Logins beyond
+# WORKERS + MAX_PENDING concurrent password checks get a 503; hashes with a
+# different cost factor are upgraded on the next successful login
+PASSWORD_HASHING = {
+    'ROUNDS': int(os.getenv('PASSWORD_HASH_ROUNDS', '12')),
+    'WORKERS': int(os.getenv('PASSWORD_HASH_WORKERS', '2')),
+    'MAX_PENDING': int(os.getenv('PASSWORD_HASH_MAX_PENDING', '32')),
+    'TIMEOUT': 10,
+}
+
+# Where the JWT 30-minute inactivity timeout keeps session activity: 'mongodb'
+# shares it across workers and restarts, 'local' keeps it in each process
+MONGODB_SESSION_ACTIVITY = {
+    'BACKEND': os.getenv('MONGODB_SESSION_ACTIVITY_BACKEND', 'mongodb'),
+    'FLUSH_INTERVAL': int(os.getenv('MONGODB_SESSION_ACTIVITY_FLUSH_INTERVAL', '30')),
+    'WRITE_GRANULARITY': int(os.getenv('MONGODB_SESSION_ACTIVITY_WRITE_GRANULARITY', '60')),
+}
+
 # Logging configuration
 LOGGING = {
     'version': 1,
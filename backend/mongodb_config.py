@@ -6,7 +6,8 @@ Handles all MongoDB connections, environments, and health monitoring
 
 import os
 import logging
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, Optional, Callable, List
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure
 import time
@@ -16,6 +17,10 @@ logger = logging.getLogger(__name__)
 class MongoDBConfig:
     """Unified MongoDB configuration manager for all environments"""
 
+    # Configuration is resolved once per process and shared by every caller
+    _config_cache: Optional[Dict[str, Any]] = None
+    _config_lock = threading.RLock()
+
     @staticmethod
     def _get_env(name: str, default: Optional[str] = None) -> Optional[str]:
         """Get environment variable with optional default"""
@@ -53,6 +58,34 @@ class MongoDBConfig:
         """Get database name from environment"""
         return MongoDBConfig._get_env('MONGODB_NAME', 'financability_db')
 
+    @staticmethod
+    def _get_env_int(name: str, default: int) -> int:
+        """Get integer environment variable, falling back to default on bad values"""
+        value = MongoDBConfig._get_env(name)
+        if value is None or value.strip() == '':
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            logger.warning("Ignoring invalid integer for %s: %r", name, value)
+            return default
+
+    @staticmethod
+    def get_pool_options() -> Dict[str, Any]:
+        """
+        Get connection pool sizing for this worker process.
+
+        Every worker process holds one shared client (see MongoDBClientRegistry),
+        so these limits apply per worker: with N gunicorn workers the cluster
+        sees at most N * MONGODB_MAX_POOL_SIZE connections.
+        """
+        return {
+            'maxPoolSize': MongoDBConfig._get_env_int('MONGODB_MAX_POOL_SIZE', 10),
+            'minPoolSize': MongoDBConfig._get_env_int('MONGODB_MIN_POOL_SIZE', 0),
+            'maxIdleTimeMS': MongoDBConfig._get_env_int('MONGODB_MAX_IDLE_TIME_MS', 60000),
+            'maxConnecting': MongoDBConfig._get_env_int('MONGODB_MAX_CONNECTING', 2),
+        }
+
     @staticmethod
     def get_connection_options() -> Dict[str, Any]:
         """Get MongoDB connection options based on environment"""
@@ -63,11 +96,9 @@ class MongoDBConfig:
             'serverSelectionTimeoutMS': 30000,
             'connectTimeoutMS': 10000,
             'socketTimeoutMS': 10000,
-            'maxPoolSize': 50,
-            'minPoolSize': 0,
-            'maxIdleTimeMS': 300000,
             'appName': 'FinancabilityApp',
         }
+        base_options.update(MongoDBConfig.get_pool_options())
         
         # Environment-specific options
         if env == 'production':
@@ -90,6 +121,20 @@ class MongoDBConfig:
         
         return base_options
 
+    @staticmethod
+    def get_startup_mode() -> str:
+        """
+        Get how connectivity is established at startup.
+
+        'deferred' (default): nothing blocks on MongoDB at import or on the
+        first service instantiation; a background readiness probe pings the
+        cluster and index reconciliation runs once it answers.
+        'blocking': the first service instantiation pings with retries and
+        creates indexes inline (the previous behaviour).
+        """
+        mode = MongoDBConfig._get_env('MONGODB_STARTUP_MODE', 'deferred').lower()
+        return 'blocking' if mode == 'blocking' else 'deferred'
+
     @staticmethod
     def test_connection(uri: str, options: Dict[str, Any]) -> bool:
         """Test MongoDB connection by issuing a ping"""
@@ -102,39 +147,265 @@ class MongoDBConfig:
             logger.debug("Connection test failed: %s", e)
             return False
 
-    @staticmethod
-    def get_config() -> Dict[str, Any]:
-        """Get complete MongoDB configuration"""
-        uri = MongoDBConfig._build_mongodb_uri()
-        database = MongoDBConfig.get_database_name()
-        options = MongoDBConfig.get_connection_options()
-        environment = MongoDBConfig.get_environment()
-        
-        # Test connection
-        if MongoDBConfig.test_connection(uri, options):
-            logger.info(f"MongoDB connection successful for {environment} environment")
-        else:
-            logger.warning(f"MongoDB connection test failed for {environment} environment, but proceeding with configuration")
-        
-        return {
-            'uri': uri,
-            'database': database,
-            'options': options,
-            'environment': environment
-        }
+    @classmethod
+    def get_config(cls, refresh: bool = False) -> Dict[str, Any]:
+        """Get complete MongoDB configuration (resolved once per process and cached)"""
+        config = cls._config_cache
+        if config is not None and not refresh:
+            return config
+
+        with cls._config_lock:
+            if cls._config_cache is not None and not refresh:
+                return cls._config_cache
+
+            # Pure configuration: no network I/O happens here, so this is safe
+            # to call at settings import. Connectivity is checked by
+            # MongoDBReadiness (deferred mode) or MongoDBService (blocking mode).
+            config = {
+                'uri': cls._build_mongodb_uri(),
+                'database': cls.get_database_name(),
+                'options': cls.get_connection_options(),
+                'environment': cls.get_environment()
+            }
+            cls._config_cache = config
+
+        return config
 
     @staticmethod
     def get_client() -> MongoClient:
-        """Get a MongoDB client instance"""
-        config = MongoDBConfig.get_config()
-        return MongoClient(config['uri'], **config['options'])
+        """Get the process-wide shared MongoDB client"""
+        return MongoDBClientRegistry.get_client()
 
     @staticmethod
     def get_database():
-        """Get the database instance"""
-        config = MongoDBConfig.get_config()
-        client = MongoDBConfig.get_client()
-        return client[config['database']]
+        """Get the database instance backed by the shared client"""
+        return MongoDBClientRegistry.get_database()
+
+
+class MongoDBClientRegistry:
+    """
+    Process-wide registry of shared MongoClient instances.
+
+    MongoClient is thread-safe and pools its own sockets, so one client per
+    process is enough for every service, the mongoengine models and the health
+    checks. Clients are created lazily on first use and are dropped in a forked
+    child (e.g. gunicorn workers started with --preload), since a client must
+    never be shared across fork().
+    """
+
+    _lock = threading.RLock()
+    _clients: Dict[str, MongoClient] = {}
+    _pid: int = os.getpid()
+    _reset_callbacks: List[Callable[[], None]] = []
+
+    @classmethod
+    def _check_pid(cls) -> None:
+        """Drop clients inherited from a parent process"""
+        if cls._pid != os.getpid():
+            cls._after_fork_in_child()
+
+    @classmethod
+    def _after_fork_in_child(cls) -> None:
+        """Forget (without closing) clients created before fork()"""
+        cls._lock = threading.RLock()
+        cls._clients = {}
+        cls._pid = os.getpid()
+        for callback in list(cls._reset_callbacks):
+            try:
+                callback()
+            except Exception as e:
+                logger.debug("MongoDB client reset callback failed: %s", e)
+
+    @classmethod
+    def add_reset_callback(cls, callback: Callable[[], None]) -> None:
+        """Register a callback run whenever the shared clients are discarded"""
+        with cls._lock:
+            if callback not in cls._reset_callbacks:
+                cls._reset_callbacks.append(callback)
+
+    @classmethod
+    def get_client(cls, uri: Optional[str] = None, options: Optional[Dict[str, Any]] = None) -> MongoClient:
+        """Get (lazily creating) the shared client for a URI"""
+        cls._check_pid()
+        if uri is None or options is None:
+            config = MongoDBConfig.get_config()
+            uri = uri or config['uri']
+            options = options if options is not None else config['options']
+
+        client = cls._clients.get(uri)
+        if client is not None:
+            return client
+
+        with cls._lock:
+            client = cls._clients.get(uri)
+            if client is None:
+                # MongoClient connects in the background; no I/O happens here
+                client = MongoClient(uri, **options)
+                cls._clients[uri] = client
+                logger.info("Created shared MongoDB client for %s", MongoDBHealthCheck._mask_uri(uri))
+            return client
+
+    @classmethod
+    def get_database(cls, name: Optional[str] = None):
+        """Get a database handle from the shared client"""
+        name = name or MongoDBConfig.get_config()['database']
+        return cls.get_client()[name]
+
+    @classmethod
+    def ping(cls) -> bool:
+        """Ping the server through the shared client"""
+        try:
+            cls.get_client().admin.command('ping')
+            return True
+        except Exception as e:
+            logger.debug("Connection test failed: %s", e)
+            return False
+
+    @classmethod
+    def close_all(cls) -> None:
+        """Close every shared client (e.g. on worker shutdown or in tests)"""
+        with cls._lock:
+            clients = list(cls._clients.values())
+            cls._clients = {}
+            for callback in list(cls._reset_callbacks):
+                try:
+                    callback()
+                except Exception as e:
+                    logger.debug("MongoDB client reset callback failed: %s", e)
+        for client in clients:
+            client.close()
+
+
+class MongoDBReadiness:
+    """
+    Background readiness probe for the shared MongoDB client.
+
+    A daemon thread pings the cluster every MONGODB_READINESS_INTERVAL seconds
+    (backing off while it is unreachable) and records the result, so the
+    /ready endpoint never blocks on the network. Tasks registered with
+    add_ready_task() (e.g. index reconciliation) run on the probe thread after
+    the first successful ping, keeping them off the request path.
+    """
+
+    _lock = threading.Lock()
+    _thread: Optional[threading.Thread] = None
+    _pid: Optional[int] = None
+    _state: Dict[str, Any] = {}
+    _tasks: Dict[str, Callable[[], None]] = {}
+    _completed_tasks: set = set()
+
+    @classmethod
+    def _reset_state(cls) -> None:
+        cls._thread = None
+        cls._pid = os.getpid()
+        cls._state = {
+            'ready': False,
+            'status': 'starting',
+            'last_error': None,
+            'last_check': None,
+            'last_success': None,
+            'checks': 0,
+        }
+        cls._tasks = {}
+        cls._completed_tasks = set()
+
+    @classmethod
+    def _after_fork_in_child(cls) -> None:
+        """The probe thread does not survive fork(); start over in the child"""
+        cls._lock = threading.Lock()
+        cls._reset_state()
+
+    @classmethod
+    def ensure_started(cls) -> None:
+        """Start the probe thread for this process if it is not running"""
+        if cls._pid == os.getpid() and cls._thread is not None and cls._thread.is_alive():
+            return
+        with cls._lock:
+            if cls._pid != os.getpid():
+                cls._reset_state()
+            if cls._thread is not None and cls._thread.is_alive():
+                return
+            cls._thread = threading.Thread(target=cls._run, name='mongodb-readiness', daemon=True)
+            cls._thread.start()
+
+    @classmethod
+    def add_ready_task(cls, name: str, task: Callable[[], None]) -> None:
+        """Run task once on the probe thread after MongoDB first becomes reachable"""
+        with cls._lock:
+            if cls._pid != os.getpid():
+                cls._reset_state()
+            if name not in cls._completed_tasks:
+                cls._tasks[name] = task
+
+    @classmethod
+    def is_ready(cls) -> bool:
+        return bool(cls._pid == os.getpid() and cls._state.get('ready'))
+
+    @classmethod
+    def status(cls) -> Dict[str, Any]:
+        """Snapshot of the last probe result"""
+        if cls._pid != os.getpid():
+            return {'ready': False, 'status': 'starting'}
+        state = dict(cls._state)
+        state['pending_tasks'] = sorted(cls._tasks)
+        return state
+
+    @classmethod
+    def _run_pending_tasks(cls) -> None:
+        with cls._lock:
+            tasks = list(cls._tasks.items())
+        for name, task in tasks:
+            try:
+                task()
+                logger.info("MongoDB ready task '%s' completed", name)
+            except Exception as e:
+                logger.error("MongoDB ready task '%s' failed: %s", name, e)
+            with cls._lock:
+                cls._tasks.pop(name, None)
+                cls._completed_tasks.add(name)
+
+    @classmethod
+    def _run(cls) -> None:
+        interval = max(1, MongoDBConfig._get_env_int('MONGODB_READINESS_INTERVAL', 10))
+        retry_delay = 1
+        while True:
+            started = time.time()
+            try:
+                MongoDBClientRegistry.get_client().admin.command('ping')
+                error = None
+            except Exception as e:
+                error = str(e)
+
+            was_ready = cls._state.get('ready')
+            cls._state.update({
+                'ready': error is None,
+                'status': 'ready' if error is None else 'unavailable',
+                'last_error': error,
+                'last_check': started,
+                'checks': cls._state.get('checks', 0) + 1,
+            })
+
+            if error is None:
+                cls._state['last_success'] = started
+                if not was_ready:
+                    logger.info("MongoDB is reachable (%.0fms)", (time.time() - started) * 1000)
+                cls._run_pending_tasks()
+                retry_delay = 1
+                time.sleep(interval)
+            else:
+                if was_ready or cls._state['checks'] == 1:
+                    logger.warning("MongoDB readiness check failed: %s", error)
+                # Back off while the cluster is unreachable
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, interval)
+
+
+MongoDBReadiness._reset_state()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=MongoDBClientRegistry._after_fork_in_child)
+    os.register_at_fork(after_in_child=MongoDBReadiness._after_fork_in_child)
 
 
 class MongoDBHealthCheck:
@@ -154,7 +425,7 @@ class MongoDBHealthCheck:
             ping_result = client.admin.command('ping')
 
             # Test database access
-            db = MongoDBConfig.get_database()
+            db = client[config['database']]
             collections = db.list_collection_names()
 
             write_test_result = None
@@ -168,7 +439,7 @@ class MongoDBHealthCheck:
                 except Exception as e:
                     write_test_result = f'write_test_failed: {e}'
 
-            client.close()
+            # The client is shared process-wide, so it is intentionally left open
             response_time = (time.time() - start_time) * 1000
 
             return {